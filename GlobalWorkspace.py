@@ -1,37 +1,55 @@
 import json
 import os
-from openai import AsyncOpenAI
-from qdrant_client import models
 
 # 假设你的数据库客户端已经初始化
-from database import redis_client, qdrant_client, db
-from system_tools import get_current_time
+import database
+from long_term_memory import collection_embedding_params, ensure_memory_collection, memory_collection_name, memory_search_params
+from main_memory import MainMemory
+from memory_dedup import SEARCH_OVERFETCH, dedupe_texts
+from memory_consolidation import add_demoted_memory, add_turn
+from operation_library.profile_operations import get_user_profile_as_text
 
 class GlobalWorkspace:
+    # Workspace documents are always looked up by user_id (ensured by operation_library.index_manager)
+    INDEXES = {
+        "personas": [{"keys": [("user_id", 1)]}],
+        "emotions": [{"keys": [("user_id", 1)]}],
+        "main_memory": [{"keys": [("user_id", 1)]}],
+    }
+    QUERY_SHAPES = {
+        "personas": [{"filter": {}}],
+        "emotions": [{"filter": {}}],
+        "main_memory": [{"filter": {}}],
+    }
+
     def __init__(self, user_id: str):
         self.user_id = user_id
         
         # --- 数据库与服务客户端 ---
-        self.redis = redis_client
-        self.qdrant = qdrant_client
-        self.mongo_personas = db.get_collection("personas")
-        self.mongo_emotions = db.get_collection("emotions")
-        self.mongo_main_memory = db.get_collection("main_memory")
+        self.redis = database.redis_client
+        self.qdrant = database.qdrant_client
+        self.mongo_personas = database.db.get_collection("personas")
+        self.mongo_emotions = database.db.get_collection("emotions")
+        self.mongo_main_memory = database.db.get_collection("main_memory")
 
         # --- 新增: OpenAI 客户端 ---
         # 它会自动从环境变量中读取 OPENAI_API_KEY
+        from openai import AsyncOpenAI
+
         self.openai_client = AsyncOpenAI() 
         
         # --- 新增: Qdrant Collection Name ---
         # 将集合名称定义在这里，方便未来修改
-        self.qdrant_relevant_memory = f"memories-{self.user_id}"
+        self.qdrant_relevant_memory = memory_collection_name(self.user_id)
 
         # --- 用户状态 (这些只是临时容器, 真实数据在数据库中) ---
         self.persona: dict = {}
+        self.user_profile: str = "" # Rendered, bounded profile block (see profile_operations)
         self.context: list = []
         self.emotion: dict = {}
-        self.main_memory: list = []
+        self.main_memory = MainMemory() # Bounded by a token budget; evicted items move to Qdrant
         self.working_memory: list = [] # V2: 名字改为 'working_memory' 更清晰
+        self.finished_turn: tuple | None = None # (user message, reply), handed to memory consolidation on save
     
     # ... (你其他的 save 和 load 方法保持不变) ...
 
@@ -47,7 +65,7 @@ class GlobalWorkspace:
         """将当前main_memory保存到MongoDB"""
         await self.mongo_main_memory.update_one(
             {"user_id": self.user_id},
-            {"$set": {"user_id":self.user_id, "memories": self.main_memory}},
+            {"$set": {"user_id":self.user_id, "memories": self.main_memory.to_list()}},
             upsert=True
         )
 
@@ -95,40 +113,26 @@ class GlobalWorkspace:
 
         # 4. Load main_memory
         main_memory_cache = await self.redis.get(f"user:{self.user_id}:main_memory")
+        # Items stored as plain strings are upgraded, and an oversized list is trimmed to the budget
         if main_memory_cache:
-            self.main_memory = json.loads(main_memory_cache)
+            self.main_memory = MainMemory(json.loads(main_memory_cache))
         else:
             main_memory_data_doc = await self.mongo_main_memory.find_one({"user_id": self.user_id})
             if main_memory_data_doc and "memories" in main_memory_data_doc:
-                self.main_memory = main_memory_data_doc["memories"]
+                self.main_memory = MainMemory(main_memory_data_doc["memories"])
             else:
                 print(f"No main memory found for new user {self.user_id}. Initializing.")
-                current_time = get_current_time()
-                default_memory = [
-                    f"{current_time}: Today is my birthday ^_^",
-                    f"{current_time}: Energy represents the maximum number of thinking steps I can take."
-                ]
-                self.main_memory = default_memory
+                self.main_memory = MainMemory()
+                self.main_memory.remember("Today is my birthday ^_^", importance=6)
+                self.main_memory.remember("Energy represents the maximum number of thinking steps I can take.", importance=10)
                 await self.save_main_memory_to_Mongo() 
-            await self.redis.set(f"user:{self.user_id}:main_memory", json.dumps(self.main_memory), ex=3600)
+            await self.redis.set(f"user:{self.user_id}:main_memory", json.dumps(self.main_memory.to_list()), ex=3600)
 
-            # --- 新增: 检查并创建 Qdrant Collection ---
-        try:
-            # 尝试获取集合信息，如果不存在会抛出异常
-            await self.qdrant.get_collection(collection_name=self.qdrant_relevant_memory)
-            print(f"Qdrant collection '{self.qdrant_relevant_memory}' already exists.")
-        except Exception:
-            print(f"Qdrant collection '{self.qdrant_relevant_memory}' not found. Creating...")
-            # 创建集合
-            await self.qdrant.create_collection(
-                collection_name=self.qdrant_relevant_memory,
-                vectors_config=models.VectorParams(
-                    size=1536,  # OpenAI text-embedding-3-small 的维度
-                    distance=models.Distance.COSINE
-                ),
-            )
-            print(f"Collection '{self.qdrant_relevant_memory}' created successfully.")
-        # --- 新增结束 ---
+        # 5. Load the user profile (pre-rendered and cached per profile version)
+        self.user_profile = await get_user_profile_as_text(self.user_id)
+
+        # 6. Make sure the long-term memory collection exists (checked once per process)
+        await ensure_memory_collection(self.qdrant, self.user_id)
 
         print(f"Workspace for user {self.user_id} loaded.")
         return self
@@ -140,7 +144,12 @@ class GlobalWorkspace:
         """
         pipe = self.redis.pipeline()
         pipe.set(f"user:{self.user_id}:emotion", json.dumps(self.emotion))
-        pipe.set(f"user:{self.user_id}:main_memory", json.dumps(self.main_memory))
+        pipe.set(f"user:{self.user_id}:main_memory", json.dumps(self.main_memory.to_list()))
+        for item in self.main_memory.take_evicted():
+            add_demoted_memory(pipe, self.user_id, item)
+        if self.finished_turn is not None:
+            add_turn(pipe, self.user_id, *self.finished_turn)
+            self.finished_turn = None
         await self.mongo_emotions.update_one(
             {"user_id": self.user_id},
             {"$set": self.emotion},
@@ -148,7 +157,7 @@ class GlobalWorkspace:
         )
         await self.mongo_main_memory.update_one(
             {"user_id": self.user_id},
-            {"$set": {"memories": self.main_memory}},
+            {"$set": {"memories": self.main_memory.to_list()}},
             upsert=True
         )
         await pipe.execute()
@@ -165,8 +174,9 @@ class GlobalWorkspace:
     async def _get_embedding(self, text: str) -> list[float]:
         """使用OpenAI模型为文本创建embedding向量"""
         response = await self.openai_client.embeddings.create(
-            model="text-embedding-3-small",
-            input=text
+            input=text,
+            # Same dimensions as the collection behind the alias (which may not be migrated yet)
+            **await collection_embedding_params(self.qdrant, self.redis, self.user_id)
         )
         return response.data[0].embedding
 
@@ -175,23 +185,27 @@ class GlobalWorkspace:
         """
         从Qdrant中搜索相关记忆并更新工作记忆 (working_memory)。
         """
+        # Core memories the message touches on count as accessed (slows their decay)
+        self.main_memory.recall(user_message)
         print(f"Searching for memories related to: '{user_message}'")
         try:
             # 1. 将用户输入文本转换为向量
             query_vector = await self._get_embedding(user_message)
 
-            # 2. 使用正确的 .search() 方法和参数进行搜索
-            search_result = await self.qdrant.search(
+            # 2. Search the quantized index, rescoring the candidates with the original vectors
+            search_result = (await self.qdrant.query_points(
                 collection_name=self.qdrant_relevant_memory,
-                query_vector=query_vector,
-                limit=top_k
-            )
+                query=query_vector,
+                limit=top_k * SEARCH_OVERFETCH,
+                search_params=memory_search_params(),
+            )).points
 
             # 3. 从搜索结果中提取记忆内容
             # Qdrant返回的每个hit都有一个payload，我们假设记忆文本存储在payload的'text'字段中
-            relevant_memories = [
-                hit.payload['text'] for hit in search_result if 'text' in hit.payload
-            ]
+            # Near-duplicates (memories stored before deduplication) take one slot
+            relevant_memories = dedupe_texts(
+                [hit.payload['text'] for hit in search_result if 'text' in hit.payload], limit=top_k
+            )
             
             # 4. 将提取到的记忆列表赋值给工作记忆
             self.working_memory = relevant_memories
@@ -204,6 +218,14 @@ class GlobalWorkspace:
 
     # ... (你其他的 add_to_context, get_context 等方法保持不变) ...
 
+    def remember(self, text: str, importance: int = 5) -> dict:
+        """Adds a core memory; the least retained ones beyond the token budget are demoted on save."""
+        return self.main_memory.remember(text, importance)
+
+    def finish_turn(self, user_message: str, reply: str):
+        """Marks the turn as finished; save() queues it for long-term memory consolidation."""
+        self.finished_turn = (user_message, reply)
+
     def add_to_context(self, message: dict):
         self.context.append(message)
 
@@ -2,7 +2,6 @@ from fastapi import Depends
 from operation_library.task_repository import TaskRepository
 from operation_library.goal_repository import GoalRepository
 from brain2 import Brain # Assuming your Brain class is in brain/brain.py
-from database import tasks_collection, goals_collection
 from .auth import get_current_user
 from models.main_models import User
 
@@ -33,4 +32,8 @@ async def get_brain(
     # return Brain(task_repo=task_repo, goal_repo=goal_repo, user_id=task_repo.user_id)
     
     # ...we now await the asynchronous factory method!
-    return await Brain.create(task_repo=task_repo, goal_repo=goal_repo,user_id=task_repo._user_id)
\ No newline at end of file
+    # Repositories not passed here are created by the Brain from the tool registry.
+    return await Brain.create(
+        user_id=task_repo._user_id,
+        repositories={"task_repo": task_repo, "goal_repo": goal_repo}
+    )
\ No newline at end of file
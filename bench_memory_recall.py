@@ -0,0 +1,122 @@
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import List
+
+import numpy as np
+
+import database
+from long_term_memory import EMBEDDING_MODEL, FULL_VECTOR_SIZE, VectorSettings, memory_collection_config, memory_collection_name, memory_search_params
+
+# Recall@K and vector RAM of memory-collection layouts, against exact search on full-precision
+# 1536-dim vectors. One user's stored memories are loaded into a temporary collection per layout,
+# and the stored query set is searched on each. text-embedding-3 shortens a vector by truncating
+# and re-normalizing it, so every layout is derived from one full embedding of each text.
+# Run with: python bench_memory_recall.py <user_id> [max_memories]
+
+QUERY_SET = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Data", "Memory_Recall_Queries.json")
+TOP_K = 5
+MAX_MEMORIES = 2000
+EMBED_BATCH_SIZE = 512
+LAYOUTS = [
+    VectorSettings(dimensions=1536, quantization="none", oversampling=1.0, on_disk_vectors=False, on_disk_payload=True),
+    VectorSettings(dimensions=1536, quantization="int8", oversampling=2.0, on_disk_vectors=True, on_disk_payload=True),
+    VectorSettings(dimensions=512, quantization="none", oversampling=1.0, on_disk_vectors=False, on_disk_payload=True),
+    VectorSettings(dimensions=512, quantization="int8", oversampling=2.0, on_disk_vectors=True, on_disk_payload=True),
+    VectorSettings(dimensions=256, quantization="int8", oversampling=2.0, on_disk_vectors=True, on_disk_payload=True),
+]
+
+def shorten(vectors: np.ndarray, dimensions: int) -> np.ndarray:
+    short = vectors[:, :dimensions]
+    return short / np.linalg.norm(short, axis=1, keepdims=True)
+
+def ram_bytes_per_vector(settings: VectorSettings) -> int:
+    """Vector bytes kept in RAM: int8 codes when quantized (originals on disk), else float32."""
+    return settings.dimensions if settings.quantization == "int8" else settings.dimensions * 4
+
+async def embed(texts: List[str]) -> np.ndarray:
+    from llm_provider import LLMProvider
+
+    provider = LLMProvider()
+    vectors = []
+    for start in range(0, len(texts), EMBED_BATCH_SIZE):
+        vectors.extend(await provider.embed(texts[start:start + EMBED_BATCH_SIZE], model=EMBEDDING_MODEL))
+    return np.asarray(vectors, dtype=np.float32)
+
+async def load_collection(qdrant, name: str, settings: VectorSettings, vectors: np.ndarray):
+    from qdrant_client import models
+
+    await qdrant.create_collection(
+        collection_name=name,
+        optimizers_config=models.OptimizersConfigDiff(indexing_threshold=1), # Index (and quantize) right away
+        **memory_collection_config(settings),
+    )
+    short = shorten(vectors, settings.dimensions)
+    for start in range(0, len(short), 256):
+        await qdrant.upsert(collection_name=name, points=[
+            models.PointStruct(id=index, vector=short[index].tolist()) for index in range(start, min(start + 256, len(short)))
+        ], wait=True)
+    while (await qdrant.get_collection(collection_name=name)).status != models.CollectionStatus.GREEN:
+        await asyncio.sleep(0.5)
+
+async def search(qdrant, name: str, query: np.ndarray, search_params) -> tuple[List[int], float]:
+    started = time.perf_counter()
+    points = (await qdrant.query_points(collection_name=name, query=query.tolist(), limit=TOP_K, search_params=search_params)).points
+    return [point.id for point in points], (time.perf_counter() - started) * 1000
+
+async def main(user_id: str, max_memories: int) -> int:
+    from qdrant_client import models
+
+    qdrant = database.qdrant_client
+    if qdrant is None:
+        print("Qdrant is not configured.")
+        return 1
+    with open(QUERY_SET, encoding="utf-8") as f:
+        queries = [entry["query"] for entry in json.load(f)]
+    points, offset = [], None
+    while len(points) < max_memories:
+        page, offset = await qdrant.scroll(collection_name=memory_collection_name(user_id), limit=256, offset=offset, with_payload=["text"])
+        points.extend(page)
+        if offset is None:
+            break
+    texts = [point.payload["text"] for point in points[:max_memories] if point.payload and point.payload.get("text")]
+    if len(texts) <= TOP_K:
+        print(f"User '{user_id}' has only {len(texts)} memories; need more than {TOP_K}.")
+        return 1
+    print(f"{len(texts)} memories, {len(queries)} queries, recall@{TOP_K} against exact float32 {FULL_VECTOR_SIZE}-dim search")
+
+    memory_vectors = await embed(texts)
+    query_vectors = await embed(queries)
+    names = [f"bench-{user_id}-{settings.layout}" for settings in LAYOUTS]
+    try:
+        for name, settings in zip(names, LAYOUTS):
+            await load_collection(qdrant, name, settings, memory_vectors)
+        baseline = [(await search(qdrant, names[0], query, models.SearchParams(exact=True)))[0] for query in query_vectors]
+
+        print(f"{'layout':<14}{'rescore':<9}{'RAM/vector':>11}{'RAM total':>12}{'recall':>8}{'latency':>10}")
+        for name, settings in zip(names, LAYOUTS):
+            if settings.quantization == "int8":
+                variants = [("on", memory_search_params(settings)), ("off", models.SearchParams(quantization=models.QuantizationSearchParams(rescore=False)))]
+            else:
+                variants = [("-", None)]
+            for rescore, search_params in variants:
+                recalls, latencies = [], []
+                for query, expected in zip(query_vectors, baseline):
+                    found, latency = await search(qdrant, name, shorten(query[None, :], settings.dimensions)[0], search_params)
+                    recalls.append(len(set(found) & set(expected)) / len(expected))
+                    latencies.append(latency)
+                per_vector = ram_bytes_per_vector(settings)
+                print(f"{settings.layout:<14}{rescore:<9}{per_vector:>9} B{per_vector * len(texts) / 1024:>9.1f} KB{np.mean(recalls):>8.3f}{np.mean(latencies):>7.1f} ms")
+    finally:
+        for name in names:
+            await qdrant.delete_collection(collection_name=name)
+        await database.close_clients()
+    return 0
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python bench_memory_recall.py <user_id> [max_memories]")
+        sys.exit(2)
+    sys.exit(asyncio.run(main(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else MAX_MEMORIES)))
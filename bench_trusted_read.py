@@ -0,0 +1,58 @@
+import timeit
+from datetime import datetime, timezone
+from bson import ObjectId
+from models.main_models import TaskModel, GoalModel, trusted_dump
+from models.serialization import to_json
+
+# Benchmarks the per-document cost of the validated read path against the trusted one.
+# Run with: python bench_trusted_read.py
+
+N_DOCS = 1000
+REPEAT = 5
+
+def make_task_docs(n: int) -> list[dict]:
+    return [
+        {
+            "_id": ObjectId(),
+            "user_id": "6530c117e1e6f1f3a2b4c5d6",
+            "name": f"Memory Words {i}",
+            "description": "Use AnkiDroid to memorize the next unit of words.",
+            "schedule": "every day at 6pm",
+            "created_at": datetime.now(timezone.utc),
+            "status": "active",
+        }
+        for i in range(n)
+    ]
+
+def make_goal_docs(n: int) -> list[dict]:
+    return [
+        {
+            "_id": ObjectId(),
+            "user_id": "6530c117e1e6f1f3a2b4c5d6",
+            "name": f"English {i}",
+            "description": "Improve English language skills across various domains.",
+            "weight": 20,
+            "created_at": datetime.now(timezone.utc),
+            "status": "active",
+        }
+        for i in range(n)
+    ]
+
+def per_doc_us(func, docs) -> float:
+    best = min(timeit.repeat(lambda: [func(doc) for doc in docs], number=1, repeat=REPEAT))
+    return best / len(docs) * 1e6
+
+def main():
+    for label, model_cls, docs in (("TaskModel", TaskModel, make_task_docs(N_DOCS)), ("GoalModel", GoalModel, make_goal_docs(N_DOCS))):
+        validated = per_doc_us(lambda doc: model_cls(**doc).model_dump(by_alias=True), docs)
+        trusted = per_doc_us(lambda doc: trusted_dump(model_cls, doc), docs)
+        assert trusted_dump(model_cls, docs[0]) == model_cls(**docs[0]).model_dump(by_alias=True)
+        print(f"{label}: validated read {validated:.2f} us/doc, trusted read {trusted:.2f} us/doc ({validated / trusted:.1f}x faster)")
+
+    docs = [trusted_dump(TaskModel, doc) for doc in make_task_docs(N_DOCS)]
+    as_str = per_doc_us(str, docs)
+    as_json = per_doc_us(to_json, docs)
+    print(f"Serialization: str() {as_str:.2f} us/doc, to_json() {as_json:.2f} us/doc")
+
+if __name__ == "__main__":
+    main()
@@ -1,93 +1,106 @@
 from tool_registry import ToolRegistry
-from openai import AsyncOpenAI
+from tool_selector import ToolSelector
 from Brain.Functions import defination
 from typing import List, Dict, Any
 import json
 import os
 from operation_library.task_repository import TaskRepository
 from operation_library.goal_repository import GoalRepository
+from operation_library.task_event_repository import TaskEventRepository
+from operation_library.schedule_repository import ScheduleRepository
 from GlobalWorkspace import GlobalWorkspace
 from llm_provider import LLMProvider
-
-# Helper function from previous review
-def format_system_prompt(workspace: GlobalWorkspace) -> str:
-        # ... (implementation from the previous response) ...
-        persona_str = "\n".join([f"  {k}: {v}" for k, v in workspace.persona.items() if k != '_id'])
-        emotion_str = "\n".join([f"  {k}: {v}" for k, v in workspace.emotion.items() if k != '_id'])
-        main_memory_str = "\n".join([f"- {item}" for item in workspace.main_memory])
-        working_memory_str = workspace.working_memory if isinstance(workspace.working_memory, str) else "\n".join([f"- {item}" for item in workspace.working_memory])
-
-        prompt = f"""
-            # Your Persona
-            {persona_str}
-            # Your Current Emotion
-            {emotion_str}
-            # Your Core Memories (Remember these to avoid past mistakes and recall user preferences)
-            {main_memory_str}
-            # Your Relevant Memories for Current Task (Working Memory)
-            {working_memory_str}
-        """
-        return prompt
+from models.serialization import to_json
+
+# --- Process-wide tool registry ---
+# Adding a repository is declarative: list it here and its tools become available.
+TOOL_REGISTRY = ToolRegistry({
+    "task_repo": TaskRepository,
+    "goal_repo": GoalRepository,
+    "task_event_repo": TaskEventRepository,
+    "schedule_repo": ScheduleRepository,
+})
+# Per-step prompts only carry the tools relevant to the request
+TOOL_SELECTOR = ToolSelector(TOOL_REGISTRY)
+
+# --- Static prompt prefix (built once per process) ---
+# Provider-side prompt caching only works on an identical prefix, so everything that
+# is the same for every user and every request goes first and is serialized exactly once.
+TOOL_SCHEMA_BLOB: bytes = TOOL_REGISTRY.schema_blob
+
+STATIC_JOB_PROMPT: str = f"""
+You are an advanced AI assistant designed to help the owner achieve their goals through thoughtful planning and tool usage.
+Here are the only functions (tools) you are allowed to use:
+{TOOL_SCHEMA_BLOB.decode("utf-8")}
+At first, you need to understand the owner's words deeply: ask yourself weather the owner needs help or just wants to chat.
+If the owner just wants to chat, respond briefly like a real human without using any tools.
+
+**CRITICAL RULE:** For simple greetings ("hello", "hi", "how are you"), small talk, or simple questions that can be answered in one sentence, you **MUST** set "max_steps" to 0.
+Use "max_steps" 1 or more **ONLY** if the request requires using a tool or a multi-stage thought process.
+
+Return the result strictly in the following JSON schema:
+{{
+  "thinking": "Your thinking to the owner's messages before the final reponse.",
+  "max_steps": "An integer (0-10).",
+  "response": "Your final response to the owner."
+}}
+"""
+
+# --- Per-user prompt blocks ---
+def format_persona_prompt(workspace: GlobalWorkspace) -> str:
+    """The persona and the rendered profile rarely change, so they sit right after the static prefix."""
+    persona_str = "\n".join([f"  {k}: {v}" for k, v in workspace.persona.items() if k != '_id'])
+    prompt = f"# Your Persona\n{persona_str}"
+    if workspace.user_profile:
+        prompt += f"\n# What You Know About the Owner\n{workspace.user_profile}"
+    return prompt
+
+def format_dynamic_context(workspace: GlobalWorkspace) -> str:
+    """Emotion and memories change between requests, so they go last."""
+    emotion_str = "\n".join([f"  {k}: {v}" for k, v in workspace.emotion.items() if k != '_id'])
+    main_memory_str = "\n".join([f"- {line}" for line in workspace.main_memory.lines()])
+    working_memory_str = workspace.working_memory if isinstance(workspace.working_memory, str) else "\n".join([f"- {item}" for item in workspace.working_memory])
+
+    return (
+        f"# Your Current Emotion\n{emotion_str}\n"
+        f"# Your Core Memories (Remember these to avoid past mistakes and recall user preferences)\n{main_memory_str}\n"
+        f"# Your Relevant Memories for Current Task (Working Memory)\n{working_memory_str}"
+    )
 
 class Brain:
-    def __init__(self, task_repo: TaskRepository, goal_repo: GoalRepository, user_id: str):
+    def __init__(self, user_id: str, repositories: Dict[str, Any] | None = None):
         self.user_id = user_id
         self.llm_provider = LLMProvider()
-        self.tool_registry = ToolRegistry() # Placeholder user_id
+        self.tool_registry = TOOL_REGISTRY
         self.global_workspace = GlobalWorkspace(self.user_id)
-        self.task_repo = task_repo
-        self.goal_repo = goal_repo
-        self.repository_map = {
-            "task_repo": self.task_repo,
-            "goal_repo": self.goal_repo
-        }
+        # One repository instance per declared repository, scoped to this user
+        self.repository_map = self.tool_registry.bind_repositories(user_id, repositories)
 
     async def _async_init(self):
-        """Asynchronously loads the workspace and registers tools."""
+        """Asynchronously loads the workspace."""
         await self.global_workspace.load()
-        self._register_all_tools()
         return self
 
     # Public factory method to create instances
     @classmethod
-    async def create(cls, user_id: str, task_repo: TaskRepository, goal_repo: GoalRepository):
+    async def create(cls, user_id: str, repositories: Dict[str, Any] | None = None):
         """Creates and asynchronously initializes a Brain instance."""
-        brain_instance = cls(task_repo, goal_repo, user_id)
+        brain_instance = cls(user_id, repositories)
         return await brain_instance._async_init()
 
-    def _register_all_tools(self):
-        self.tool_registry.register_from_repository("task_repo", self.task_repo)
-        self.tool_registry.register_from_repository("goal_repo", self.goal_repo)
-
     async def run_conscious_loop(self, user_message: str) -> str:
         # --- 1. ENRICH THE CONTEXT WITH MEMORY ---
         await self.global_workspace.add_relevant_memories_to_work(user_message)
-        who_you_are = format_system_prompt(self.global_workspace)
         # --- 2. PREPARE THE MESSAGES FOR LLM ---
-        tool_definitions_json = json.dumps(self.tool_registry.tools)
+        # Layout is static-first: job + tool schemas, then persona, then dynamic context.
+        who_you_are = format_persona_prompt(self.global_workspace)
+        current_context = format_dynamic_context(self.global_workspace)
 
-        what_your_job_is = f"""  
-        You are an advanced AI assistant designed to help the owner achieve their goals through thoughtful planning and tool usage.
-        Here are the only functions (tools) you are allowed to use:
-        {tool_definitions_json}
-        At first, you need to understand the owner's words deeply: ask yourself weather the owner needs help or just wants to chat.
-        If the owner just wants to chat, respond briefly like a real human without using any tools.
-
-        **CRITICAL RULE:** For simple greetings ("hello", "hi", "how are you"), small talk, or simple questions that can be answered in one sentence, you **MUST** set "max_steps" to 0.
-        Use "max_steps" 1 or more **ONLY** if the request requires using a tool or a multi-stage thought process.
-        
-        Return the result strictly in the following JSON schema:
-        {{
-          "thinking": "Your thinking to the owner's messages before the final reponse.",
-          "max_steps": "An integer (0-10).",
-          "response": "Your final response to the owner."
-        }}
-        """
-        messages_recorder = f"History messages:{self.global_workspace.context},current message:{user_message}"
+        messages_recorder = f"{current_context}\nHistory messages:{self.global_workspace.context},current message:{user_message}"
         self.global_workspace.add_to_context(f"Owner:{user_message}")
         messages: List[Dict[str, Any]] = [
-            {"role": "system", "content": f"{who_you_are}"},
-            {"role": "developer", "content": what_your_job_is},
+            {"role": "developer", "content": STATIC_JOB_PROMPT},
+            {"role": "system", "content": who_you_are},
             {"role": "user", "content": messages_recorder}
         ]
         print(f"Prepared 'system messages' for LLM: {who_you_are}")
@@ -95,10 +108,28 @@ class Brain:
         print(f"Prepared 'user messages' for LLM: {messages_recorder}")
         # --- 3. Get THE EMOTIONAL STATE ---
         max_steps = self.global_workspace.emotion["energy"]
+        tool_selection = None
+        called_tools: List[str] = []
+        steps_taken = 0
 
         try:
             # --- 意图理解层 ---
-            plan_json = await self.llm_provider.think_with_tools(messages, model_choice="powerful")
+            # The plan is streamed field by field: we stop reading as soon as we know
+            # enough to act (a zero-step answer, or the step budget plus the thinking).
+            plan_json = {}
+            plan_stream = self.llm_provider.stream_json_fields(messages, model_choice="powerful")
+            try:
+                async for key, value in plan_stream:
+                    plan_json[key] = value
+                    if "max_steps" not in plan_json:
+                        continue
+                    if int(plan_json["max_steps"]) == 0:
+                        if "response" in plan_json:
+                            break
+                    elif "thinking" in plan_json:
+                        break
+            finally:
+                await plan_stream.aclose()
             print(f"--------------------------------------------------------")
             print(f"Plan JSON received from LLM: {plan_json}")
             
@@ -109,6 +140,7 @@ class Brain:
                 print(f"--------------------------------------------------------")
                 print(f"Final response from LLM(0 steps): {final_response}")
                 self.global_workspace.add_to_context(f"You:{final_response}")
+                self.global_workspace.finish_turn(user_message, final_response)
                 await self.global_workspace.save()
                 print (f"Workspace for user {self.user_id} saved.")
                 return final_response
@@ -120,15 +152,19 @@ class Brain:
             self.global_workspace.add_to_context(f"You:{json.dumps(plan_json)}")
 
             excuse_hitory = {}
+            # Choose the step tools once from the plan and the message, then reuse them every step
+            tool_selection = await TOOL_SELECTOR.select(self.llm_provider, f"{thinking_plan}\n{user_message}")
+            print(f"Tools selected for this request: {tool_selection.names}")
 
             for step in range(min(max_steps,10)):
                 print(f"\n--- Brain Step {step + 1} ---")
+                steps_taken = step + 1
 
                 record_messages: List[Dict[str, Any]] = [
-                    {"role": "system", "content": f"{who_you_are}"},
-                    {"role": "user", "content": f"Based on our conversation history and your plan, execute the next step. Your plan was: '{thinking_plan}'. The original request was: '{user_message}'. Here is the excuse history so far: '{json.dumps(excuse_hitory)}'."},
+                    {"role": "system", "content": who_you_are},
+                    {"role": "user", "content": f"{current_context}\nBased on our conversation history and your plan, execute the next step. Your plan was: '{thinking_plan}'. The original request was: '{user_message}'. Here is the excuse history so far: '{to_json(excuse_hitory)}'."},
                 ]
-                response_message = await self.llm_provider.think_with_tools(record_messages, self.tool_registry.get_definitions_for_llm(), model_choice="fast")
+                response_message = await self.llm_provider.think_with_tools(record_messages, tool_selection.tools, model_choice="fast")
                 
                 print(f"--------------------------------------------------------")
                 print(f"Response from LLM (Step {step+1}): {response_message}")
@@ -141,37 +177,39 @@ class Brain:
 
                     for tool_call in response_message.tool_calls:
                         function_name = tool_call.function.name
-                        function_args = json.loads(tool_call.function.arguments)
+                        try:
+                            function_args = json.loads(tool_call.function.arguments)
+                        except json.JSONDecodeError:
+                            # Let the registry report it as an argument error within this step
+                            function_args = tool_call.function.arguments
                         print(f"Invoking function: {function_name}({function_args})")
+                        called_tools.append(function_name)
 
-                        tool_info = self.tool_registry.get_tool_for_execution(function_name)
-                        
-                        if not tool_info:
+                        if self.tool_registry.get_tool_for_execution(function_name) is None:
                             excuse_hitory[f"Step {step+1} result"]=f"Error: Function '{function_name}' is not registered."
                             continue
                         else:
-                            source_repo_name = tool_info["source_repo"]
-                            method_name = tool_info["internal_method_name"]
-                            instance_repo = self.repository_map[source_repo_name]
-                            result = await getattr(instance_repo, method_name)(**function_args)
+                            result = await self.tool_registry.dispatch(function_name, self.repository_map, function_args)
                             
                             print(f"Observation: {result}")
                             excuse_hitory[f"Step {step+1} result"]={
                                     "role": "tool",
                                     "tool_call_id": tool_call.id,
                                     "name": function_name,
-                                    "content": str(result), # Result must be a string
+                                    "content": to_json(result), # Result must be a string
                                 }
-                        self.global_workspace.add_to_context(f"Tool Result ({function_name}): {str(result)}")
+                        self.global_workspace.add_to_context(f"Tool Result ({function_name}): {to_json(result)}")
                     continue
                 elif response_message.content:
                     self.global_workspace.add_to_context(f"You:{response_message.content}")
                     print(f"Final response from LLM (Step {step+1}): {response_message.content}")
+                    self.global_workspace.finish_turn(user_message, response_message.content)
                     await self.global_workspace.save()
                     return response_message.content
                 else:
                     return "The process is compelete."
             final_answer = "I have completed the steps based on my plan."
+            self.global_workspace.finish_turn(user_message, final_answer)
             await self.global_workspace.save()
             return final_answer
                     
@@ -181,4 +219,7 @@ class Brain:
         except Exception as e:
             print(f"An error occurred: {e}")
             return "Sorry, I encountered an error."
+        finally:
+            if tool_selection is not None:
+                TOOL_SELECTOR.log_outcome(tool_selection, called_tools, steps_taken)
         
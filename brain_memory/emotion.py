@@ -1,8 +1,6 @@
 import json
-from openai import AsyncOpenAI
 from typing import List
-from qdrant_client import models # Import the models for filtering
-from database import redis_client, qdrant_client, MEMORY_COLLECTION_NAME # Import Qdrant client
+import database
 
 
 class Emotion:
@@ -13,12 +11,12 @@ class Emotion:
         # --- Redis for Caching and Emotion ---
     async def get_emotion_state(self) -> dict:
         """Gets the current emotion state from the Redis cache."""
-        state = await redis_client.get(f"user:{self.user_id}:emotion")
+        state = await database.redis_client.get(f"user:{self.user_id}:emotion")
         return json.loads(state) if state else {"mood": "neutral", "confidence": 0.5}
 
     async def save_emotion_state(self, state: dict):
         """Saves the emotion state to the Redis cache with a 24h expiration."""
-        await redis_client.set(f"user:{self.user_id}:emotion", json.dumps(state), ex=86400)
+        await database.redis_client.set(f"user:{self.user_id}:emotion", json.dumps(state), ex=86400)
 
     async def update_emotion(self, feedback: str):
         """Updates the emotion state based on feedback."""
@@ -1,51 +1,149 @@
+import asyncio
+import logging
 import os
-import redis.asyncio as redis
-from motor.motor_asyncio import AsyncIOMotorClient
-from qdrant_client import AsyncQdrantClient, models # Import Qdrant classes
-from dotenv import load_dotenv
+import time
+from typing import Any, Dict
 
-load_dotenv()
+logger = logging.getLogger(__name__)
 
-# --- NoSQL DB Client (MongoDB) ---
 # --- Connection Config ---
-# MONGO_URI = "mongodb://localhost:27017/"
-# DB_NAME = "evolvra_db"
+# Clients are created by init_clients() (the FastAPI lifespan calls it before serving) and
+# closed by close_clients(). Use them as attributes at call time, e.g. database.tasks_collection:
+# `from database import tasks_collection` at import time would bind a client too early.
+# Importing this module has no side effects: the settings below are read from the
+# environment (and .env) by load_settings(), and the driver SDKs are imported by init_clients().
+DB_NAME = "EvolvraMainMemory"
+HEALTH_CHECK_TIMEOUT_SECONDS = 2.0
 
 
-# --- Global Async Client Instance ---
-MONGO_URI = os.getenv("MONGO_URI")
-client = AsyncIOMotorClient(MONGO_URI)
-db = client["EvolvraMainMemory"]
+def load_settings():
+    """Loads .env into the environment and reads the connection settings from it."""
+    from dotenv import load_dotenv
+
+    global MONGO_URI, MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE, MONGO_SERVER_SELECTION_TIMEOUT_MS
+    global REDIS_URL, REDIS_MAX_CONNECTIONS, QDRANT_CLUSTER_URL, QDRANT_API_KEY, QDRANT_TIMEOUT_SECONDS, WARMUP_CONNECTIONS
+    load_dotenv()
+    MONGO_URI = os.getenv("MONGO_URI")
+    MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+    MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "5")) # Kept open by the driver
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+    REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+    QDRANT_CLUSTER_URL = os.getenv("QDRANT_CLUSTER_URL")
+    QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
+    QDRANT_TIMEOUT_SECONDS = int(os.getenv("QDRANT_TIMEOUT_SECONDS", "30"))
+    # Connections opened per pool before the worker accepts traffic
+    WARMUP_CONNECTIONS = int(os.getenv("WARMUP_CONNECTIONS", "4"))
+
 
 # --- Collections ---
-users_collection = db["users"]
-tasks_collection = db["tasks"]
-goals_collection = db["goals"]
-persona_collection = db["persona"]
-user_profiles_collection = db["user_profiles"]
-
-# --- Redis Client ---
-redis_client = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
-
-# --- Vector DB Client (Qdrant) ---
-# It's recommended to use the standard http client for cloud connections
-QDRANT_CLUSTER_URL = os.getenv("QDRANT_CLUSTER_URL")
-QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
-if QDRANT_CLUSTER_URL and QDRANT_API_KEY:
+COLLECTION_NAMES = {
+    "users_collection": "users",
+    "tasks_collection": "tasks",
+    "goals_collection": "goals",
+    "persona_collection": "persona",
+    "user_profiles_collection": "user_profiles",
+    "task_events_collection": "task_events", # Time series, see TaskEventRepository
+    "task_stats_collection": "task_stats",
+}
+_CLIENT_NAMES = {"client", "db", "redis_client", "qdrant_client", *COLLECTION_NAMES}
+_SETTING_NAMES = {
+    "MONGO_URI", "MONGO_MAX_POOL_SIZE", "MONGO_MIN_POOL_SIZE", "MONGO_SERVER_SELECTION_TIMEOUT_MS", "REDIS_URL",
+    "REDIS_MAX_CONNECTIONS", "QDRANT_CLUSTER_URL", "QDRANT_API_KEY", "QDRANT_TIMEOUT_SECONDS", "WARMUP_CONNECTIONS",
+}
+
+
+def init_clients():
+    """Creates the MongoDB, Redis and Qdrant clients with their pool settings. Idempotent."""
+    if "client" in globals():
+        return
+    import redis.asyncio as redis
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from qdrant_client import AsyncQdrantClient
+
+    global client, db, redis_client, qdrant_client
+    load_settings()
+    # --- NoSQL DB Client (MongoDB) ---
+    client = AsyncIOMotorClient(
+        MONGO_URI,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    )
+    db = client[DB_NAME]
+    for attribute, collection_name in COLLECTION_NAMES.items():
+        globals()[attribute] = db[collection_name]
+
+    # --- Redis Client ---
+    redis_client = redis.Redis.from_url(REDIS_URL, max_connections=REDIS_MAX_CONNECTIONS, decode_responses=True)
+
+    # --- Vector DB Client (Qdrant) ---
+    # It's recommended to use the standard http client for cloud connections
+    qdrant_client = None
+    if QDRANT_CLUSTER_URL and QDRANT_API_KEY:
+        qdrant_client = AsyncQdrantClient(url=QDRANT_CLUSTER_URL, api_key=QDRANT_API_KEY, timeout=QDRANT_TIMEOUT_SECONDS)
+    else:
+        logger.warning("QDRANT_CLUSTER_URL or QDRANT_API_KEY not set in environment variables.")
+
+
+def __getattr__(name: str):
+    """Scripts that never ran the lifespan get the settings and clients created on first use."""
+    if name in _SETTING_NAMES:
+        load_settings()
+        return globals()[name]
+    if name in _CLIENT_NAMES:
+        init_clients()
+        return globals()[name]
+    raise AttributeError(f"module 'database' has no attribute '{name}'")
+
+
+async def warmup():
+    """Opens WARMUP_CONNECTIONS connections per pool in parallel, so the first requests don't pay for connection setup."""
+    init_clients()
+    pings = [client.admin.command("ping") for _ in range(WARMUP_CONNECTIONS)]
+    pings += [redis_client.ping() for _ in range(WARMUP_CONNECTIONS)]
+    if qdrant_client is not None:
+        pings.append(qdrant_client.get_collections())
+    await asyncio.gather(*pings)
+
+
+async def _timed(check) -> Dict[str, Any]:
+    started = time.perf_counter()
     try:
-        qdrant_client = AsyncQdrantClient(
-            url=QDRANT_CLUSTER_URL,
-            api_key=QDRANT_API_KEY,
-            timeout=30
-        )
+        await asyncio.wait_for(check, timeout=HEALTH_CHECK_TIMEOUT_SECONDS)
+        status = {"status": "ok"}
     except Exception as e:
-        print(f"Error initializing Qdrant client: {e}")
-else:
-    print("QDRANT_CLUSTER_URL or QDRANT_API_KEY not set in environment variables.")
-    
+        status = {"status": "error", "error": f"{type(e).__name__}: {e}"}
+    status["latency_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return status
+
+
+async def check_dependencies() -> Dict[str, Dict[str, Any]]:
+    """One round trip to each datastore, concurrently, with its latency."""
+    init_clients()
+    checks = {"mongodb": client.admin.command("ping"), "redis": redis_client.ping()}
+    if qdrant_client is not None:
+        checks["qdrant"] = qdrant_client.get_collections()
+    results = dict(zip(checks, await asyncio.gather(*(_timed(check) for check in checks.values()))))
+    if qdrant_client is None:
+        results["qdrant"] = {"status": "disabled", "latency_ms": None}
+    return results
+
+
+async def close_clients():
+    """Closes every pool. The next access creates fresh clients."""
+    if "client" not in globals():
+        return
+    client.close()
+    await redis_client.aclose()
+    if qdrant_client is not None:
+        await qdrant_client.close()
+    for name in _CLIENT_NAMES:
+        globals().pop(name, None)
+
 '''
-We have to tell Qdrant the size of the vectors we'll be storing 
-(1536 for OpenAI's text-embedding-3-small model) 
-and the distance metric to use for calculating similarity 
+We have to tell Qdrant the size of the vectors we'll be storing
+(1536 for OpenAI's text-embedding-3-small model)
+and the distance metric to use for calculating similarity
 (Cosine is standard for text embeddings).
-'''
\ No newline at end of file
+'''
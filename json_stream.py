@@ -0,0 +1,74 @@
+import json
+from typing import Any, List, Tuple
+
+
+class IncrementalJSONParser:
+    """
+    Incrementally parses a streamed top-level JSON object.
+    Every call to feed() returns the (key, value) pairs that became complete
+    with that chunk, so callers can act on early fields before the object closes.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._key_start: int | None = None
+        self._key: str | None = None
+        self._value_start: int | None = None
+        self.done = False
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Consumes a chunk of text and returns the fields completed by it."""
+        completed: List[Tuple[str, Any]] = []
+        if self.done or not chunk:
+            return completed
+
+        self._buffer += chunk
+        buffer = self._buffer
+        for i in range(self._pos, len(buffer)):
+            c = buffer[i]
+
+            # --- Inside a string: only watch for escapes and the closing quote ---
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._key is None and self._key_start is not None:
+                        self._key = json.loads(buffer[self._key_start:i + 1])
+                        self._key_start = None
+                continue
+
+            if c == '"':
+                self._in_string = True
+                if self._depth == 1 and self._key is None:
+                    self._key_start = i
+            elif c in "{[":
+                self._depth += 1
+            elif c in "}]":
+                if self._depth == 1:
+                    self._finish_value(i, completed)
+                    self.done = True
+                    self._pos = i + 1
+                    return completed
+                self._depth -= 1
+            elif self._depth == 1 and c == ":":
+                self._value_start = i + 1
+            elif self._depth == 1 and c == ",":
+                self._finish_value(i, completed)
+
+        self._pos = len(buffer)
+        return completed
+
+    def _finish_value(self, end: int, completed: List[Tuple[str, Any]]):
+        """Decodes the pending top-level value that ends right before `end`."""
+        if self._key is not None and self._value_start is not None:
+            value = json.loads(self._buffer[self._value_start:end])
+            completed.append((self._key, value))
+        self._key = None
+        self._value_start = None
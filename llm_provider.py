@@ -1,17 +1,37 @@
 # brain/llm_provider.py
-from openai import AsyncOpenAI
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncIterator, Tuple
+import asyncio
 import os
 import json
+from json_stream import IncrementalJSONParser
+
+STREAM_DRAIN_TIMEOUT_SECONDS = 60 # Longest a stream closed early is read on for its usage
 
 class LLMProvider:
     def __init__(self):
+        from openai import AsyncOpenAI # The SDK takes a while to import; only load it when a provider is built
+
         self.clients = {
             "fast": AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY")),
             "powerful": AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY")),
             # "o3": AnthropicClient(...),
             # "gpt5": ...
         }
+        # Running token totals for this provider, including prompt-cache hits
+        self.usage_totals = {"prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0}
+        self._drains: set = set() # Streams read on in the background for their usage
+
+    def _record_usage(self, usage) -> None:
+        """Adds the API-reported usage of one call to the totals and logs the cache hit rate."""
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = (getattr(details, "cached_tokens", 0) or 0) if details else 0
+        self.usage_totals["prompt_tokens"] += usage.prompt_tokens
+        self.usage_totals["cached_tokens"] += cached_tokens
+        self.usage_totals["completion_tokens"] += usage.completion_tokens
+        hit_rate = cached_tokens / usage.prompt_tokens if usage.prompt_tokens else 0.0
+        print(f"LLM usage: prompt={usage.prompt_tokens} (cached={cached_tokens}, {hit_rate:.0%}), completion={usage.completion_tokens}")
 
     async def think_with_tools(self, messages: List[Dict], tools: List[Dict] = "", model_choice: str = "powerful") -> Dict[str, Any]:
         """Generates a response from the chosen LLM with tool usage."""        
@@ -23,6 +43,7 @@ class LLMProvider:
                 messages=messages,
                 response_format={"type": "json_object"},
             )
+            self._record_usage(response.usage)
             content = response.choices[0].message.content
             return json.loads(content)
         
@@ -34,9 +55,85 @@ class LLMProvider:
                 tools=tools,
                 tool_choice="auto",
             )
+            self._record_usage(response.usage)
             return response.choices[0].message
         
         else:
             raise ValueError("Requested LLM model is not available.")
 
+    async def complete_json(self, messages: List[Dict], model: str) -> Dict[str, Any]:
+        """One JSON-object completion with an explicitly chosen (e.g. cheaper) model, for background jobs."""
+        response = await self.clients["fast"].chat.completions.create(
+            model=model,
+            messages=messages,
+            response_format={"type": "json_object"},
+        )
+        self._record_usage(response.usage)
+        return json.loads(response.choices[0].message.content)
+
+    async def embed(self, texts: List[str], model: str = "text-embedding-3-small", dimensions: int | None = None) -> List[List[float]]:
+        """
+        Embeds a batch of texts in a single API call, preserving the input order.
+        text-embedding-3 models return shortened vectors when dimensions is given.
+        """
+        options = {"dimensions": dimensions} if dimensions else {}
+        response = await self.clients["fast"].embeddings.create(model=model, input=texts, **options)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    async def stream_json_fields(self, messages: List[Dict], model_choice: str = "powerful") -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Streams a JSON-object completion and yields each top-level (key, value) pair
+        as soon as it is complete. The caller may close the generator early and act on the
+        fields it has; the rest of the stream is then read in the background, because the
+        usage (with the prompt-cache hits) only comes in its final chunk.
+        """
+        client = self.clients.get(model_choice)
+        if client is None:
+            raise ValueError("Requested LLM model is not available.")
+
+        stream = await client.chat.completions.create(
+            model="gpt-5", # This would also be dynamic
+            messages=messages,
+            response_format={"type": "json_object"},
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        parser = IncrementalJSONParser()
+        try:
+            async for chunk in stream:
+                # The final chunk carries the usage and no choices
+                self._record_usage(chunk.usage)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                for field in parser.feed(delta):
+                    yield field
+        except GeneratorExit:
+            self._drain_in_background(stream)
+            raise
+        except BaseException:
+            await stream.close()
+            raise
+        await stream.close()
+
+    def _drain_in_background(self, stream) -> None:
+        """Reads a stream the caller stopped reading to its end, only to record its usage."""
+        async def read_usage():
+            async for chunk in stream:
+                self._record_usage(chunk.usage)
+
+        async def drain():
+            try:
+                await asyncio.wait_for(read_usage(), timeout=STREAM_DRAIN_TIMEOUT_SECONDS)
+            except Exception as e:
+                print(f"Could not read the usage of a stream closed early: {e}")
+            finally:
+                await stream.close()
+
+        task = asyncio.create_task(drain())
+        self._drains.add(task)
+        task.add_done_callback(self._drains.discard)
+
         
\ No newline at end of file
@@ -0,0 +1,199 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, NamedTuple, Tuple
+
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+# --- Long-term memory (Qdrant) ---
+# Every user has their own collection of memory points: {text, user_id, importance, created_at, source, mentions, last_seen}.
+# Readers and writers use the alias memories-{user_id}; it points at a physical collection named
+# for its vector layout (memories-{user_id}--d512-int8), so a layout change is a migration behind
+# the alias (see memory_migration.py). Collections created before aliases are plain collections
+# named memories-{user_id} and are used as they are until migrated. Until then a user's collection
+# can have other dimensions than configured, so readers and writers embed for the collection the
+# alias points at (collection_embedding_params), not for the configured layout.
+EMBEDDING_MODEL = "text-embedding-3-small"
+FULL_VECTOR_SIZE = 1536 # Native dimension of EMBEDDING_MODEL
+FROZEN_WAIT_SECONDS = 120 # Longest a writer waits for a migration to switch the user's collection
+FROZEN_POLL_SECONDS = 0.5
+
+_ensured_collections: set = set() # Known to exist in this process
+_collection_dimensions: Dict[str, Tuple[str, int]] = {} # alias -> (switch generation, vector size)
+
+
+class VectorSettings(NamedTuple):
+    """Vector layout of memory collections, configured with MEMORY_* environment variables."""
+    dimensions: int # text-embedding-3 models shorten their vectors to this many dimensions
+    quantization: str # "int8" (scalar quantization, rescored with the original vectors) or "none"
+    oversampling: float # Candidates fetched per result from the quantized index before rescoring
+    on_disk_vectors: bool # Original vectors on disk; with int8 they are only read for rescoring
+    on_disk_payload: bool
+
+    @property
+    def layout(self) -> str:
+        return f"d{self.dimensions}-{self.quantization}"
+
+
+def vector_settings() -> VectorSettings:
+    """Read at call time, so .env loaded at startup (database.load_settings) applies."""
+    return VectorSettings(
+        dimensions=int(os.getenv("MEMORY_VECTOR_DIMENSIONS", str(FULL_VECTOR_SIZE))),
+        quantization=os.getenv("MEMORY_QUANTIZATION", "int8"),
+        oversampling=float(os.getenv("MEMORY_OVERSAMPLING", "2.0")),
+        on_disk_vectors=os.getenv("MEMORY_VECTORS_ON_DISK", "true").lower() == "true",
+        on_disk_payload=os.getenv("MEMORY_PAYLOAD_ON_DISK", "true").lower() == "true",
+    )
+
+
+def memory_collection_name(user_id: str) -> str:
+    """The name every reader and writer uses: an alias, or a collection created before aliases."""
+    return f"memories-{user_id}"
+
+
+def physical_collection_name(user_id: str, settings: VectorSettings | None = None) -> str:
+    return f"{memory_collection_name(user_id)}--{(settings or vector_settings()).layout}"
+
+
+def memory_embedding_params(settings: VectorSettings | None = None) -> Dict[str, Any]:
+    """
+    Keyword arguments for embeddings.create / LLMProvider.embed matching the configured layout,
+    for collections being created in it (migrations). Live reads and writes use collection_embedding_params.
+    """
+    return {"model": EMBEDDING_MODEL, "dimensions": (settings or vector_settings()).dimensions}
+
+
+def memory_collection_config(settings: VectorSettings | None = None) -> Dict[str, Any]:
+    """Keyword arguments for create_collection with the configured layout."""
+    from qdrant_client import models
+
+    settings = settings or vector_settings()
+    config = {
+        "vectors_config": models.VectorParams(
+            size=settings.dimensions,
+            distance=models.Distance.COSINE,
+            on_disk=settings.on_disk_vectors,
+        ),
+        "on_disk_payload": settings.on_disk_payload,
+    }
+    if settings.quantization == "int8":
+        config["quantization_config"] = models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+    return config
+
+
+def memory_search_params(settings: VectorSettings | None = None):
+    """Search params for query_points: quantized candidates, rescored with the original vectors."""
+    from qdrant_client import models
+
+    settings = settings or vector_settings()
+    if settings.quantization == "none":
+        return None
+    return models.SearchParams(
+        quantization=models.QuantizationSearchParams(rescore=True, oversampling=settings.oversampling)
+    )
+
+
+async def _exists(qdrant, name: str) -> bool:
+    """True for a collection or an alias of one."""
+    try:
+        await qdrant.get_collection(collection_name=name)
+        return True
+    except Exception:
+        return False
+
+
+def migration_switch_key(user_id: str) -> str:
+    """
+    Redis hash a migration sets while it switches the user's collection: "frozen_until"
+    (epoch seconds; writers wait until then, so a crashed migration does not block them
+    for good) and "generation" (bumped by every switch, so cached vector sizes are re-read).
+    """
+    return f"memory_migration:switch:{user_id}"
+
+
+async def _switch_state(redis, user_id: str) -> Tuple[bool, str]:
+    try:
+        state = await redis.hgetall(migration_switch_key(user_id))
+    except RedisError as e:
+        logger.warning(f"Could not read the memory migration state of user '{user_id}': {e}")
+        return False, ""
+    return float(state.get("frozen_until") or 0) > time.time(), state.get("generation", "")
+
+
+async def collection_embedding_params(qdrant, redis, user_id: str, write: bool = False) -> Dict[str, Any]:
+    """
+    Keyword arguments for LLMProvider.embed matching the collection behind the user's alias
+    (a collection that does not exist yet gets the configured layout). The vector size is
+    cached per switch generation. Writers (write=True) first wait while a migration switches
+    the collection, so nothing is written with the old dimensions after the switch.
+    """
+    frozen, generation = await _switch_state(redis, user_id)
+    waited = 0.0
+    while write and frozen:
+        if waited >= FROZEN_WAIT_SECONDS:
+            raise RuntimeError(f"The memory collection of user '{user_id}' is still being migrated")
+        await asyncio.sleep(FROZEN_POLL_SECONDS)
+        waited += FROZEN_POLL_SECONDS
+        frozen, generation = await _switch_state(redis, user_id)
+
+    collection_name = memory_collection_name(user_id)
+    cached = _collection_dimensions.get(collection_name)
+    if cached is not None and cached[0] == generation and not frozen:
+        dimensions = cached[1]
+    else:
+        try:
+            info = await qdrant.get_collection(collection_name=collection_name)
+            dimensions = info.config.params.vectors.size
+            if not frozen:
+                _collection_dimensions[collection_name] = (generation, dimensions)
+        except Exception:
+            dimensions = vector_settings().dimensions # Created with the configured layout on first write
+    return {"model": EMBEDDING_MODEL, "dimensions": dimensions}
+
+
+async def ensure_memory_collection(qdrant, user_id: str) -> str:
+    """
+    Creates the user's memory collection with the configured layout and its alias, unless the
+    alias (or a collection from before aliases) exists. Checked once per process. Returns the
+    name to read and write with.
+    """
+    collection_name = memory_collection_name(user_id)
+    if collection_name in _ensured_collections:
+        return collection_name
+    if not await _exists(qdrant, collection_name):
+        from qdrant_client import models
+
+        physical_name = physical_collection_name(user_id)
+        try:
+            if not await _exists(qdrant, physical_name):
+                await qdrant.create_collection(collection_name=physical_name, **memory_collection_config())
+            await qdrant.update_collection_aliases(change_aliases_operations=[
+                models.CreateAliasOperation(create_alias=models.CreateAlias(collection_name=physical_name, alias_name=collection_name))
+            ])
+            logger.info(f"Created memory collection '{physical_name}' as '{collection_name}'")
+        except Exception:
+            # Another worker may have created it in the meantime
+            if not await _exists(qdrant, collection_name):
+                raise
+    _ensured_collections.add(collection_name)
+    return collection_name
+
+
+def memory_payload(user_id: str, text: str, importance: int, created_at: datetime | None = None, source: str = "conversation") -> Dict[str, Any]:
+    """Payload of one memory point. importance is 1-10; mentions and last_seen grow with near-duplicates (memory_dedup)."""
+    created_at = created_at or datetime.now(timezone.utc)
+    return {
+        "text": text,
+        "user_id": user_id,
+        "importance": min(max(int(importance), 1), 10),
+        "created_at": created_at.isoformat(),
+        "source": source,
+        "mentions": 1,
+        "last_seen": created_at.isoformat(),
+    }
@@ -1,9 +1,69 @@
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Depends
+from fastapi.responses import JSONResponse
 from api.models import UserMessage, AIResponse
 from api.dependencies import get_brain
 from brain2 import Brain
+import database
+from operation_library.index_manager import ensure_indexes
+from memory_consolidation import MemoryConsolidator
+from operation_library.profile_compaction import ProfileCompactor
+from qdrant_write_buffer import close_shared_write_buffer
+from reminders import ReminderDispatcher
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Opens and warms the datastore pools before the worker serves traffic, starts the
+    background jobs, and on shutdown stops them (claimed but unsent reminders go back into
+    the due queue) and drains the Qdrant write buffer before closing the pools.
+    """
+    logging.basicConfig(level=logging.INFO)
+    app.state.ready = False
+    database.init_clients()
+    await database.warmup()
+    # Creates any missing declared indexes. Idempotent, so it runs on every startup.
+    await ensure_indexes(database.db)
+    background_jobs = [ReminderDispatcher(database.redis_client, database.tasks_collection), ProfileCompactor()]
+    if database.qdrant_client is not None:
+        # Finished turns become long-term memories off the request path
+        background_jobs.append(MemoryConsolidator(database.redis_client, database.qdrant_client))
+    for job in background_jobs:
+        job.start()
+    app.state.ready = True
+    try:
+        yield
+    finally:
+        app.state.ready = False
+        for job in background_jobs:
+            await job.stop()
+        # Memory writes the jobs buffered go out before the Qdrant client closes
+        await close_shared_write_buffer()
+        await database.close_clients()
+
+
+app = FastAPI(lifespan=lifespan)
+
+# --- Health Probes ---
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process answers. Reports each datastore's status and round-trip latency."""
+    return {"status": "ok", "dependencies": await database.check_dependencies()}
 
-app = FastAPI()
+@app.get("/readyz")
+async def readyz():
+    """Readiness: 503 until startup finished and while any configured datastore is unreachable."""
+    dependencies = await database.check_dependencies()
+    ready = getattr(app.state, "ready", False) and all(
+        check["status"] in ("ok", "disabled") for check in dependencies.values()
+    )
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not_ready", "dependencies": dependencies},
+    )
 
 @app.post("/process-message", response_model=AIResponse)
 async def process_message_endpoint(
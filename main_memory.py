@@ -0,0 +1,172 @@
+import heapq
+import math
+import re
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Tuple
+
+# --- Main memory settings ---
+MAIN_MEMORY_TOKEN_BUDGET = 800 # Size of the "Core Memories" prompt section
+DECAY_PER_DAY = 0.1 # λ: without access, an item's retention halves in about a week
+DEFAULT_IMPORTANCE = 5 # 1-10
+MIN_SHARED_WORDS = 2 # A message sharing this many words with an item counts as an access
+
+_WORD = re.compile(r"[^\W\d_]{4,}", re.UNICODE)
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def _parse_time(value) -> datetime:
+    if isinstance(value, datetime):
+        moment = value
+    else:
+        try:
+            moment = datetime.fromisoformat(str(value))
+        except ValueError:
+            moment = datetime.now(timezone.utc)
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+def _days(value) -> float:
+    return _parse_time(value).timestamp() / 86400
+
+
+def retention_key(item: dict) -> float:
+    """
+    An item's retention at time t is weight * exp(-λ (t - last_accessed)), the weight coming
+    from its importance and access count. Every item decays by the same exp(-λ t) factor,
+    so their order never changes with time, and log(weight) + λ * last_accessed (in days)
+    ranks them once, when the item is inserted or accessed. The lowest key is evicted first.
+    """
+    weight = item["importance"] * (1 + math.log1p(item["access_count"]))
+    return math.log(weight) + DECAY_PER_DAY * _days(item["last_accessed"])
+
+
+def _bounded(value, default: int, low: int, high: int | None = None) -> int:
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(number, low) if high is None else min(max(number, low), high)
+
+
+def new_item(text: str, importance: int = DEFAULT_IMPORTANCE, now: datetime | None = None) -> dict:
+    now = (now or datetime.now(timezone.utc)).isoformat()
+    return {
+        "id": uuid.uuid4().hex,
+        "text": text,
+        "importance": _bounded(importance, DEFAULT_IMPORTANCE, 1, 10),
+        "access_count": 0,
+        "created_at": now,
+        "last_accessed": now,
+    }
+
+
+def _normalize(item) -> dict:
+    """Items stored before they had metadata were plain "{iso time}: {text}" strings."""
+    if isinstance(item, dict):
+        merged = {**new_item(item.get("text", "")), **item}
+        # Stored values are clamped after merging: retention_key needs importance >= 1 and access_count >= 0
+        merged["importance"] = _bounded(merged["importance"], DEFAULT_IMPORTANCE, 1, 10)
+        merged["access_count"] = _bounded(merged["access_count"], 0, 0)
+        return merged
+    created, separator, text = str(item).partition(": ")
+    if separator:
+        try:
+            return new_item(text, now=_parse_time(datetime.fromisoformat(created)))
+        except ValueError:
+            pass
+    return new_item(str(item))
+
+
+class MainMemory:
+    """
+    The owner's core memories, kept within MAIN_MEMORY_TOKEN_BUDGET tokens.
+
+    Items carry importance, access count and timestamps. A min-heap on retention_key
+    (time-invariant, see there) finds the item to evict in O(log n). An access pushes the
+    item again with its new key, and stale heap entries are skipped when popped, so
+    inserts and accesses are O(log n) as well. Evicted items are collected in 'evicted'
+    for demotion to long-term memory, not lost.
+    """
+
+    def __init__(self, items: Iterable = (), token_budget: int = MAIN_MEMORY_TOKEN_BUDGET):
+        self._token_budget = token_budget
+        self._items: Dict[str, dict] = {}
+        self._heap: List[Tuple[float, str]] = []
+        self._tokens = 0
+        self.evicted: List[dict] = []
+        for item in items:
+            item = _normalize(item)
+            self._items[item["id"]] = item
+            self._tokens += estimate_tokens(item["text"])
+        self._heap = [(retention_key(item), item_id) for item_id, item in self._items.items()]
+        heapq.heapify(self._heap)
+        self._evict()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    @property
+    def tokens(self) -> int:
+        return self._tokens
+
+    def remember(self, text: str, importance: int = DEFAULT_IMPORTANCE, now: datetime | None = None) -> dict:
+        """Adds an item, evicting the least retained ones beyond the budget (possibly the new one)."""
+        item = new_item(text, importance, now)
+        self._items[item["id"]] = item
+        self._tokens += estimate_tokens(text)
+        heapq.heappush(self._heap, (retention_key(item), item["id"]))
+        self._evict()
+        return item
+
+    def touch(self, item_ids: Iterable[str], now: datetime | None = None):
+        """Records an access: bumps the count and recency, which raises the item's key."""
+        now = (now or datetime.now(timezone.utc)).isoformat()
+        for item_id in item_ids:
+            item = self._items.get(item_id)
+            if item is None:
+                continue
+            item["access_count"] += 1
+            item["last_accessed"] = now
+            heapq.heappush(self._heap, (retention_key(item), item_id))
+        if len(self._heap) > 2 * len(self._items) + 16:
+            # Drop stale entries once they dominate the heap (amortized O(1) per access)
+            self._heap = [(retention_key(item), item_id) for item_id, item in self._items.items()]
+            heapq.heapify(self._heap)
+
+    def recall(self, message: str, now: datetime | None = None) -> List[str]:
+        """Touches the items that share at least MIN_SHARED_WORDS words with the message."""
+        words = {word.lower() for word in _WORD.findall(message)}
+        recalled = [
+            item_id for item_id, item in self._items.items()
+            if len(words & {word.lower() for word in _WORD.findall(item["text"])}) >= MIN_SHARED_WORDS
+        ]
+        self.touch(recalled, now)
+        return recalled
+
+    def _evict(self):
+        while self._tokens > self._token_budget and self._heap:
+            key, item_id = heapq.heappop(self._heap)
+            item = self._items.get(item_id)
+            if item is None or key != retention_key(item):
+                continue # Stale: the item was accessed (pushed again) or already evicted
+            del self._items[item_id]
+            self._tokens -= estimate_tokens(item["text"])
+            self.evicted.append(item)
+
+    def take_evicted(self) -> List[dict]:
+        evicted, self.evicted = self.evicted, []
+        return evicted
+
+    def to_list(self) -> List[dict]:
+        """Items oldest first, as stored."""
+        return sorted(self._items.values(), key=lambda item: _parse_time(item["created_at"]))
+
+    def lines(self) -> List[str]:
+        return [f"{item['created_at']}: {item['text']}" for item in self.to_list()]
@@ -0,0 +1,326 @@
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from redis.exceptions import RedisError, ResponseError
+
+from long_term_memory import EMBEDDING_MODEL, collection_embedding_params, ensure_memory_collection, memory_payload
+from memory_dedup import Fingerprint, MemoryDeduplicator, bump_memories, existing_points
+from qdrant_write_buffer import QdrantWriteBuffer, shared_write_buffer
+
+logger = logging.getLogger(__name__)
+
+# --- Consolidation settings ---
+TURN_STREAM_KEY = "memory:turns"
+CONSUMER_GROUP = "consolidation"
+STREAM_MAX_LENGTH = 100_000 # Approximate; unconsolidated turns beyond it are dropped
+READ_COUNT = 200 # Turns per read
+BLOCK_MS = 5000
+TURNS_PER_PROMPT = 20 # One extraction call per user per this many turns
+EMBED_BATCH_SIZE = 512 # Texts per embedding call
+MAX_ATTEMPTS = 3 # A turn that failed this often is dropped
+CLAIM_IDLE_MS = 300_000 # Turns pending this long on another consumer (a dead worker) are taken over
+RETRY_SECONDS = 30
+CONSOLIDATION_MODEL = "gpt-5-nano" # Extraction is simple; the cheapest model is enough
+
+EXTRACTION_PROMPT = """
+You consolidate a personal assistant's conversations with its owner into long-term memory.
+From the numbered turns below, extract the facts still worth knowing weeks from now: the owner's
+preferences, plans, commitments, habits, relationships and important events.
+Skip small talk, greetings and anything only relevant to the moment. Most turns have nothing worth keeping.
+Write each memory as one standalone sentence about the owner.
+Return the result strictly in the following JSON schema:
+{"memories": [{"turn": <turn number>, "text": "<memory>", "importance": <1-10>}]}
+"""
+
+StreamEntry = Tuple[str, Dict[str, str]] # (entry id, fields)
+Fact = Tuple[str, str, int, datetime, str, str] # (user_id, text, importance, time, point id, source)
+
+
+def turn_fields(user_id: str, user_message: str, reply: str) -> Dict[str, str]:
+    return {
+        "user_id": user_id,
+        "user": user_message,
+        "assistant": reply,
+        "at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def add_turn(pipeline, user_id: str, user_message: str, reply: str):
+    """Queues a finished turn on a Redis pipeline, so it goes out with the workspace save."""
+    pipeline.xadd(TURN_STREAM_KEY, turn_fields(user_id, user_message, reply), maxlen=STREAM_MAX_LENGTH, approximate=True)
+
+
+def add_demoted_memory(pipeline, user_id: str, item: dict):
+    """
+    Queues a main-memory item evicted from the prompt (see MainMemory). It is stored in
+    long-term memory as is, without extraction, keeping its own id and metadata.
+    """
+    pipeline.xadd(TURN_STREAM_KEY, {
+        "kind": "demoted",
+        "user_id": user_id,
+        "id": item["id"],
+        "text": item["text"],
+        "importance": str(item["importance"]),
+        "access_count": str(item["access_count"]),
+        "at": item["created_at"],
+    }, maxlen=STREAM_MAX_LENGTH, approximate=True)
+
+
+class MemoryConsolidator:
+    """
+    Turns finished conversation turns into long-term memories, off the request path.
+
+    The brain appends every finished turn to a Redis stream (one XADD in the pipeline that
+    already saves the workspace). This worker reads the stream through a consumer group,
+    so several workers share the load and unacknowledged turns survive a crash. For each
+    batch it extracts memory-worthy facts with one cheap-model call per user and up to
+    TURNS_PER_PROMPT turns, embeds all facts of the batch together, and writes them into
+    each user's memory collection through the write buffer (batched upserts). Facts that
+    restate a stored memory are not embedded again; the stored point counts the mention
+    instead (memory_dedup). Point ids derive from the stream entry, so a retried batch
+    overwrites instead of duplicating.
+    Turns are acknowledged once Qdrant accepted their memories. Demoted main-memory items
+    share the stream and skip extraction.
+    """
+
+    def __init__(
+        self,
+        redis,
+        qdrant,
+        extract: Callable[[List[Dict]], Awaitable[Dict]] | None = None,
+        embed: Callable[[List[str], int], Awaitable[List[List[float]]]] | None = None,
+        buffer: QdrantWriteBuffer | None = None,
+    ):
+        self._redis = redis
+        self._qdrant = qdrant
+        self._extract = extract # async (messages) -> JSON object; defaults to LLMProvider.complete_json
+        self._embed = embed # async (texts, dimensions) -> vectors; defaults to LLMProvider.embed
+        self._buffer = buffer # Defaults to the process-wide shared_write_buffer()
+        self._dedup = MemoryDeduplicator(redis)
+        self._consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self._attempts: Dict[str, int] = {}
+        self._backlog = True # Unacknowledged turns (own, or of dead workers) are read before new ones
+        self._stopping = asyncio.Event()
+        self._runner: asyncio.Task | None = None
+
+    def _provider(self):
+        from llm_provider import LLMProvider
+
+        provider = LLMProvider()
+        if self._extract is None:
+            self._extract = lambda messages: provider.complete_json(messages, model=CONSOLIDATION_MODEL)
+        if self._embed is None:
+            self._embed = lambda texts, dimensions: provider.embed(texts, model=EMBEDDING_MODEL, dimensions=dimensions)
+
+    # --- Lifecycle ---
+    def start(self):
+        if self._runner is None:
+            self._stopping.clear()
+            self._runner = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Finishes the batch in progress; unacknowledged turns are picked up after a restart."""
+        if self._runner is not None:
+            self._stopping.set()
+            await self._runner
+            self._runner = None
+
+    async def run(self):
+        while not self._stopping.is_set():
+            try:
+                await self._ensure_group()
+                entries = await self._read()
+                if entries:
+                    await self.consolidate(entries)
+                continue
+            except RedisError as e:
+                logger.warning(f"Could not read the turn stream: {e}")
+            except Exception as e:
+                logger.error(f"Memory consolidation failed: {e}", exc_info=True)
+                self._backlog = True
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=RETRY_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _ensure_group(self):
+        try:
+            await self._redis.xgroup_create(TURN_STREAM_KEY, CONSUMER_GROUP, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def _read(self) -> List[StreamEntry]:
+        if self._backlog:
+            await self._redis.xautoclaim(TURN_STREAM_KEY, CONSUMER_GROUP, self._consumer, min_idle_time=CLAIM_IDLE_MS, count=READ_COUNT)
+            response = await self._redis.xreadgroup(CONSUMER_GROUP, self._consumer, {TURN_STREAM_KEY: "0"}, count=READ_COUNT)
+            entries = response[0][1] if response else []
+            if entries:
+                return await self._drop_exhausted(entries)
+            self._backlog = False
+        response = await self._redis.xreadgroup(CONSUMER_GROUP, self._consumer, {TURN_STREAM_KEY: ">"}, count=READ_COUNT, block=BLOCK_MS)
+        return response[0][1] if response else []
+
+    async def _drop_exhausted(self, entries: List[StreamEntry]) -> List[StreamEntry]:
+        """Counts a retry for each pending turn and acknowledges the ones out of attempts."""
+        retry, exhausted = [], []
+        for entry_id, fields in entries:
+            self._attempts[entry_id] = self._attempts.get(entry_id, 0) + 1
+            (exhausted if self._attempts[entry_id] >= MAX_ATTEMPTS else retry).append((entry_id, fields))
+        if exhausted:
+            logger.error(f"Dropping {len(exhausted)} turns that failed consolidation {MAX_ATTEMPTS} times")
+            await self._ack([entry_id for entry_id, _ in exhausted])
+        return retry
+
+    async def _ack(self, entry_ids: List[str]):
+        await self._redis.xack(TURN_STREAM_KEY, CONSUMER_GROUP, *entry_ids)
+        for entry_id in entry_ids:
+            self._attempts.pop(entry_id, None)
+
+    # --- One batch ---
+    async def consolidate(self, entries: List[StreamEntry]) -> int:
+        """Extracts, embeds and stores the facts of these turns, then acknowledges them. Returns the number of memories."""
+        if self._extract is None or self._embed is None:
+            self._provider()
+        by_user: Dict[str, List[StreamEntry]] = {}
+        demoted: List[Fact] = []
+        for entry_id, fields in entries:
+            if not fields.get("user_id"):
+                continue
+            if fields.get("kind") == "demoted":
+                demoted.append(self._demoted_fact(fields))
+            else:
+                by_user.setdefault(fields["user_id"], []).append((entry_id, fields))
+        chunks = [
+            (user_id, turns[start:start + TURNS_PER_PROMPT])
+            for user_id, turns in by_user.items()
+            for start in range(0, len(turns), TURNS_PER_PROMPT)
+        ]
+        extracted = await asyncio.gather(*(self._facts(user_id, turns) for user_id, turns in chunks))
+        extracted_facts = demoted + [fact for chunk_facts in extracted for fact in chunk_facts]
+        # Vector size of each user's collection; waits while a migration switches one
+        dimensions = {}
+        for user_id in {fact[0] for fact in extracted_facts}:
+            params = await collection_embedding_params(self._qdrant, self._redis, user_id, write=True)
+            dimensions[user_id] = params["dimensions"]
+        facts, fingerprints, repeats = await self._deduplicate(extracted_facts)
+
+        if facts:
+            await self._store(facts, await self._embed_facts(facts, dimensions))
+            stored_by_user: Dict[str, List[Tuple[str, Fingerprint]]] = {}
+            for fact, fingerprint in zip(facts, fingerprints):
+                stored_by_user.setdefault(fact[0], []).append((fact[4], fingerprint))
+            for user_id, stored in stored_by_user.items():
+                await self._dedup.register(user_id, stored)
+        # Only once the batch is stored: a batch that fails before must not count its mentions twice
+        for user_id, point_ids in repeats.items():
+            await bump_memories(self._qdrant, await ensure_memory_collection(self._qdrant, user_id), point_ids)
+        await self._ack([entry_id for entry_id, _ in entries])
+        if extracted_facts:
+            logger.info(
+                f"Consolidated {len(entries)} stream entries into {len(facts)} memories "
+                f"({len(demoted)} demoted from main memory, {len(extracted_facts) - len(facts)} near-duplicates skipped)"
+            )
+        return len(facts)
+
+    async def _deduplicate(self, facts: List[Fact]) -> Tuple[List[Fact], List[Fingerprint], Dict[str, List[str]]]:
+        """
+        Drops facts that restate a stored memory. Returns the new facts, their fingerprints and
+        {user_id: stored point ids mentioned again}, to be bumped once the batch is stored.
+        """
+        by_user: Dict[str, List[Fact]] = {}
+        for fact in facts:
+            by_user.setdefault(fact[0], []).append(fact)
+        new, fingerprints, mentioned = [], [], {}
+        for user_id, user_facts in by_user.items():
+            fresh, duplicates, user_fingerprints = await self._dedup.split(user_id, [fact[1] for fact in user_facts])
+            # A retried batch finds its own points: they are stored already, not mentioned again
+            repeats = {index: point_id for index, point_id in duplicates.items() if point_id != user_facts[index][4]}
+            if repeats:
+                collection_name = await ensure_memory_collection(self._qdrant, user_id)
+                existing = await existing_points(self._qdrant, collection_name, repeats.values())
+                # A repeat of a memory deleted since is stored anew
+                fresh = sorted(fresh + [index for index, point_id in repeats.items() if point_id not in existing])
+                mentioned[user_id] = [point_id for point_id in repeats.values() if point_id in existing]
+            new.extend(user_facts[index] for index in fresh)
+            fingerprints.extend(user_fingerprints[index] for index in fresh)
+        return new, fingerprints, mentioned
+
+    async def _embed_facts(self, facts: List[Fact], dimensions: Dict[str, int]) -> List[List[float]]:
+        """Embeds the facts in batches per vector size (collections differ until migrated), in fact order."""
+        by_size: Dict[int, List[int]] = {}
+        for index, fact in enumerate(facts):
+            by_size.setdefault(dimensions[fact[0]], []).append(index)
+        vectors: List[List[float]] = [[] for _ in facts]
+        for size, indexes in by_size.items():
+            for start in range(0, len(indexes), EMBED_BATCH_SIZE):
+                batch = indexes[start:start + EMBED_BATCH_SIZE]
+                for index, vector in zip(batch, await self._embed([facts[index][1] for index in batch], size)):
+                    vectors[index] = vector
+        return vectors
+
+    @staticmethod
+    def _demoted_fact(fields: Dict[str, str]) -> Fact:
+        try:
+            importance = int(fields.get("importance", 5))
+        except ValueError:
+            importance = 5
+        try:
+            created_at = datetime.fromisoformat(fields["at"])
+        except (KeyError, ValueError):
+            created_at = datetime.now(timezone.utc)
+        point_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"main_memory/{fields['user_id']}/{fields.get('id')}"))
+        return (fields["user_id"], fields.get("text", ""), importance, created_at, point_id, "main_memory")
+
+    async def _facts(self, user_id: str, turns: List[StreamEntry]) -> List[Fact]:
+        numbered = "\n".join(
+            f"{number}. Owner: {fields.get('user', '')}\n   Assistant: {fields.get('assistant', '')}"
+            for number, (_, fields) in enumerate(turns, start=1)
+        )
+        result = await self._extract([
+            {"role": "system", "content": EXTRACTION_PROMPT},
+            {"role": "user", "content": numbered},
+        ])
+        facts, per_turn = [], {}
+        for memory in result.get("memories") or []:
+            if not isinstance(memory, dict) or not str(memory.get("text") or "").strip():
+                continue
+            try:
+                turn_number = min(max(int(memory.get("turn", 1)), 1), len(turns))
+                importance = int(memory.get("importance", 5))
+            except (TypeError, ValueError):
+                turn_number, importance = 1, 5
+            entry_id, fields = turns[turn_number - 1]
+            try:
+                turn_time = datetime.fromisoformat(fields["at"])
+            except (KeyError, ValueError):
+                turn_time = datetime.now(timezone.utc)
+            # Stable per turn: a retried turn overwrites its earlier points
+            per_turn[entry_id] = per_turn.get(entry_id, 0) + 1
+            point_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"{TURN_STREAM_KEY}/{entry_id}/{per_turn[entry_id]}"))
+            facts.append((user_id, memory["text"].strip(), importance, turn_time, point_id, "consolidation"))
+        return facts
+
+    async def _store(self, facts: List[Fact], vectors: List[List[float]]):
+        from qdrant_client import models
+
+        points_by_user: Dict[str, List] = {}
+        for (user_id, text, importance, created_at, point_id, source), vector in zip(facts, vectors):
+            points_by_user.setdefault(user_id, []).append(models.PointStruct(
+                id=point_id,
+                vector=vector,
+                payload=memory_payload(user_id, text, importance, created_at=created_at, source=source),
+            ))
+        buffer = self._buffer or shared_write_buffer()
+        collection_names = []
+        for user_id, points in points_by_user.items():
+            collection_name = await ensure_memory_collection(self._qdrant, user_id)
+            await buffer.add(collection_name, points)
+            collection_names.append(collection_name)
+        if not await buffer.flush(collection_names):
+            raise RuntimeError("Qdrant did not accept the consolidated memories; they stay buffered for a retry")
@@ -0,0 +1,178 @@
+import hashlib
+import logging
+import re
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Tuple
+
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+# --- Near-duplicate detection ---
+# Memories are a handful of content words, so two memories are the same memory when their
+# word sets overlap enough: Jaccard similarity of at least MIN_JACCARD. Calibrated on
+# paraphrases (test_memory_dedup.py): one added word to three or more words still collapses
+# ("I have English class at 6pm" / "... at 6pm every week", 0.75); one swapped word in
+# five or fewer does not ("... on Mondays" / "... on Tuesdays", 0.6).
+# Candidates are found with MinHash LSH: MINHASH_PERMUTATIONS min-hashes in bands of
+# MINHASH_ROWS. Two memories at MIN_JACCARD share a band with probability 1 - (1 - 0.7**2)**16
+# > 0.9999, and every candidate is checked on its exact word set.
+MIN_JACCARD = 0.7
+MINHASH_PERMUTATIONS = 32
+MINHASH_ROWS = 2
+_BANDS = MINHASH_PERMUTATIONS // MINHASH_ROWS
+_PRIME = (1 << 61) - 1
+SEARCH_OVERFETCH = 2 # Searches fetch this many hits per wanted memory, to fill up after dropping near-duplicates
+
+# Function words, filler and "owner" carry no meaning of their own in a memory
+_STOP_WORDS = frozenset(
+    "a an the i im my me mine owner owners is are was were be been am has have had do does did "
+    "to at in on of for and or with by from that this it its as s every now currently still also really "
+    "just very".split()
+)
+_TOKEN = re.compile(r"[^\W_]+", re.UNICODE)
+_CLOCK_TIME = re.compile(r"\b(\d{1,2})(?::00)?\s*([ap])\.?m\b\.?") # "6 pm", "6:00 p.m." -> "6pm"
+
+Fingerprint = Tuple[str, ...] # Sorted content words of a memory
+
+
+def _stable_hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+_PERMUTATIONS = [(_stable_hash(f"a{i}") % (_PRIME - 1) + 1, _stable_hash(f"b{i}") % _PRIME) for i in range(MINHASH_PERMUTATIONS)]
+
+
+def fingerprint(text: str) -> Fingerprint:
+    """The content words of the text: lowercased, stop words dropped, plurals and clock times normalized."""
+    words = set()
+    for word in _TOKEN.findall(_CLOCK_TIME.sub(r"\1\2m", text.lower())):
+        if word in _STOP_WORDS:
+            continue
+        if len(word) > 4 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1] # Plurals
+        words.add(word)
+    return tuple(sorted(words)) or (text.strip().lower(),)
+
+
+def jaccard(a: Fingerprint, b: Fingerprint) -> float:
+    a, b = set(a), set(b)
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def _bands(words: Fingerprint) -> List[str]:
+    """LSH bucket fields of the word set (stable across processes)."""
+    hashes = [_stable_hash(word) for word in words]
+    signature = [min((a * value + b) % _PRIME for value in hashes) for a, b in _PERMUTATIONS]
+    return [
+        f"{band}:{_stable_hash(repr(signature[band * MINHASH_ROWS:(band + 1) * MINHASH_ROWS])):016x}"
+        for band in range(_BANDS)
+    ]
+
+
+def dedupe_texts(texts: Iterable[str], limit: int | None = None) -> List[str]:
+    """Keeps the first of each group of near-duplicate texts (e.g. search hits, best first)."""
+    kept: List[Tuple[str, Fingerprint]] = []
+    for text in texts:
+        words = fingerprint(text)
+        if all(jaccard(words, other) < MIN_JACCARD for _, other in kept):
+            kept.append((text, words))
+            if limit is not None and len(kept) >= limit:
+                break
+    return [text for text, _ in kept]
+
+
+class MemoryDeduplicator:
+    """
+    Per-user LSH index of stored memories, in one Redis hash user:{user_id}:memory:minhash
+    mapping "{band}:{band hash}" to "{point id}:{content words}".
+
+    Writers check new memories before embedding them: a near-duplicate of a stored memory
+    (or of an earlier one in the same batch) is not embedded or stored again; the caller
+    bumps the stored point instead (see bump_memories). A bucket keeps the latest memory
+    with that band, which is enough for near-duplicates to meet. Best effort: when Redis
+    fails, every memory counts as new.
+    """
+
+    def __init__(self, redis):
+        self._redis = redis
+
+    @staticmethod
+    def _key(user_id: str) -> str:
+        return f"user:{user_id}:memory:minhash"
+
+    async def split(self, user_id: str, texts: List[str]) -> Tuple[List[int], Dict[int, str], List[Fingerprint]]:
+        """
+        Returns (indexes of new texts, {index: stored point id} of duplicates, fingerprints).
+        A text that duplicates an earlier new text of the batch is dropped (in neither list).
+        """
+        fingerprints = [fingerprint(text) for text in texts]
+        fields = [field for words in fingerprints for field in _bands(words)]
+        try:
+            buckets = await self._redis.hmget(self._key(user_id), fields) if fields else []
+        except RedisError as e:
+            logger.warning(f"Could not read the memory fingerprints of user '{user_id}': {e}")
+            buckets = [None] * len(fields)
+
+        new, duplicates, batch = [], {}, []
+        for index, words in enumerate(fingerprints):
+            if any(jaccard(words, other) >= MIN_JACCARD for other in batch):
+                continue
+            stored = None
+            for bucket in buckets[index * _BANDS:(index + 1) * _BANDS]:
+                if not bucket:
+                    continue
+                point_id, _, stored_words = bucket.partition(":")
+                if jaccard(words, tuple(stored_words.split(" "))) >= MIN_JACCARD:
+                    stored = point_id
+                    break
+            if stored is not None:
+                duplicates[index] = stored
+            else:
+                new.append(index)
+                batch.append(words)
+        return new, duplicates, fingerprints
+
+    async def register(self, user_id: str, entries: Iterable[Tuple[str, Fingerprint]]):
+        """Indexes stored memories, as (point id, fingerprint)."""
+        mapping = {field: f"{point_id}:{' '.join(words)}" for point_id, words in entries for field in _bands(words)}
+        if not mapping:
+            return
+        try:
+            await self._redis.hset(self._key(user_id), mapping=mapping)
+        except RedisError as e:
+            logger.warning(f"Could not index the memory fingerprints of user '{user_id}': {e}")
+
+
+async def existing_points(qdrant, collection_name: str, point_ids: Iterable[str]) -> set:
+    """The ids among point_ids that are stored, in one retrieve."""
+    point_ids = list(dict.fromkeys(point_ids))
+    if not point_ids:
+        return set()
+    stored = await qdrant.retrieve(collection_name=collection_name, ids=point_ids, with_payload=False, with_vectors=False)
+    return {str(point.id) for point in stored}
+
+
+async def bump_memories(qdrant, collection_name: str, point_ids: Iterable[str], seen_at: datetime | None = None) -> List[str]:
+    """
+    Records repeated mentions on stored points: mentions + 1 per repeat and last_seen, in one
+    retrieve and one batch update. Returns the ids that no longer exist (to be stored anew).
+    """
+    from qdrant_client import models
+
+    repeats: Dict[str, int] = {}
+    for point_id in point_ids:
+        repeats[point_id] = repeats.get(point_id, 0) + 1
+    if not repeats:
+        return []
+    seen_at = (seen_at or datetime.now(timezone.utc)).isoformat()
+    stored = await qdrant.retrieve(collection_name=collection_name, ids=list(repeats), with_payload=["mentions"], with_vectors=False)
+    found = {str(point.id): (point.payload or {}).get("mentions", 1) for point in stored}
+    if found:
+        await qdrant.batch_update_points(collection_name=collection_name, update_operations=[
+            models.SetPayloadOperation(set_payload=models.SetPayload(
+                payload={"mentions": mentions + repeats[point_id], "last_seen": seen_at}, points=[point_id]
+            ))
+            for point_id, mentions in found.items()
+        ], wait=False)
+    return [point_id for point_id in repeats if point_id not in found]
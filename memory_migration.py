@@ -0,0 +1,241 @@
+"""
+Moves memory collections to the configured vector layout (long_term_memory.vector_settings()).
+
+For every user whose alias memories-{user_id} does not point at a collection with the
+configured layout (or who still has a collection from before aliases), the job creates the
+collection for the new layout and copies the points page by page, re-embedding their text
+when the dimensions change (vectors are copied as they are otherwise). The scroll offset is
+saved in Redis after every page, so an interrupted run resumes where it stopped. When the
+copy is complete, the user's memory writers are frozen (see
+long_term_memory.collection_embedding_params) and the target is reconciled with the source:
+points written, updated or deleted during the copy are carried over. Then the alias is
+switched, the old collection is dropped and writers resume, embedding for the new layout.
+
+Usage:
+    python memory_migration.py status
+    python memory_migration.py migrate [user_id ...]
+"""
+import asyncio
+import json
+import logging
+import sys
+import time
+from typing import Awaitable, Callable, Dict, List
+
+import database
+from long_term_memory import (
+    memory_collection_config, memory_collection_name, memory_embedding_params, migration_switch_key, physical_collection_name, vector_settings,
+)
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 256
+COLLECTION_PREFIX = "memories-"
+SWITCH_GRACE_SECONDS = 5 # After freezing, writes that passed the check before it land in the source
+FREEZE_SECONDS = 600 # Writers are held at most this long, should the migration die during the switch
+
+
+def _progress_key(target: str) -> str:
+    return f"memory_migration:{target}"
+
+
+async def memory_collections(qdrant) -> Dict[str, str]:
+    """{user_id: collection the user's memories currently live in}."""
+    aliases = {alias.alias_name: alias.collection_name for alias in (await qdrant.get_aliases()).aliases}
+    current = {}
+    for alias_name, collection_name in aliases.items():
+        if alias_name.startswith(COLLECTION_PREFIX):
+            current[alias_name[len(COLLECTION_PREFIX):]] = collection_name
+    for collection in (await qdrant.get_collections()).collections:
+        name = collection.name
+        if name.startswith(COLLECTION_PREFIX) and "--" not in name:
+            current.setdefault(name[len(COLLECTION_PREFIX):], name) # From before aliases
+    return current
+
+
+async def _vector_size(qdrant, collection_name: str) -> int:
+    info = await qdrant.get_collection(collection_name=collection_name)
+    return info.config.params.vectors.size
+
+
+class MemoryMigration:
+    def __init__(self, qdrant, redis, embed: Callable[[List[str]], Awaitable[List[List[float]]]] | None = None):
+        self._qdrant = qdrant
+        self._redis = redis
+        self._embed = embed # async (texts) -> vectors in the configured dimensions; defaults to LLMProvider.embed
+
+    async def _embed_texts(self, texts: List[str]) -> List[List[float]]:
+        if self._embed is None:
+            from llm_provider import LLMProvider
+
+            provider = LLMProvider()
+            self._embed = lambda texts: provider.embed(texts, **memory_embedding_params())
+        return await self._embed(texts)
+
+    async def status(self) -> List[Dict]:
+        target_layout = vector_settings().layout
+        rows = []
+        for user_id, source in sorted((await memory_collections(self._qdrant)).items()):
+            target = physical_collection_name(user_id)
+            progress = await self._redis.hgetall(_progress_key(target))
+            rows.append({
+                "user_id": user_id,
+                "collection": source,
+                "up_to_date": source == target,
+                "target_layout": target_layout,
+                "copied": int(progress.get("copied", 0)),
+            })
+        return rows
+
+    async def migrate(self, user_ids: List[str] | None = None) -> Dict[str, int]:
+        """Migrates the given users (default: every user not on the configured layout)."""
+        current = await memory_collections(self._qdrant)
+        results = {}
+        for user_id in user_ids or sorted(current):
+            source = current.get(user_id)
+            if source is None or source == physical_collection_name(user_id):
+                continue
+            results[user_id] = await self.migrate_user(user_id, source)
+        return results
+
+    async def migrate_user(self, user_id: str, source: str) -> int:
+        """Copies source into the configured layout, then switches the alias. Returns points copied."""
+        from qdrant_client import models
+
+        target = physical_collection_name(user_id)
+        progress_key = _progress_key(target)
+        if not await self._qdrant.collection_exists(target):
+            await self._qdrant.create_collection(collection_name=target, **memory_collection_config())
+        reembed = await _vector_size(self._qdrant, source) != vector_settings().dimensions
+
+        progress = await self._redis.hgetall(progress_key)
+        offset = json.loads(progress["offset"]) if progress.get("offset") else None
+        copied = int(progress.get("copied", 0))
+        if offset is not None or copied:
+            logger.info(f"Resuming the migration of '{source}' at {copied} points")
+        while True:
+            points, next_offset = await self._qdrant.scroll(
+                collection_name=source, limit=PAGE_SIZE, offset=offset, with_payload=True, with_vectors=not reembed
+            )
+            if points:
+                await self._copy(points, target, reembed)
+                copied += len(points)
+            if next_offset is None:
+                break
+            offset = next_offset
+            await self._redis.hset(progress_key, mapping={"offset": json.dumps(offset), "copied": copied})
+        await self._redis.hset(progress_key, mapping={"offset": "", "copied": copied})
+
+        # Switch, with the user's writers frozen
+        switch_key = migration_switch_key(user_id)
+        await self._redis.hset(switch_key, "frozen_until", time.time() + FREEZE_SECONDS)
+        try:
+            await asyncio.sleep(SWITCH_GRACE_SECONDS)
+            copied += await self._reconcile(source, target, reembed)
+            alias = memory_collection_name(user_id)
+            if source == alias:
+                # A collection from before aliases holds the name and Qdrant cannot rename it:
+                # the name is free between the delete and the alias (writers are frozen)
+                await self._qdrant.delete_collection(collection_name=source)
+            await self._qdrant.update_collection_aliases(change_aliases_operations=[
+                models.DeleteAliasOperation(delete_alias=models.DeleteAlias(alias_name=alias)),
+                models.CreateAliasOperation(create_alias=models.CreateAlias(collection_name=target, alias_name=alias)),
+            ])
+            if source != alias:
+                await self._qdrant.delete_collection(collection_name=source)
+        finally:
+            # Writers resume and re-read the vector size of the collection behind the alias
+            pipeline = self._redis.pipeline(transaction=True)
+            pipeline.hincrby(switch_key, "generation", 1)
+            pipeline.hdel(switch_key, "frozen_until")
+            await pipeline.execute()
+        await self._redis.delete(progress_key)
+        logger.info(f"Migrated '{source}' to '{target}' ({copied} points)")
+        return copied
+
+    async def _copy(self, points: List, target: str, reembed: bool):
+        from qdrant_client import models
+
+        if reembed:
+            vectors = await self._embed_texts([(point.payload or {}).get("text", "") for point in points])
+        else:
+            vectors = [point.vector for point in points]
+        await self._qdrant.upsert(
+            collection_name=target,
+            points=[models.PointStruct(id=point.id, vector=vector, payload=point.payload) for point, vector in zip(points, vectors)],
+            wait=True,
+        )
+
+    async def _reconcile(self, source: str, target: str, reembed: bool) -> int:
+        """
+        Makes target match source after the copy: copies points missing from target or stored
+        with another text since, overwrites changed payloads (e.g. mentions, last_seen) and
+        deletes points no longer in source. Returns the points copied or updated.
+        """
+        from qdrant_client import models
+
+        updated, offset, source_ids = 0, None, set()
+        while True:
+            points, offset = await self._qdrant.scroll(
+                collection_name=source, limit=PAGE_SIZE, offset=offset, with_payload=True, with_vectors=not reembed
+            )
+            if points:
+                source_ids.update(str(point.id) for point in points)
+                existing = {
+                    str(point.id): point.payload or {}
+                    for point in await self._qdrant.retrieve(collection_name=target, ids=[point.id for point in points], with_payload=True)
+                }
+                missing, changed = [], []
+                for point in points:
+                    payload = point.payload or {}
+                    if str(point.id) not in existing or existing[str(point.id)].get("text") != payload.get("text"):
+                        missing.append(point)
+                    elif existing[str(point.id)] != payload:
+                        changed.append(point)
+                if missing:
+                    await self._copy(missing, target, reembed)
+                if changed:
+                    await self._qdrant.batch_update_points(collection_name=target, update_operations=[
+                        models.OverwritePayloadOperation(overwrite_payload=models.SetPayload(payload=point.payload or {}, points=[point.id]))
+                        for point in changed
+                    ], wait=True)
+                updated += len(missing) + len(changed)
+            if offset is None:
+                break
+
+        deleted, offset = [], None
+        while True:
+            points, offset = await self._qdrant.scroll(collection_name=target, limit=PAGE_SIZE, offset=offset, with_payload=False, with_vectors=False)
+            deleted.extend(point.id for point in points if str(point.id) not in source_ids)
+            if offset is None:
+                break
+        if deleted:
+            await self._qdrant.delete(collection_name=target, points_selector=models.PointIdsList(points=deleted), wait=True)
+        return updated
+
+
+async def main(command: str, user_ids: List[str]) -> int:
+    logging.basicConfig(level=logging.INFO)
+    if database.qdrant_client is None:
+        print("Qdrant is not configured.")
+        return 1
+    migration = MemoryMigration(database.qdrant_client, database.redis_client)
+    try:
+        if command == "status":
+            for row in await migration.status():
+                state = "up to date" if row["up_to_date"] else f"needs migration to {row['target_layout']} ({row['copied']} points copied)"
+                print(f"{row['user_id']}: {row['collection']} - {state}")
+        else:
+            for user_id, copied in (await migration.migrate(user_ids or None)).items():
+                print(f"✅ {user_id}: {copied} points")
+    finally:
+        await database.close_clients()
+    return 0
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command not in ("status", "migrate"):
+        print(__doc__)
+        sys.exit(2)
+    sys.exit(asyncio.run(main(command, sys.argv[2:])))
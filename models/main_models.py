@@ -1,8 +1,9 @@
-from pydantic import BaseModel, Field, EmailStr, GetCoreSchemaHandler
-from typing import Optional, List, Dict, Any, Literal, Union, Type
+from pydantic import BaseModel, Field, EmailStr, GetCoreSchemaHandler, ConfigDict, create_model
+from typing import Optional, List, Dict, Any, Literal, Union, Type, Annotated
+from functools import lru_cache
 from datetime import datetime
 from bson import ObjectId
-from pydantic_core import CoreSchema, core_schema, ValidationError
+from pydantic_core import CoreSchema, core_schema, ValidationError, PydanticUndefined
 
 # --- Helper class for MongoDB's ObjectId (Pydantic V2 FIX) ---
 class PyObjectId(ObjectId):
@@ -54,6 +55,7 @@ class UserModel(BaseModel):
     email: EmailStr
     name: str
     hashed_password: str
+    timezone: Optional[str] = None # IANA name, e.g. "America/Edmonton"
 
     class Config:
         # Pydantic v2 不再需要 json_encoders = {ObjectId: str}，
@@ -76,8 +78,11 @@ class GoalModel(BaseModel):
     user_id: str
     name: str
     description: Optional[str] = None
-    parent_goal: Optional[list[str]] = None # 修复了原始代码中的 parentgoal 拼写
-    weight: int = Field(..., ge=0, le=100)
+    parent_goal: Optional[str] = None # ID of the parent goal (修复了原始代码中的 parentgoal 拼写)
+    weight: int = Field(100, ge=0, le=100)
+    # Materialized hierarchy, maintained by GoalRepository on create, update, re-parent and delete
+    ancestors: List[str] = Field(default_factory=list) # Ancestor IDs, root first
+    effective_weight: float = 1.0 # Product of weight/100 from the root down to this goal
     created_at: datetime
     updated_at: Optional[datetime] = None
     status: Literal["active", "completed", "paused", "deleted"]
@@ -101,14 +106,80 @@ class ProfileEntryModel(BaseModel):
         arbitrary_types_allowed = True
         populate_by_name = True
 
+# --- Partial models for updates ---
+@lru_cache(maxsize=None)
+def partial_model(model_cls: Type[BaseModel]) -> Type[BaseModel]:
+    """
+    Builds (once per model) a variant of model_cls where every field is optional,
+    so partial update payloads are validated with the same types and constraints.
+    Dump with exclude_unset=True to get only the fields that were sent.
+    """
+    fields = {}
+    for name, field in model_cls.model_fields.items():
+        if name == "id":
+            continue
+        annotation = Annotated[(field.annotation, *field.metadata)] if field.metadata else field.annotation
+        fields[name] = (Optional[annotation], Field(None, alias=field.alias))
+    return create_model(
+        f"Partial{model_cls.__name__}",
+        __config__=ConfigDict(arbitrary_types_allowed=True, populate_by_name=True),
+        **fields
+    )
+
+# --- Trusted read path ---
+# Documents read back from our own collections were validated when they were written,
+# so re-validating them (including the PyObjectId chain schema) on every read is wasted work.
+@lru_cache(maxsize=None)
+def _trusted_fields(model_cls: Type[BaseModel]) -> tuple:
+    """(output key, default, default_factory) for every field, keyed like model_dump(by_alias=True)."""
+    return tuple(
+        (field.alias or name, None if field.default is PydanticUndefined else field.default, field.default_factory)
+        for name, field in model_cls.model_fields.items()
+    )
+
+def trusted_dump(model_cls: Type[BaseModel], doc: dict) -> dict:
+    """
+    Fast equivalent of model_cls(**doc).model_dump(by_alias=True) for trusted documents:
+    projects the document onto the model's fields and fills defaults, without validation.
+    Never use it for input coming from the LLM or the API.
+    """
+    return {
+        key: doc[key] if key in doc else (factory() if factory else default)
+        for key, default, factory in _trusted_fields(model_cls)
+    }
+
 # ----- Task Models set below -----
 # --- Simple, nested data structures ---
+class ValueFactorsModel(BaseModel):
+    """Inputs of a task's dynamic priority, each 0-100. Missing factors count as neutral (50)."""
+    urgency: Optional[int] = Field(None, ge=0, le=100)
+    importance: Optional[int] = Field(None, ge=0, le=100)
+    due_soon: Optional[int] = Field(None, ge=0, le=100)
+    user_defined: Optional[int] = Field(None, ge=0, le=100)
+    contextual_relevance: Optional[int] = Field(None, ge=0, le=100)
+    historical_performance: Optional[int] = Field(None, ge=0, le=100)
+
+class SchedulingHintsModel(BaseModel):
+    """How the day scheduler places a task. Missing hints fall back to the scheduler's defaults."""
+    duration_minutes: Optional[int] = Field(None, ge=5, le=720)
+    frequency: Optional[Literal["daily", "weekly", "monthly"]] = None
+    times: Optional[int] = Field(None, ge=1, le=10) # Occurrences per frequency period
+    energy: Optional[Literal["high", "medium", "low"]] = None
+    fixed_time: Optional[str] = Field(None, pattern=r"^([01]\d|2[0-3]):[0-5]\d$") # "HH:MM", a fixed event
+
 class TaskModel(BaseModel):
     id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
     user_id: str
     name: str
     description: str
     schedule: Optional[str] = None
+    # Parsed from 'schedule' on every write (see schedule_parser)
+    next_occurrence: Optional[datetime] = None
+    recurrence: Optional[str] = None # RRULE subset, e.g. "FREQ=WEEKLY;INTERVAL=1;BYDAY=FR"
+    location: Optional[str] = None
+    target_goal_ids: List[str] = Field(default_factory=list)
+    value_factors: Optional[ValueFactorsModel] = None
+    scheduling: Optional[SchedulingHintsModel] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
     status: Literal["active", "completed", "paused", "deleted"] = "active"
@@ -117,14 +188,6 @@ class TaskModel(BaseModel):
         arbitrary_types_allowed = True
         populate_by_name = True
 
-# class ValueFactorsModel(BaseModel):
-#     urgency: int
-#     importance: int
-#     due_soon: int
-#     user_defined: int
-#     contextual_relevance: int
-#     historical_performance: int
-
 # class DescriptionModel(BaseModel):
 #     field: str
 #     confidence: int = Field(..., ge=0, le=100)
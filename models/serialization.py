@@ -0,0 +1,31 @@
+import json
+from datetime import date, datetime
+from typing import Any
+
+from bson import ObjectId
+
+try:
+    import orjson # Optional: several times faster than the stdlib encoder
+except ImportError:
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    """Handles the non-JSON types our documents contain."""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json", by_alias=True)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+_ENCODER = json.JSONEncoder(default=_default, ensure_ascii=False, separators=(",", ":"))
+
+def to_json(value: Any) -> str:
+    """The one serializer for tool results and documents: compact JSON, ObjectId and datetime aware."""
+    if orjson is not None:
+        return orjson.dumps(value, default=_default, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+    return _ENCODER.encode(value)
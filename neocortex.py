@@ -1,58 +1,82 @@
 import uuid # A good way to generate unique IDs for points
 import json
-from openai import AsyncOpenAI
 from typing import List
-from qdrant_client import models # Import the models for filtering
-from database import redis_client, qdrant_client, persona_collection, MEMORY_COLLECTION_NAME # Import Qdrant client
+import database
+from long_term_memory import collection_embedding_params, ensure_memory_collection, memory_collection_name, memory_payload, memory_search_params
+from memory_dedup import SEARCH_OVERFETCH, MemoryDeduplicator, bump_memories, dedupe_texts
+from qdrant_write_buffer import shared_write_buffer
 
 class NeocortexManager:
     def __init__(self, user_id: str):
+        from openai import AsyncOpenAI
+
         self.user_id = user_id
         self.openai_client = AsyncOpenAI()
         # ... other initializations ...
 
     # --- MongoDB for persona and system state ---
     async def get_persona(self) -> dict:
-        persona = await persona_collection.find_one({"user_id": self.user_id})
+        persona = await database.persona_collection.find_one({"user_id": self.user_id})
         return persona
 
     # --- Redis for Caching and Emotion ---
     async def get_emotion_state(self) -> dict:
         """Gets the current emotion state from the Redis cache."""
-        state = await redis_client.get(f"user:{self.user_id}:emotion")
+        state = await database.redis_client.get(f"user:{self.user_id}:emotion")
         return json.loads(state) if state else {"mood": "neutral", "confidence": 0.5}
 
     async def save_emotion_state(self, state: dict):
         """Saves the emotion state to the Redis cache with a 24h expiration."""
-        await redis_client.set(f"user:{self.user_id}:emotion", json.dumps(state), ex=86400)
+        await database.redis_client.set(f"user:{self.user_id}:emotion", json.dumps(state), ex=86400)
 
     # --- Vector DB Methods using Qdrant ---
-    async def add_memory(self, text_summary: str):
-        """Converts a memory to a vector and upserts it into Qdrant."""
-        print(f"Adding new memory to Qdrant: '{text_summary}'")
-        # 1. Get the embedding vector from OpenAI (same as before)
-        response = await self.openai_client.embeddings.create(
-            input=text_summary,
-            model="text-embedding-3-small"
-        )
-        vector = response.data[0].embedding
+    async def add_memory(self, text_summary: str, importance: int = 5):
+        """Converts a memory to a vector and queues it for a batched upsert into Qdrant."""
+        await self.add_memories([text_summary], [importance])
 
-        # 2. Store it in Qdrant using "upsert"
-        # "upsert" will create a new point or update an existing one with the same ID
-        qdrant_client.upsert(
-            collection_name=MEMORY_COLLECTION_NAME,
-            points=[
-                models.PointStruct(
-                    id=str(uuid.uuid4()), # Generate a new unique ID for the point
-                    vector=vector,
-                    # The payload contains all the metadata we want to store and filter on
-                    payload={
-                        "text": text_summary,
-                        "user_id": self.user_id 
-                    }
-                )
-            ]
-        )
+    async def add_memories(self, texts: List[str], importances: List[int] | None = None):
+        """
+        Embeds the memories in one call and hands them to the shared write buffer, which
+        upserts them in batches (see QdrantWriteBuffer). Returns before Qdrant has them.
+        Near-duplicates of stored memories are not embedded; the stored point counts the mention.
+        """
+        from qdrant_client import models
+
+        if not texts:
+            return
+        importances = importances or [5] * len(texts)
+        # Waits while a migration switches the collection; embeds for the collection's dimensions
+        embedding_params = await collection_embedding_params(database.qdrant_client, database.redis_client, self.user_id, write=True)
+        collection_name = await ensure_memory_collection(database.qdrant_client, self.user_id)
+
+        # 1. Skip what the user's memory already holds
+        dedup = MemoryDeduplicator(database.redis_client)
+        fresh, duplicates, fingerprints = await dedup.split(self.user_id, texts)
+        if duplicates:
+            missing = set(await bump_memories(database.qdrant_client, collection_name, duplicates.values()))
+            fresh = sorted(fresh + [index for index, point_id in duplicates.items() if point_id in missing])
+        if not fresh:
+            print(f"All {len(texts)} memories are already in Qdrant")
+            return
+        print(f"Adding {len(fresh)} new memories to Qdrant ({len(texts) - len(fresh)} near-duplicates skipped)")
+
+        # 2. Get the embedding vectors from OpenAI, one request for all new memories
+        response = await self.openai_client.embeddings.create(input=[texts[index] for index in fresh], **embedding_params)
+        vectors = [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+        # 3. Queue them for the user's memory collection
+        point_ids = [str(uuid.uuid4()) for _ in fresh] # Generate a new unique ID for each point
+        await shared_write_buffer().add(collection_name, [
+            models.PointStruct(
+                id=point_id,
+                vector=vector,
+                # The payload contains all the metadata we want to store and filter on
+                payload=memory_payload(self.user_id, texts[index], importances[index]),
+            )
+            for point_id, index, vector in zip(point_ids, fresh, vectors)
+        ])
+        # 4. Index them for the checks of later memories
+        await dedup.register(self.user_id, [(point_id, fingerprints[index]) for point_id, index in zip(point_ids, fresh)])
 
     async def search_memories(self, query_text: str, n_results: int = 3) -> List[str]:
         """Searches for conceptually similar memories in Qdrant."""
@@ -60,16 +84,19 @@ class NeocortexManager:
         # 1. Get the embedding for the query (same as before)
         response = await self.openai_client.embeddings.create(
             input=query_text,
-            model="text-embedding-3-small"
+            **await collection_embedding_params(database.qdrant_client, database.redis_client, self.user_id)
         )
         query_vector = response.data[0].embedding
 
         # 2. Search Qdrant for the most similar memories FOR THIS USER
+        from qdrant_client import models
+
         # We build a filter to ensure we only search within the current user's documents
-        search_results = qdrant_client.search(
-            collection_name=MEMORY_COLLECTION_NAME,
-            query_vector=query_vector,
-            limit=n_results,
+        search_results = (await database.qdrant_client.query_points(
+            collection_name=memory_collection_name(self.user_id),
+            query=query_vector,
+            limit=n_results * SEARCH_OVERFETCH,
+            search_params=memory_search_params(),
             # IMPORTANT: This filter ensures data security and privacy
             query_filter=models.Filter(
                 must=[
@@ -79,9 +106,9 @@ class NeocortexManager:
                     )
                 ]
             )
-        )
+        )).points
         
         # The actual text is in the 'payload' of the search results
-        retrieved_memories = [point.payload['text'] for point in search_results]
+        retrieved_memories = dedupe_texts([point.payload['text'] for point in search_results], limit=n_results)
         print(f"Found memories in Qdrant: {retrieved_memories}")
         return retrieved_memories
\ No newline at end of file
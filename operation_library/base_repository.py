@@ -1,20 +1,88 @@
-from motor.motor_asyncio import AsyncIOMotorCollection
-from bson import ObjectId
-from typing import List, Dict, Any
+from bson import ObjectId, json_util
+from pymongo import UpdateOne, DeleteOne
+from pymongo.errors import BulkWriteError
+from operation_library.repository_cache import RepositoryCache
+from typing import TYPE_CHECKING, List, Dict, Any, AsyncIterator, Tuple
+from datetime import datetime
+import base64
+
+if TYPE_CHECKING:
+    from motor.motor_asyncio import AsyncIOMotorCollection
+
+# Page size limits for keyset-paginated reads
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def _bson_sort_key(value: Any) -> Tuple[int, Any]:
+    """Orders mixed-type values roughly like MongoDB does (null < numbers < strings < ...)."""
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (5, value)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    if isinstance(value, ObjectId):
+        return (4, value)
+    if isinstance(value, datetime):
+        return (6, value)
+    return (3, str(value))
 
 
 class BaseRepository:
-    def __init__(self, collection: AsyncIOMotorCollection, user_id: str):
+    # --- Declared indexes (ensured by operation_library.index_manager) ---
+    # Every query below is scoped by user_id, so user_id leads every compound index.
+    INDEXES: List[Dict[str, Any]] = [
+        {"keys": [("user_id", 1), ("name", 1)]},
+        {"keys": [("user_id", 1), ("status", 1), ("created_at", -1)]},
+        # Keyset pagination orders by (sort key, _id)
+        {"keys": [("user_id", 1), ("_id", 1)]},
+        {"keys": [("user_id", 1), ("created_at", -1), ("_id", -1)]},
+    ]
+    # Query shapes issued by this class. The user_id filter is added by the verifier,
+    # exactly like the methods below add it.
+    QUERY_SHAPES: List[Dict[str, Any]] = [
+        {"filter": {"_id": ObjectId("000000000000000000000000")}},
+        {"filter": {"name": "__index_check__"}},
+        {"filter": {"status": "active"}},
+        {"filter": {}, "sort": [("_id", 1)]},
+        {"filter": {}, "sort": [("created_at", -1), ("_id", -1)]},
+    ]
+
+    def __init__(self, collection: "AsyncIOMotorCollection", user_id: str, cache: RepositoryCache | None = None):
         self._collection = collection
         self._user_id = user_id
+        # Optional read-through cache of this user's documents; every write below invalidates it
+        self._cache = cache
+        # Data version produced by this instance's last write (None without a cache or Redis)
+        self._cache_version: int | None = None
+
+    # --- Read-through cache helpers ---
+    async def _cached_items(self) -> List[dict] | None:
+        """The user's documents from the cache, or None if the caller must query Mongo."""
+        if self._cache is None:
+            return None
+        return await self._cache.get_items(
+            lambda max_items: self._collection.find({"user_id": self._user_id}).limit(max_items).to_list(length=max_items)
+        )
+
+    async def _invalidate_cache(self):
+        if self._cache is not None:
+            self._cache_version = await self._cache.invalidate()
 
     async def _create(self, data: dict) -> str:
         result = await self._collection.insert_one(data)
+        await self._invalidate_cache()
         return str(result.inserted_id)
     
     async def _get_by_id(self, item_id: str) -> dict | None:
         try:
             obj_id = ObjectId(item_id)
+            cached = await self._cached_items()
+            if cached is not None:
+                return next((item for item in cached if item["_id"] == obj_id), None)
             item = await self._collection.find_one({"_id": obj_id, "user_id": self._user_id})
             return item
         except Exception:
@@ -22,6 +90,9 @@ class BaseRepository:
         
     async def _get_by_name(self, name: str) -> dict | None:
         try:
+            cached = await self._cached_items()
+            if cached is not None:
+                return next((item for item in cached if item.get("name") == name), None)
             item = await self._collection.find_one({"name": name, "user_id": self._user_id})
             return item
         except Exception:
@@ -29,7 +100,7 @@ class BaseRepository:
     
     async def get_id_by_name(self, name: str) -> str | None:
         try:
-            item = await self._collection.find_one({"name": name, "user_id": self._user_id}, {"_id": 1})
+            item = await self._get_by_name(name)
             if item:
                 return str(item["_id"])
             return None
@@ -54,6 +125,7 @@ class BaseRepository:
                 {"_id": obj_id, "user_id": self._user_id},
                 {"$set": update_data}
             )
+            await self._invalidate_cache()
             return result.modified_count
         except Exception as e:
             print(f"Error updating item {item_id}: {e}")
@@ -63,30 +135,151 @@ class BaseRepository:
         try:
             obj_id = ObjectId(item_id)
             result = await self._collection.delete_one({"_id": obj_id, "user_id": self._user_id})
+            await self._invalidate_cache()
             return result.deleted_count
         except Exception as e:
             print(f"Error deleting item {item_id}: {e}")
             return 0
 
-    async def _get_all(self, filter_query: Dict = None, sort_by: str = None, ascending: bool = True) -> List[dict]:
+    async def _get_all(self, filter_query: Dict = None, sort_by: str = None, ascending: bool = True, projection: Dict = None) -> List[dict]:
+        """
+        Retrieves all items for the user, with optional filtering, sorting and projection.
+        Prefer _get_page or _stream_all when the result set can be large.
+        """
+        return [item async for item in self._stream_all(filter_query, sort_by, ascending, projection)]
+
+    async def _stream_all(self, filter_query: Dict = None, sort_by: str = None, ascending: bool = True,
+                          projection: Dict = None, batch_size: int = 100) -> AsyncIterator[dict]:
+        """
+        Yields matching items one by one while the driver fetches them in batches,
+        so memory stays bounded by batch_size instead of the full result set.
+        """
+        cursor = self._collection.find(self._scoped_query(filter_query), projection).batch_size(batch_size)
+        if sort_by:
+            cursor = cursor.sort(sort_by, 1 if ascending else -1)
+        async for item in cursor:
+            yield item
+
+    async def _get_page(self, filter_query: Dict = None, sort_by: str = None, ascending: bool = True,
+                        projection: Dict = None, limit: int = DEFAULT_PAGE_SIZE, cursor: str = None) -> Tuple[List[dict], str | None]:
         """
-        Retrieves all items for the user, with optional filtering and sorting.
+        Returns one keyset-paginated page and the cursor for the next page (None on the last page).
+        Items are ordered by (sort_by, _id), so pages stay stable while items are added.
         """
+        limit = max(1, min(int(limit or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+        if self._is_simple_filter(filter_query):
+            cached = await self._cached_items()
+            if cached is not None:
+                return self._page_from_items(cached, filter_query, sort_by, ascending, projection, limit, cursor)
+
+        direction = 1 if ascending else -1
+        query = self._scoped_query(filter_query)
+
+        if cursor:
+            last_value, last_id = self._decode_cursor(cursor)
+            op = "$gt" if ascending else "$lt"
+            if sort_by:
+                keyset = self._keyset(sort_by, ascending, last_value, last_id)
+            else:
+                keyset = {"_id": {op: last_id}}
+            query = {"$and": [query, keyset]}
+
+        if projection and any(projection.values()):
+            # Inclusion projections must keep the keys the next cursor is built from
+            projection = {**projection, "_id": 1, **({sort_by: 1} if sort_by else {})}
+
+        sort = [(sort_by, direction), ("_id", direction)] if sort_by else [("_id", direction)]
+        # Fetch one extra item to know whether another page exists
+        items = await self._collection.find(query, projection).sort(sort).limit(limit + 1).to_list(length=limit + 1)
+
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            last = items[-1]
+            next_cursor = self._encode_cursor(self._get_path(last, sort_by) if sort_by else None, last["_id"])
+        return items, next_cursor
+
+    @staticmethod
+    def _keyset(sort_by: str, ascending: bool, last_value: Any, last_id: ObjectId) -> Dict:
+        """
+        Items after (last_value, last_id). Missing and null values sort first ascending and last
+        descending, and $gt/$lt only match values of their own type, so nulls get their own branches.
+        """
+        op = "$gt" if ascending else "$lt"
+        after_id = {sort_by: last_value, "_id": {op: last_id}}
+        if last_value is None:
+            return {"$or": [{sort_by: {"$ne": None}}, after_id]} if ascending else after_id
+        branches = [{sort_by: {op: last_value}}, after_id]
+        if not ascending:
+            branches.append({sort_by: None})
+        return {"$or": branches}
+
+    def _page_from_items(self, items: List[dict], filter_query: Dict, sort_by: str, ascending: bool,
+                         projection: Dict, limit: int, cursor: str) -> Tuple[List[dict], str | None]:
+        """Same semantics as the Mongo path of _get_page, applied to cached documents."""
+        filter_query = filter_query or {}
+        matching = [
+            item for item in items
+            if all(self._matches(self._get_path(item, key), value) for key, value in filter_query.items())
+        ]
+        sort_key = lambda item: (_bson_sort_key(self._get_path(item, sort_by)) if sort_by else (), item["_id"])
+        matching.sort(key=sort_key, reverse=not ascending)
+
+        if cursor:
+            last_value, last_id = self._decode_cursor(cursor)
+            last_key = ((_bson_sort_key(last_value) if sort_by else ()), last_id)
+            matching = [item for item in matching if (sort_key(item) > last_key if ascending else sort_key(item) < last_key)]
+
+        page = matching[:limit]
+        next_cursor = None
+        if len(matching) > limit:
+            last = page[-1]
+            next_cursor = self._encode_cursor(self._get_path(last, sort_by) if sort_by else None, last["_id"])
+
+        if projection and any(projection.values()):
+            keep = {"_id", *projection, *([sort_by] if sort_by else [])}
+            page = [{key: value for key, value in item.items() if key in keep} for item in page]
+        return page, next_cursor
+
+    @staticmethod
+    def _matches(stored: Any, value: Any) -> bool:
+        """Equality as Mongo evaluates it: a scalar matches an array field that contains it."""
+        return stored == value or (isinstance(stored, list) and value in stored)
+
+    @staticmethod
+    def _is_simple_filter(filter_query: Dict | None) -> bool:
+        """True for plain equality filters, the only kind the cached path evaluates."""
+        return all(
+            not key.startswith("$") and not isinstance(value, (dict, list))
+            for key, value in (filter_query or {}).items()
+        )
+
+    def _scoped_query(self, filter_query: Dict = None) -> Dict:
         # Start with the essential security filter
         query = {"user_id": self._user_id}
-        
         # Add any additional filters if provided
         if filter_query:
             query.update(filter_query)
-            
-        cursor = self._collection.find(query)
-        
-        # Apply sorting if requested
-        if sort_by:
-            sort_direction = 1 if ascending else -1
-            cursor = cursor.sort(sort_by, sort_direction)
-            
-        return await cursor.to_list(length=None) # Use a reasonable length limit in production
+        return query
+
+    @staticmethod
+    def _get_path(item: dict, path: str) -> Any:
+        for part in path.split("."):
+            item = item.get(part) if isinstance(item, dict) else None
+        return item
+
+    @staticmethod
+    def _encode_cursor(last_value: Any, last_id: ObjectId) -> str:
+        raw = json_util.dumps({"v": last_value, "id": last_id})
+        return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> Tuple[Any, ObjectId]:
+        try:
+            data = json_util.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+            return data["v"], data["id"]
+        except Exception:
+            raise ValueError("Invalid pagination cursor.")
 
     async def delete_many(self, filter_query: Dict) -> int:
         """
@@ -97,4 +290,108 @@ class BaseRepository:
         query.update(filter_query)
         
         result = await self._collection.delete_many(query)
-        return result.deleted_count
\ No newline at end of file
+        await self._invalidate_cache()
+        return result.deleted_count
+
+    # --- Bulk operations: one round trip for many items, one result per input item ---
+    async def bulk_create(self, items: List[dict]) -> List[Dict[str, Any]]:
+        """
+        Inserts many items with a single insert_many. Returns one result per input item,
+        in input order: {"index", "status", "id"} or {"index", "status", "error"}.
+        """
+        if not items:
+            return []
+        for item in items:
+            # Security: every item belongs to this user, whatever the caller passed
+            item["user_id"] = self._user_id
+
+        write_errors = {}
+        try:
+            await self._collection.insert_many(items, ordered=False)
+        except BulkWriteError as e:
+            write_errors = {error["index"]: error.get("errmsg", "Write error") for error in e.details.get("writeErrors", [])}
+        await self._invalidate_cache()
+
+        return [
+            {"index": index, "status": "failure", "error": write_errors[index]} if index in write_errors
+            else {"index": index, "status": "success", "id": str(item["_id"])}
+            for index, item in enumerate(items)
+        ]
+
+    async def bulk_update(self, updates: List[Tuple[str, dict]]) -> List[Dict[str, Any]]:
+        """
+        Applies many (item_id, update_data) pairs with a single bulk_write.
+        Returns one result per input pair, in input order.
+        """
+        def _build_op(item_id: str, update_data: dict):
+            obj_id = ObjectId(item_id)
+            update_data = {k: v for k, v in update_data.items() if k not in ("_id", "user_id")}
+            if not update_data:
+                raise ValueError("No fields to update.")
+            return obj_id, UpdateOne({"_id": obj_id, "user_id": self._user_id}, {"$set": update_data})
+
+        return await self._bulk_write([(item_id, _build_op, (item_id, update_data)) for item_id, update_data in updates])
+
+    async def bulk_delete(self, item_ids: List[str]) -> List[Dict[str, Any]]:
+        """Deletes many items with a single bulk_write. Returns one result per input id, in input order."""
+        def _build_op(item_id: str):
+            obj_id = ObjectId(item_id)
+            return obj_id, DeleteOne({"_id": obj_id, "user_id": self._user_id})
+
+        return await self._bulk_write([(item_id, _build_op, (item_id,)) for item_id in item_ids])
+
+    @staticmethod
+    def _bulk_response(results: List[Dict[str, Any]], verb: str, noun: str) -> Dict[str, Any]:
+        """Wraps per-item bulk results in the usual tool response shape."""
+        succeeded = sum(1 for result in results if result["status"] == "success")
+        if succeeded == len(results):
+            status = "success"
+        elif succeeded:
+            status = "partial_success"
+        else:
+            status = "failure"
+        return {
+            "status": status,
+            "message": f"{verb} {succeeded} of {len(results)} {noun}.",
+            "data": results
+        }
+
+    async def _bulk_write(self, requests: List[Tuple[str, Any, tuple]]) -> List[Dict[str, Any]]:
+        """
+        Shared driver for bulk_update/bulk_delete. Each request is (item_id, build_op, args),
+        where build_op returns (ObjectId, write op). bulk_write only reports totals, so the
+        ids are checked up front with one indexed query to report each item separately.
+        """
+        results: List[Dict[str, Any] | None] = [None] * len(requests)
+        ops, op_positions, obj_ids = [], [], []
+        for index, (item_id, build_op, args) in enumerate(requests):
+            try:
+                obj_id, op = build_op(*args)
+            except Exception as e:
+                results[index] = {"index": index, "id": item_id, "status": "failure", "error": str(e) or "Invalid item ID."}
+                continue
+            ops.append(op)
+            op_positions.append(index)
+            obj_ids.append(obj_id)
+
+        if ops:
+            existing = {
+                item["_id"] async for item in
+                self._collection.find({"_id": {"$in": obj_ids}, "user_id": self._user_id}, {"_id": 1})
+            }
+            write_errors = {}
+            try:
+                await self._collection.bulk_write(ops, ordered=False)
+            except BulkWriteError as e:
+                write_errors = {error["index"]: error.get("errmsg", "Write error") for error in e.details.get("writeErrors", [])}
+            await self._invalidate_cache()
+
+            for op_index, (index, obj_id) in enumerate(zip(op_positions, obj_ids)):
+                item_id = requests[index][0]
+                if op_index in write_errors:
+                    results[index] = {"index": index, "id": item_id, "status": "failure", "error": write_errors[op_index]}
+                elif obj_id not in existing:
+                    results[index] = {"index": index, "id": item_id, "status": "failure", "error": "Item not found."}
+                else:
+                    results[index] = {"index": index, "id": item_id, "status": "success"}
+        return results
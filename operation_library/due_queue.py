@@ -0,0 +1,102 @@
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Tuple
+
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_DUE_KEY = "tasks:due"
+
+
+def _epoch(moment: datetime) -> float:
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc) # Mongo returns naive UTC datetimes
+    return moment.timestamp()
+
+
+async def claim_due(redis, until: float, batch_size: int) -> List[Tuple[str, str, float]]:
+    """
+    Removes and returns up to batch_size entries of the global queue due by 'until', as
+    (user_id, task_id, due epoch). Each entry is claimed by its own ZREM, so when several
+    workers race for the same entry exactly one of them gets it.
+    """
+    entries = await redis.zrangebyscore(GLOBAL_DUE_KEY, "-inf", until, start=0, num=batch_size, withscores=True)
+    if not entries:
+        return []
+    pipeline = redis.pipeline(transaction=False)
+    for member, _ in entries:
+        pipeline.zrem(GLOBAL_DUE_KEY, member)
+    claimed = await pipeline.execute()
+    return [
+        (*member.split(":", 1), score)
+        for (member, score), won in zip(entries, claimed) if won
+    ]
+
+
+class DueQueue:
+    """
+    One user's active, scheduled tasks in two Redis sorted sets scored by next due time
+    (epoch seconds):
+
+        tasks:due                 -> "{user_id}:{task_id}", drained by the reminder dispatcher
+        user:{user_id}:tasks:due  -> "{task_id}", for overdue and due-soon lookups
+
+    Task writes keep both in sync, so a lookup is one O(log n + k) range read instead of a
+    scan. Mongo stays the source of truth: the per-user set is marked as built, and a missing
+    marker (new deployment, Redis flushed) makes the caller rebuild it from the tasks.
+    """
+
+    def __init__(self, redis, user_id: str):
+        self._redis = redis
+        self._user_id = user_id
+        self._key = f"user:{user_id}:tasks:due"
+        self._built_key = f"{self._key}:built"
+
+    def _member(self, task_id: str) -> str:
+        return f"{self._user_id}:{task_id}"
+
+    async def sync(self, tasks: Iterable[dict], removed: Iterable[str] = ()):
+        """
+        Puts each task document (needs _id, status, next_occurrence) at its due time, or takes
+        it out when it is no longer active or scheduled. Best effort: Redis errors are logged.
+        """
+        pipeline = self._redis.pipeline(transaction=False)
+        for task in tasks:
+            task_id = str(task["_id"])
+            due_at = task.get("next_occurrence")
+            if task.get("status", "active") == "active" and due_at is not None:
+                pipeline.zadd(self._key, {task_id: _epoch(due_at)})
+                pipeline.zadd(GLOBAL_DUE_KEY, {self._member(task_id): _epoch(due_at)})
+            else:
+                pipeline.zrem(self._key, task_id)
+                pipeline.zrem(GLOBAL_DUE_KEY, self._member(task_id))
+        for task_id in removed:
+            pipeline.zrem(self._key, task_id)
+            pipeline.zrem(GLOBAL_DUE_KEY, self._member(task_id))
+        try:
+            await pipeline.execute()
+        except RedisError as e:
+            logger.warning(f"Could not update the due queue of user '{self._user_id}': {e}")
+
+    async def reschedule(self, times: Dict[str, datetime]):
+        """Moves tasks to new due times in both sets (after a recurring occurrence passed)."""
+        await self.sync([{"_id": task_id, "next_occurrence": due_at} for task_id, due_at in times.items()])
+
+    async def is_built(self) -> bool:
+        return bool(await self._redis.exists(self._built_key))
+
+    async def rebuild(self, tasks: List[dict]):
+        """Replaces the user's set with these active, scheduled tasks and marks it as built."""
+        pipeline = self._redis.pipeline(transaction=True)
+        pipeline.delete(self._key)
+        if tasks:
+            pipeline.zadd(self._key, {str(task["_id"]): _epoch(task["next_occurrence"]) for task in tasks})
+            pipeline.zadd(GLOBAL_DUE_KEY, {self._member(str(task["_id"])): _epoch(task["next_occurrence"]) for task in tasks})
+        pipeline.set(self._built_key, 1)
+        await pipeline.execute()
+
+    async def due_before(self, until: datetime, limit: int = 200) -> List[Tuple[str, datetime]]:
+        """(task_id, due time) of the user's tasks due before 'until', earliest first."""
+        entries = await self._redis.zrangebyscore(self._key, "-inf", until.timestamp(), start=0, num=limit, withscores=True)
+        return [(task_id, datetime.fromtimestamp(score, timezone.utc)) for task_id, score in entries]
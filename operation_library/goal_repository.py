@@ -1,19 +1,44 @@
 from operation_library.base_repository import BaseRepository
-from database import goals_collection
+import database
+from operation_library.repository_cache import RepositoryCache
 from datetime import datetime
-from typing import List, Dict, Any
-from models.main_models import GoalModel
+from collections import defaultdict
+from typing import List, Dict, Any, Tuple
+from bson import ObjectId
+from pymongo import UpdateOne
+from models.main_models import GoalModel, partial_model, trusted_dump
 from pydantic import ValidationError
 from system_tools import get_current_time
 import logging
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def _weight_factor(weight: int | None) -> float:
+    """A goal's weight (0-100, default 100) as a multiplier for its sub-goals."""
+    return (100 if weight is None else weight) / 100
+
 class GoalRepository(BaseRepository):
+    # Goals form a tree through parent_goal. Each goal also stores its materialized path
+    # ('ancestors', root first) and 'effective_weight', so a whole subtree is one indexed query.
+    INDEXES = BaseRepository.INDEXES + [
+        {"keys": [("user_id", 1), ("ancestors", 1)]},
+    ]
+    QUERY_SHAPES = BaseRepository.QUERY_SHAPES + [
+        {"filter": {"ancestors": "000000000000000000000000"}},
+        {"filter": {"$or": [{"_id": ObjectId("000000000000000000000000")}, {"ancestors": "000000000000000000000000"}]}},
+    ]
+    # Fields returned by list_goals; full documents are available through get_goal_by_id
+    LIST_PROJECTION = {"name": 1, "description": 1, "parent_goal": 1, "weight": 1, "effective_weight": 1, "status": 1}
+    TREE_PROJECTION = {"name": 1, "status": 1, "weight": 1, "effective_weight": 1, "parent_goal": 1, "ancestors": 1}
+    HIERARCHY_PROJECTION = {"parent_goal": 1, "ancestors": 1, "weight": 1, "effective_weight": 1}
+
     def __init__(self, user_id: str):
         # Tell the base class which collection to use and who the user is
-        super().__init__(collection=goals_collection, user_id=user_id)
+        super().__init__(
+            collection=database.goals_collection,
+            user_id=user_id,
+            cache=RepositoryCache(database.redis_client, "goals", user_id)
+        )
 
     @staticmethod
     def get_tool_definitions():
@@ -29,7 +54,7 @@ class GoalRepository(BaseRepository):
                         "properties": {
                             "name": {"type": "string", "description": "A concise name for the goal, inferred from the user's request."},
                             "description": {"type": "string", "description": "All other details provided by the user, including the full description."},
-                            "parentgoal": {"type": "string", "description": "Optional. The name or ID of the parent goal, if this goal is a sub-goal."},
+                            "parent_goal": {"type": "string", "description": "Optional. The name or ID of the parent goal, if this goal is a sub-goal."},
                             "weight": {"type": "integer", "description": "Optional. An integer from 0 to 100 indicating the importance of this goal."}
                         },
                         "required": ["name", "description"]
@@ -73,11 +98,28 @@ class GoalRepository(BaseRepository):
                 },
                 "internal_method_name": "get_goal_by_name"
             },
+            {
+                "type": "function",
+                "function": {
+                    "name": "get_goal_tree",
+                    "description": "Retrieve a goal together with all of its sub-goals as a nested tree in one call. Each goal includes its effective_weight: the product of weight/100 along the path from its top-level goal. Without item_id or name, returns all of the user's goals as trees. Prefer this over fetching goals level by level.",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "item_id": {"type": "string", "description": "Optional. The unique identifier of the goal at the top of the tree."},
+                            "name": {"type": "string", "description": "Optional. The name of the goal at the top of the tree."},
+                            "max_depth": {"type": "integer", "minimum": 0, "description": "Optional. How many levels of sub-goals to include (default: all)."}
+                        },
+                        "required": []
+                    }
+                },
+                "internal_method_name": "get_goal_tree"
+            },
             {
                 "type": "function",
                 "function": {
                     "name": "update_goal",
-                    "description": "Update an existing goal's details using its unique identifier (ID).",
+                    "description": "Update an existing goal's details using its unique identifier (ID). Setting 'parent_goal' (name or ID, or null for a top-level goal) moves the goal together with all of its sub-goals.",
                     "parameters": {
                         "type": "object",
                         "properties": {
@@ -117,7 +159,7 @@ class GoalRepository(BaseRepository):
                 "type": "function",
                 "function": {
                     "name": "list_goals",
-                    "description": "List all goals, with optional filtering and sorting.",
+                    "description": "List goals one page at a time, with optional filtering and sorting. If the result has a 'next_cursor', pass it back as 'cursor' to get more.",
                     "parameters": {
                         "type": "object",
                         "properties": {
@@ -128,26 +170,99 @@ class GoalRepository(BaseRepository):
                             "sort_by": {
                                 "type": "string",
                                 "description": "Optional. The field name to sort the goals by, e.g., 'created_at'."
+                            },
+                            "limit": {
+                                "type": "integer",
+                                "description": "Optional. Maximum number of goals to return in this page (default 50, max 200)."
+                            },
+                            "cursor": {
+                                "type": "string",
+                                "description": "Optional. The 'next_cursor' value from a previous call, to fetch the next page."
                             }
                         },
                         "required": []
                     }
                 },
                 "internal_method_name": "list_goals"
+            },
+            {
+                "type": "function",
+                "function": {
+                    "name": "create_goals",
+                    "description": "Create several goals in one call, e.g. when breaking a goal into many goals. Prefer this over calling create_goal repeatedly.",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "goals": {
+                                "type": "array",
+                                "description": "The goals to create.",
+                                "items": {
+                                    "type": "object",
+                                    "properties": {
+                                        "name": {"type": "string", "description": "A concise name for the goal."},
+                                        "description": {"type": "string", "description": "All other details of the goal."},
+                                        "parent_goal": {"type": "string", "description": "Optional. The name or ID of the parent goal, if this goal is a sub-goal. May name a goal created earlier in the same call."},
+                                        "weight": {"type": "integer", "description": "Optional. An integer from 0 to 100 indicating the importance of this goal."}
+                                    },
+                                    "required": ["name", "description"]
+                                }
+                            }
+                        },
+                        "required": ["goals"]
+                    }
+                },
+                "internal_method_name": "create_goals"
+            },
+            {
+                "type": "function",
+                "function": {
+                    "name": "update_goals",
+                    "description": "Update several existing goals in one call, each by its unique identifier (ID).",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "updates": {
+                                "type": "array",
+                                "description": "One entry per goal to update.",
+                                "items": {
+                                    "type": "object",
+                                    "properties": {
+                                        "item_id": {"type": "string", "description": "The unique identifier of the goal to update."},
+                                        "update_data": {"type": "object", "description": "The fields to update and their new values."}
+                                    },
+                                    "required": ["item_id", "update_data"]
+                                }
+                            }
+                        },
+                        "required": ["updates"]
+                    }
+                },
+                "internal_method_name": "update_goals"
             }
         ]
     
-    async def create_goal(self, name: str, description: str, parentgoal: str = None, weight: int = None) -> Dict[str, Any]:
-        logger.info(f"Attempting to create a goal for user '{self.user_id}' with data: {name}, {description}, {parentgoal}, {weight}")
+    async def create_goal(self, name: str, description: str, parent_goal: str = None, weight: int = None) -> Dict[str, Any]:
+        logger.info(f"Attempting to create a goal for user '{self._user_id}' with data: {name}, {description}, {parent_goal}, {weight}")
         try:
+            # 1. Resolve the parent so the goal is stored with its materialized path
+            parent = None
+            if parent_goal:
+                parent = await self._resolve_goal(parent_goal)
+                if parent is None:
+                    return {
+                        "status": "failure",
+                        "message": f"Parent goal '{parent_goal}' not found. Create it first or leave parent_goal empty.",
+                        "data": None
+                    }
+            weight = 100 if weight is None else weight
             goal = GoalModel(
                 user_id=self._user_id,
                 name=name,
                 description=description,
-                parentgoal=parentgoal,
                 weight=weight,
                 created_at=get_current_time(),
-                status="active" # Default status is active
+                status="active", # Default status is active
+                **self._lineage(parent, weight)
             )
             # 2. Convert the Pydantic model to a dictionary for MongoDB insertion
             goal_dict = goal.model_dump(by_alias=True)
@@ -171,7 +286,7 @@ class GoalRepository(BaseRepository):
                     "type": "DataValidationError",
                     "summary": "The provided data did not pass validation checks.",
                     "validation_errors": e.errors(), 
-                    "original_input": {"name": name, "description": description, "parentgoal": parentgoal, "weight": weight}
+                    "original_input": {"name": name, "description": description, "parent_goal": parent_goal, "weight": weight}
                 }
             }
         
@@ -187,7 +302,7 @@ class GoalRepository(BaseRepository):
                     "type": "InternalServerError",
                     "summary": "An unexpected error occurred on the server side. This is likely not a problem with the input data.",
                     "error_info": f"{type(e).__name__}: {str(e)}",
-                    "original_input": {"name": name, "description": description, "parentgoal": parentgoal, "weight": weight}
+                    "original_input": {"name": name, "description": description, "parent_goal": parent_goal, "weight": weight}
                 }
             }
 
@@ -197,11 +312,10 @@ class GoalRepository(BaseRepository):
 
         if goal_dict:
             logger.info(f"Goal found with ID: {item_id}")
-            goal_model = GoalModel(**goal_dict)  # This will also validate the data
             return {
                 "status": "success",
                 "message": f"Successfully retrieved goal with ID: {item_id}",
-                "data": goal_model.model_dump(by_alias=True) # Return as dict with alias (i.e., _id
+                "data": trusted_dump(GoalModel, goal_dict) # Trusted read: no re-validation of our own documents
                 }
         
         else:
@@ -216,11 +330,10 @@ class GoalRepository(BaseRepository):
         item = await super()._get_by_name(name)
         if item:
             logger.info(f"Goal found with name: {name}")
-            goal_model = GoalModel(**item)
             return {
                 "status": "success",
                 "message": f"Successfully retrieved goal with name: {name}",
-                "data": goal_model.model_dump(by_alias=True) # Return as dict with alias (i.e., _id)
+                "data": trusted_dump(GoalModel, item) # Trusted read: no re-validation of our own documents
             }
         else:
             logger.info(f"Query successful, but no goal found with name: {name}")
@@ -233,9 +346,19 @@ class GoalRepository(BaseRepository):
     async def update_goal(self, item_id: str, update_data: dict) -> Dict[str, Any]:
         logger.info(f"Attempting to update goal with ID: {item_id} using data: {update_data}")
         try:
-            goal = GoalModel(**update_data)  # Validate the update data
-            goal_dict = goal.model_dump(by_alias=True)
+            # Validate only the fields that were sent
+            goal_dict = partial_model(GoalModel).model_validate(update_data).model_dump(by_alias=True, exclude_unset=True)
+            goal_dict, error_message = await self._with_lineage(item_id, goal_dict)
+            if error_message:
+                return {
+                    "status": "failure",
+                    "message": error_message,
+                    "updated_count": 0
+                }
             updated_number = await super()._update(item_id, goal_dict)
+            if "ancestors" in goal_dict:
+                # The goal moved or was re-weighted: carry the change down its subtree
+                await self._rebuild_subtree(item_id, item_id, [*goal_dict["ancestors"], item_id], goal_dict["effective_weight"])
             if updated_number == 0:
                 logger.info(f"No goal found with ID: {item_id} to update.")
                 return {
@@ -267,10 +390,15 @@ class GoalRepository(BaseRepository):
     
     async def delete_goal(self, item_id: str) -> Dict[str, Any]:
         # 1. Call the base class's internal method to perform the deletion
+        goal = await super()._get_by_id(item_id)
         deleted_count = await super()._delete(item_id)
 
         # 2. Return a structured response based on the deletion result
         if deleted_count > 0:
+            # Sub-goals move up to the deleted goal's parent
+            parent = await super()._get_by_id(goal["parent_goal"]) if goal.get("parent_goal") else None
+            base_weight = parent.get("effective_weight", 1.0) if parent else 1.0
+            await self._rebuild_subtree(item_id, goal.get("parent_goal"), goal.get("ancestors", []), base_weight)
             logger.info(f"Goal with ID: {item_id} deleted successfully.")
             return {
                 "status": "success",
@@ -285,14 +413,301 @@ class GoalRepository(BaseRepository):
                 "deleted_count": 0
             }
 
-    async def list_goal(filter_by: dict = None, sort_by: str = None) -> Dict[str, Any]:
+    # --- Bulk tools: validate the whole batch first, then write it in one round trip ---
+    async def create_goals(self, goals: List[Dict[str, Any]]) -> Dict[str, Any]:
+        logger.info(f"Attempting to create {len(goals)} goals for user '{self._user_id}'")
+        results: List[Dict[str, Any] | None] = [None] * len(goals)
+        valid_docs, valid_positions = [], []
+        created_at = get_current_time()
+        # Goals of this batch by name and ID, so later items can use earlier ones as parents
+        batch_goals: Dict[str, dict] = {}
+        for index, item in enumerate(goals):
+            parent_ref = item.get("parent_goal")
+            parent = None
+            if parent_ref:
+                parent = batch_goals.get(parent_ref) or await self._resolve_goal(parent_ref)
+                if parent is None:
+                    results[index] = {"index": index, "name": item.get("name"), "status": "failure",
+                                      "error": f"Parent goal '{parent_ref}' not found."}
+                    continue
+            try:
+                weight = 100 if item.get("weight") is None else item.get("weight")
+                goal = GoalModel(
+                    user_id=self._user_id,
+                    name=item.get("name"),
+                    description=item.get("description"),
+                    weight=weight,
+                    created_at=created_at,
+                    status="active",
+                    **self._lineage(parent, weight)
+                )
+                goal_dict = goal.model_dump(by_alias=True)
+                valid_docs.append(goal_dict)
+                valid_positions.append(index)
+                batch_goals[goal_dict["name"]] = batch_goals[str(goal_dict["_id"])] = goal_dict
+            except ValidationError as e:
+                results[index] = {"index": index, "name": item.get("name"), "status": "failure",
+                                  "validation_errors": e.errors(include_url=False)}
+
+        try:
+            for position, write_result in zip(valid_positions, await super().bulk_create(valid_docs)):
+                results[position] = {**write_result, "index": position, "name": goals[position].get("name")}
+        except Exception as e:
+            error_message = "Goal creation failed due to an unexpected internal error."
+            logger.error(f"{error_message} Exception: {e}", exc_info=True)
+            return {
+                "status": "failure",
+                "message": error_message,
+                "data": None,
+                "error_details": {
+                    "type": "InternalServerError",
+                    "summary": "An unexpected error occurred on the server side. This is likely not a problem with the input data.",
+                    "error_info": f"{type(e).__name__}: {str(e)}"
+                }
+            }
+        return self._bulk_response(results, "Created", "goals")
+
+    async def update_goals(self, updates: List[Dict[str, Any]]) -> Dict[str, Any]:
+        logger.info(f"Attempting to update {len(updates)} goals for user '{self._user_id}'")
+        partial_goal = partial_model(GoalModel)
+        results: List[Dict[str, Any] | None] = [None] * len(updates)
+        valid_updates, valid_positions = [], []
+        for index, item in enumerate(updates):
+            try:
+                update_data = partial_goal.model_validate(item.get("update_data") or {}).model_dump(by_alias=True, exclude_unset=True)
+            except ValidationError as e:
+                results[index] = {"index": index, "id": item.get("item_id"), "status": "failure",
+                                  "validation_errors": e.errors(include_url=False)}
+                continue
+            update_data, error_message = await self._with_lineage(item.get("item_id"), update_data)
+            if error_message:
+                results[index] = {"index": index, "id": item.get("item_id"), "status": "failure", "error": error_message}
+                continue
+            valid_updates.append((item.get("item_id"), update_data))
+            valid_positions.append(index)
+
+        # Each move was checked against the stored tree; together they can still close a cycle
+        # (A under B and B under A), so check them against the tree after the whole batch
+        cyclic = self._batch_cycles({item_id: update_data for item_id, update_data in valid_updates if "ancestors" in update_data})
+        if cyclic:
+            for item_id, position in zip([item_id for item_id, _ in valid_updates], valid_positions):
+                if item_id in cyclic:
+                    results[position] = {"index": position, "id": item_id, "status": "failure",
+                                         "error": "A goal cannot be moved under itself or one of its sub-goals (including goals moved in the same batch)."}
+            kept = [(update, position) for update, position in zip(valid_updates, valid_positions) if update[0] not in cyclic]
+            valid_updates, valid_positions = [update for update, _ in kept], [position for _, position in kept]
+
+        for position, write_result in zip(valid_positions, await super().bulk_update(valid_updates)):
+            results[position] = {**write_result, "index": position}
+
+        # Rebuild the subtree of every moved or re-weighted goal, except those that lie inside
+        # another rebuilt subtree: that rebuild already recomputes them from fresh values.
+        moved = {
+            item_id: update_data for (item_id, update_data), position in zip(valid_updates, valid_positions)
+            if "ancestors" in update_data and results[position]["status"] == "success"
+        }
+        for item_id, update_data in moved.items():
+            if not moved.keys() & set(update_data["ancestors"]):
+                await self._rebuild_subtree(item_id, item_id, [*update_data["ancestors"], item_id], update_data["effective_weight"])
+        return self._bulk_response(results, "Updated", "goals")
+
+    # --- Goal hierarchy ---
+    async def get_goal_tree(self, item_id: str = None, name: str = None, max_depth: int = None) -> Dict[str, Any]:
+        try:
+            root_id = None
+            if item_id or name:
+                root_id = item_id if item_id and ObjectId.is_valid(item_id) else await super().get_id_by_name(name or item_id)
+                if root_id is None:
+                    return {
+                        "status": "failure",
+                        "message": f"No goal found with {'ID' if item_id else 'name'}: {item_id or name}",
+                        "data": None
+                    }
+            goals = await self._load_subtree(root_id)
+            if root_id and not goals:
+                return {
+                    "status": "failure",
+                    "message": f"No goal found with ID: {root_id}",
+                    "data": None
+                }
+            tree = self._build_tree(goals, root_id, max_depth)
+            logger.info(f"Retrieved a goal tree of {len(goals)} goals for root: {root_id}")
+            return {
+                "status": "success",
+                "message": f"Retrieved {len(goals)} goals as {len(tree)} tree(s).",
+                "data": tree
+            }
+        except Exception as e:
+            error_message = "Failed to retrieve the goal tree due to an unexpected internal error."
+            logger.error(f"{error_message} Exception: {e}", exc_info=True)
+            return {
+                "status": "failure",
+                "message": error_message,
+                "data": None,
+                "error_details": {
+                    "type": "InternalServerError",
+                    "summary": "An unexpected error occurred on the server side while retrieving goals.",
+                    "error_info": f"{type(e).__name__}: {str(e)}"
+                }
+            }
+
+    async def _load_subtree(self, root_id: str | None) -> List[dict]:
+        """The goal root_id and all of its descendants (every goal if None), in one indexed query."""
+        cached = await self._cached_items()
+        if cached is not None:
+            return [
+                goal for goal in cached
+                if root_id is None or str(goal["_id"]) == root_id or root_id in goal.get("ancestors", [])
+            ]
+        query = {} if root_id is None else {"$or": [{"_id": ObjectId(root_id)}, {"ancestors": root_id}]}
+        return await super()._get_all(query, projection=self.TREE_PROJECTION)
+
+    @staticmethod
+    def _build_tree(goals: List[dict], root_id: str | None, max_depth: int | None) -> List[Dict[str, Any]]:
+        """Nests goals under their parents. Goals whose parent is not in the set become roots."""
+        ids = {str(goal["_id"]) for goal in goals}
+        children: Dict[str | None, List[dict]] = defaultdict(list)
+        roots = []
+        for goal in sorted(goals, key=lambda goal: goal.get("name") or ""):
+            goal_id = str(goal["_id"])
+            if goal_id == root_id or (root_id is None and goal.get("parent_goal") not in ids):
+                roots.append(goal)
+            else:
+                children[goal.get("parent_goal")].append(goal)
+
+        def to_node(goal: dict, depth: int) -> Dict[str, Any]:
+            goal_id = str(goal["_id"])
+            node = {
+                "id": goal_id,
+                "name": goal.get("name"),
+                "status": goal.get("status"),
+                "weight": goal.get("weight"),
+                "effective_weight": goal.get("effective_weight")
+            }
+            if max_depth is None or depth < max_depth:
+                node["children"] = [to_node(child, depth + 1) for child in children[goal_id]]
+            elif children[goal_id]:
+                node["sub_goal_count"] = len(children[goal_id])
+            return node
+
+        return [to_node(root, 0) for root in roots]
+
+    async def _resolve_goal(self, ref: str) -> dict | None:
+        """Finds a goal by ID or, failing that, by name."""
+        if ObjectId.is_valid(ref):
+            goal = await super()._get_by_id(ref)
+            if goal:
+                return goal
+        return await super()._get_by_name(ref)
+
+    @staticmethod
+    def _lineage(parent: dict | None, weight: int | None) -> Dict[str, Any]:
+        """parent_goal, ancestors and effective_weight of a goal placed under parent (None: top level)."""
+        if parent is None:
+            return {"parent_goal": None, "ancestors": [], "effective_weight": _weight_factor(weight)}
+        parent_id = str(parent["_id"])
+        return {
+            "parent_goal": parent_id,
+            "ancestors": [*parent.get("ancestors", []), parent_id],
+            "effective_weight": round(parent.get("effective_weight", 1.0) * _weight_factor(weight), 6)
+        }
+
+    @staticmethod
+    def _batch_cycles(lineages: Dict[str, dict]) -> set:
+        """
+        Ids of the goals of a batch that end up under themselves once the whole batch is applied.
+        lineages maps each moved goal to its new lineage (ancestors from the stored tree); a chain
+        reaching another moved goal continues along that goal's new ancestors.
+        """
+        cyclic = set()
+        for item_id, lineage in lineages.items():
+            chain, seen = list(lineage["ancestors"]), set()
+            while chain:
+                node = chain.pop() # Nearest ancestor first
+                if node == item_id:
+                    cyclic.add(item_id)
+                    break
+                if node in seen:
+                    break # A cycle that does not contain this goal; found from its own goals
+                seen.add(node)
+                if node in lineages:
+                    chain = list(lineages[node]["ancestors"]) # It moves too: its stored ancestors no longer apply
+        return cyclic
+
+    async def _with_lineage(self, item_id: str, update_data: dict) -> Tuple[dict, str | None]:
+        """
+        Returns (update_data, error_message). The derived fields are never taken from the caller;
+        when the update changes parent_goal or weight, the goal's new lineage is added to it.
+        """
+        update_data = {key: value for key, value in update_data.items() if key not in ("ancestors", "effective_weight")}
+        if "parent_goal" not in update_data and "weight" not in update_data:
+            return update_data, None
+        goal = await super()._get_by_id(item_id)
+        if goal is None:
+            return update_data, f"No goal found with ID: {item_id} to update."
+
+        parent_ref = update_data.get("parent_goal", goal.get("parent_goal"))
+        parent = None
+        if parent_ref:
+            parent = await self._resolve_goal(parent_ref)
+            if parent is None:
+                return update_data, f"Parent goal '{parent_ref}' not found."
+            if str(parent["_id"]) == str(goal["_id"]) or str(goal["_id"]) in parent.get("ancestors", []):
+                return update_data, "A goal cannot be moved under itself or one of its sub-goals."
+        weight = update_data.get("weight", goal.get("weight"))
+        return {**update_data, **self._lineage(parent, weight)}, None
+
+    async def _rebuild_subtree(self, root_id: str, parent_id: str | None, ancestors: List[str], base_weight: float) -> int:
+        """
+        Recomputes ancestors and effective_weight of every descendant of root_id. The root's
+        direct children hang from (parent_id, ancestors, base_weight), so a deleted root passes
+        its own parent's values. Fetches the subtree with one indexed query and writes only the
+        goals that changed with one bulk_write. Returns the number of goals updated.
+        """
+        descendants = await self._collection.find(
+            {"user_id": self._user_id, "ancestors": root_id}, self.HIERARCHY_PROJECTION
+        ).to_list(length=None)
+        children: Dict[str | None, List[dict]] = defaultdict(list)
+        for goal in descendants:
+            children[goal.get("parent_goal")].append(goal)
+
+        ops = []
+        stack = [(child, parent_id, ancestors, base_weight) for child in children[root_id]]
+        while stack:
+            goal, goal_parent, path, base = stack.pop()
+            goal_id = str(goal["_id"])
+            lineage = {
+                "parent_goal": goal_parent,
+                "ancestors": path,
+                "effective_weight": round(base * _weight_factor(goal.get("weight")), 6)
+            }
+            if any(goal.get(key) != value for key, value in lineage.items()):
+                ops.append(UpdateOne({"_id": goal["_id"], "user_id": self._user_id}, {"$set": lineage}))
+            stack.extend((child, goal_id, [*path, goal_id], lineage["effective_weight"]) for child in children[goal_id])
+
+        if ops:
+            await self._collection.bulk_write(ops, ordered=False)
+            await self._invalidate_cache()
+            logger.info(f"Updated the lineage of {len(ops)} sub-goals of goal {root_id}")
+        return len(ops)
+
+    async def list_goals(self, filter_by: dict = None, sort_by: str = None, limit: int = None, cursor: str = None) -> Dict[str, Any]:
         try:
-            goals = await super()._get_all(filter_query=filter_by, sort_by=sort_by)
+            goals, next_cursor = await super()._get_page(
+                filter_query=filter_by, sort_by=sort_by, projection=self.LIST_PROJECTION, limit=limit, cursor=cursor
+            )
             logger.info(f"Retrieved {len(goals)} goals with filter: {filter_by} and sort: {sort_by}")
             return {
                 "status": "success",
-                "message": f"Retrieved {len(goals)} goals.",
-                "data": goals
+                "message": f"Retrieved {len(goals)} goals." + (" More goals are available with 'next_cursor'." if next_cursor else ""),
+                "data": goals,
+                "next_cursor": next_cursor
+            }
+        except ValueError as e:
+            return {
+                "status": "failure",
+                "message": str(e),
+                "data": None
             }
         except Exception as e:
             error_message = "Failed to retrieve goals due to an unexpected internal error."
@@ -0,0 +1,136 @@
+"""
+Declarative MongoDB index management.
+
+Every repository declares the compound indexes its queries need (INDEXES) and the
+query shapes it issues (QUERY_SHAPES). This module ensures those indexes idempotently
+and verifies with explain() that no declared query shape falls back to a COLLSCAN.
+
+Usage:
+    python -m operation_library.index_manager ensure
+    python -m operation_library.index_manager verify
+"""
+import asyncio
+import sys
+from typing import Any, Dict, List
+
+from pymongo import IndexModel
+from pymongo.errors import CollectionInvalid, OperationFailure
+
+# Placeholder user for explain(); it only needs to look like a real user_id
+INDEX_CHECK_USER_ID = "__index_check__"
+
+
+def managed_collections() -> Dict[str, Dict[str, List[Dict[str, Any]]]]:
+    """
+    Collects every declared {collection: {"indexes": [...], "query_shapes": [...]}}.
+    An optional "options" entry holds create_collection() options, e.g. for time series.
+    """
+    from operation_library.task_repository import TaskRepository
+    from operation_library.goal_repository import GoalRepository
+    from operation_library.task_event_repository import TaskEventRepository
+    from operation_library.profile_operations import PROFILE_INDEXES, PROFILE_QUERY_SHAPES
+    from GlobalWorkspace import GlobalWorkspace
+
+    collections = {
+        "tasks": {"indexes": TaskRepository.INDEXES, "query_shapes": TaskRepository.QUERY_SHAPES},
+        "goals": {"indexes": GoalRepository.INDEXES, "query_shapes": GoalRepository.QUERY_SHAPES},
+        "user_profiles": {"indexes": PROFILE_INDEXES, "query_shapes": PROFILE_QUERY_SHAPES},
+        "task_events": {
+            "indexes": TaskEventRepository.INDEXES,
+            "query_shapes": TaskEventRepository.QUERY_SHAPES,
+            "options": TaskEventRepository.TIMESERIES_OPTIONS,
+        },
+        "task_stats": {"indexes": TaskEventRepository.STATS_INDEXES, "query_shapes": TaskEventRepository.STATS_QUERY_SHAPES},
+    }
+    for name, indexes in GlobalWorkspace.INDEXES.items():
+        collections[name] = {"indexes": indexes, "query_shapes": GlobalWorkspace.QUERY_SHAPES.get(name, [])}
+    return collections
+
+
+async def _ensure_collection(db, collection_name: str, options: Dict[str, Any]):
+    """Creates a collection that needs creation options (e.g. a time series) if it does not exist yet."""
+    if collection_name in await db.list_collection_names(filter={"name": collection_name}):
+        return
+    try:
+        await db.create_collection(collection_name, **options)
+    except CollectionInvalid:
+        pass # Created concurrently by another worker
+
+
+async def ensure_indexes(db) -> Dict[str, List[str]]:
+    """
+    Creates every declared index. create_indexes() is a no-op for indexes that already
+    exist with the same keys and options, so this is safe to run on every startup.
+    """
+    created: Dict[str, List[str]] = {}
+    for collection_name, spec in managed_collections().items():
+        if spec.get("options"):
+            await _ensure_collection(db, collection_name, spec["options"])
+        models = [IndexModel(index["keys"], **index.get("options", {})) for index in spec["indexes"]]
+        if not models:
+            continue
+        try:
+            created[collection_name] = await db[collection_name].create_indexes(models)
+        except OperationFailure as e:
+            # Usually an index with the same name but different options already exists
+            print(f"Could not ensure indexes on '{collection_name}': {e}")
+            raise
+    return created
+
+
+def _find_collscans(plan: Any) -> List[Dict[str, Any]]:
+    """Walks an explain() plan tree and returns every COLLSCAN stage."""
+    found = []
+    if isinstance(plan, dict):
+        if plan.get("stage") == "COLLSCAN":
+            found.append(plan)
+        for value in plan.values():
+            found.extend(_find_collscans(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            found.extend(_find_collscans(item))
+    return found
+
+
+async def verify_query_plans(db) -> List[str]:
+    """
+    Runs explain() on every declared query shape and returns a description of each
+    shape whose winning plan contains a COLLSCAN. An empty list means all shapes are indexed.
+    """
+    failures: List[str] = []
+    for collection_name, spec in managed_collections().items():
+        for shape in spec["query_shapes"]:
+            query = {"user_id": INDEX_CHECK_USER_ID, **shape["filter"]}
+            cursor = db[collection_name].find(query, shape.get("projection"))
+            if shape.get("sort"):
+                cursor = cursor.sort(shape["sort"])
+            explain = await cursor.explain()
+            winning_plan = explain.get("queryPlanner", {}).get("winningPlan", {})
+            if _find_collscans(winning_plan):
+                failures.append(f"{collection_name}: filter={query} sort={shape.get('sort')} uses COLLSCAN")
+    return failures
+
+
+async def main(command: str) -> int:
+    from database import db
+
+    if command in ("ensure", "all"):
+        created = await ensure_indexes(db)
+        for collection_name, names in created.items():
+            print(f"Ensured indexes on '{collection_name}': {names}")
+    if command in ("verify", "all"):
+        failures = await verify_query_plans(db)
+        for failure in failures:
+            print(f"❌ {failure}")
+        if failures:
+            return 1
+        print("✅ Every declared query shape is served by an index.")
+    return 0
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "all"
+    if command not in ("ensure", "verify", "all"):
+        print(__doc__)
+        sys.exit(2)
+    sys.exit(asyncio.run(main(command)))
@@ -0,0 +1,197 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List
+
+import numpy as np
+from bson import Binary
+from pymongo import DeleteMany, UpdateOne
+from redis.exceptions import RedisError
+
+import database
+from operation_library.profile_operations import PENDING_COMPACTION_KEY, bump_profile_version, mark_for_compaction
+
+logger = logging.getLogger(__name__)
+
+# --- Compaction settings ---
+SIMILARITY_THRESHOLD = 0.90 # Cosine similarity above which two entries say the same thing
+MAX_NEW_ENTRIES_PER_RUN = 200 # Per user; the rest is picked up by the next run
+INTERVAL_SECONDS = 300
+USERS_PER_RUN = 50
+SEEDED_KEY = "profiles:compaction:seeded" # Set once the pending set was seeded from Mongo
+
+
+def combined_confidence(confidences: List[int]) -> int:
+    """Independent observations of the same fact: 1 - product of (1 - c), as 0-100."""
+    doubt = 1.0
+    for confidence in confidences:
+        doubt *= 1.0 - min(max(confidence, 0), 100) / 100.0
+    return int(round(100 * (1.0 - doubt)))
+
+
+def _unit(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+class ProfileCompactor:
+    """
+    Merges near-duplicate profile entries ("Owner is learning English" inferred ten times).
+
+    Incremental: an entry is embedded once, and the stored embedding (float32 bytes) marks
+    it as compacted. Each run embeds only the entries without one, in a single batch call,
+    and compares them with each other and with the user's already compacted entries of the
+    same scope. Similar entries are clustered around a representative, the entry the cluster
+    keeps (its most confident); it gets the combined confidence and a bumped version, and all
+    updates and deletes are written with one bulk_write. Users are queued by profile writes;
+    profiles written before compaction existed are queued once, on the first run.
+    """
+
+    def __init__(self, collection=None, embed=None):
+        self._collection = collection # Defaults to database.user_profiles_collection, resolved per run
+        self._embed = embed # async (texts) -> vectors; defaults to LLMProvider.embed
+        self._stopping = asyncio.Event()
+        self._runner: asyncio.Task | None = None
+
+    @property
+    def _profiles(self):
+        return self._collection if self._collection is not None else database.user_profiles_collection
+
+    async def _embed_texts(self, texts: List[str]) -> List[List[float]]:
+        if self._embed is None:
+            from llm_provider import LLMProvider
+            self._embed = LLMProvider().embed
+        return await self._embed(texts)
+
+    # --- One user ---
+    async def compact_user(self, user_id: str) -> Dict[str, int]:
+        new_entries = await self._profiles.find(
+            {"user_id": user_id, "embedding": {"$exists": False}}, {"text": 1, "scope": 1, "confidence": 1, "version": 1}
+        ).limit(MAX_NEW_ENTRIES_PER_RUN).to_list(length=MAX_NEW_ENTRIES_PER_RUN)
+        if not new_entries:
+            return {"embedded": 0, "merged": 0, "deleted": 0}
+
+        vectors = await self._embed_texts([entry["text"] for entry in new_entries])
+        for entry, vector in zip(new_entries, vectors):
+            entry["vector"] = np.asarray(vector, dtype=np.float32)
+        new_ids = {entry["_id"] for entry in new_entries}
+        old_entries = await self._profiles.find(
+            {"user_id": user_id, "scope": {"$in": list({entry.get("scope") for entry in new_entries})}, "embedding": {"$exists": True}},
+            {"text": 1, "scope": 1, "confidence": 1, "version": 1, "embedding": 1}
+        ).to_list(length=None)
+        for entry in old_entries:
+            entry["vector"] = np.frombuffer(entry["embedding"], dtype=np.float32)
+
+        operations, merged, deleted = [], 0, 0
+        by_scope: Dict[str, List[dict]] = {}
+        for entry in new_entries + old_entries:
+            by_scope.setdefault(entry.get("scope"), []).append(entry)
+        for entries in by_scope.values():
+            for cluster in self._clusters(entries, new_ids):
+                if len(cluster) == 1:
+                    entry = cluster[0]
+                    if entry["_id"] in new_ids:
+                        operations.append(UpdateOne({"_id": entry["_id"]}, {"$set": {"embedding": Binary(entry["vector"].tobytes())}}))
+                    continue
+                keeper = max(cluster, key=lambda entry: (entry.get("confidence") or 0, entry["_id"] not in new_ids))
+                others = [entry["_id"] for entry in cluster if entry is not keeper]
+                operations.append(UpdateOne({"_id": keeper["_id"]}, {"$set": {
+                    "confidence": combined_confidence([entry.get("confidence") or 0 for entry in cluster]),
+                    "version": max(entry.get("version") or 1 for entry in cluster) + 1,
+                    "updated_at": datetime.now(timezone.utc),
+                    "embedding": Binary(keeper["vector"].tobytes()),
+                }}))
+                operations.append(DeleteMany({"_id": {"$in": others}}))
+                merged += 1
+                deleted += len(others)
+
+        await self._profiles.bulk_write(operations, ordered=True)
+        if merged:
+            await bump_profile_version(user_id)
+        logger.info(f"Compacted the profile of user '{user_id}': {len(new_entries)} new entries, {merged} clusters merged, {deleted} entries deleted")
+        return {"embedded": len(new_entries), "merged": merged, "deleted": deleted}
+
+    @staticmethod
+    def _clusters(entries: List[dict], new_ids: set) -> List[List[dict]]:
+        """
+        Groups of entries, each above the similarity threshold with the group's representative:
+        its first entry, the one compact_user keeps. Entries are taken most confident first and
+        join the first group whose representative they match, so A~B and B~C never pull in an
+        unrelated C. Old-old pairs were compared before and stay apart.
+        """
+        new_rows = [index for index, entry in enumerate(entries) if entry["_id"] in new_ids]
+        if not new_rows or len(entries) == 1:
+            return [[entry] for entry in entries]
+        unit = _unit(np.stack([entry["vector"] for entry in entries]))
+        similar = unit[new_rows] @ unit.T >= SIMILARITY_THRESHOLD # New entries against all
+        row_of = {index: row for row, index in enumerate(new_rows)}
+
+        def same(representative: int, index: int) -> bool:
+            if index in row_of:
+                return bool(similar[row_of[index], representative])
+            return representative in row_of and bool(similar[row_of[representative], index])
+
+        order = sorted(
+            range(len(entries)),
+            key=lambda index: (entries[index].get("confidence") or 0, index not in row_of),
+            reverse=True,
+        )
+        clusters: List[List[int]] = []
+        for index in order:
+            for cluster in clusters:
+                if same(cluster[0], index):
+                    cluster.append(index)
+                    break
+            else:
+                clusters.append([index])
+        return [[entries[index] for index in cluster] for cluster in clusters]
+
+    # --- Background loop ---
+    def start(self):
+        if self._runner is None:
+            self._stopping.clear()
+            self._runner = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._runner is not None:
+            self._stopping.set()
+            await self._runner
+            self._runner = None
+
+    async def _seed(self):
+        """Queues every user with entries not compacted yet, once (one worker wins the marker)."""
+        if not await database.redis_client.set(SEEDED_KEY, 1, nx=True):
+            return
+        try:
+            user_ids = await self._profiles.distinct("user_id", {"embedding": {"$exists": False}})
+            for user_id in user_ids:
+                await mark_for_compaction(user_id)
+            logger.info(f"Queued {len(user_ids)} profiles for compaction")
+        except Exception:
+            await database.redis_client.delete(SEEDED_KEY) # Retried on the next run
+            raise
+
+    async def run(self):
+        """Every INTERVAL_SECONDS, compacts the profiles of users who added entries since their last run."""
+        while not self._stopping.is_set():
+            try:
+                await self._seed()
+            except Exception as e:
+                logger.warning(f"Could not queue existing profiles for compaction: {e}")
+            try:
+                user_ids = await database.redis_client.spop(PENDING_COMPACTION_KEY, USERS_PER_RUN) or []
+                for user_id in user_ids:
+                    try:
+                        result = await self.compact_user(user_id)
+                    except Exception as e:
+                        logger.error(f"Profile compaction failed for user '{user_id}': {e}", exc_info=True)
+                        await mark_for_compaction(user_id) # Retry on the next run
+                        continue
+                    if result["embedded"] == MAX_NEW_ENTRIES_PER_RUN:
+                        await mark_for_compaction(user_id) # More entries left
+            except RedisError as e:
+                logger.warning(f"Could not read the profile compaction queue: {e}")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
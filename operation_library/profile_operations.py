@@ -1,32 +1,122 @@
 from bson import ObjectId
-from database import user_profiles_collection
+import database
 from typing import Dict, Any, List
+from redis.exceptions import RedisError
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# --- Declared indexes (ensured by operation_library.index_manager) ---
+PROFILE_INDEXES: List[Dict[str, Any]] = [
+    {"keys": [("user_id", 1), ("scope", 1), ("confidence", -1)]},
+]
+# Profile reads are scoped by user_id, which the verifier adds to every shape
+PROFILE_QUERY_SHAPES: List[Dict[str, Any]] = [
+    {"filter": {}},
+    {"filter": {"scope": "__index_check__"}, "sort": [("confidence", -1)]},
+]
+
+# --- Rendered profile (the block that goes into the prompt) ---
+PROFILE_TOP_N_PER_SCOPE = 10
+PROFILE_TOKEN_CAP = 800
+PROFILE_TEXT_TTL_SECONDS = 24 * 3600
+# Users with entries added or edited since their last compaction (see profile_compaction)
+PENDING_COMPACTION_KEY = "profiles:compaction:pending"
+_RENDER_PROJECTION = {"_id": 0, "text": 1, "scope": 1, "confidence": 1}
+
+def _version_key(user_id: str) -> str:
+    return f"user:{user_id}:profile:version"
+
+async def bump_profile_version(user_id: str):
+    """Every write bumps the version, so the next read renders the profile again."""
+    try:
+        await database.redis_client.incr(_version_key(user_id))
+    except RedisError as e:
+        logger.warning(f"Could not bump the profile version of user '{user_id}'; the cached profile may be stale for up to {PROFILE_TEXT_TTL_SECONDS}s: {e}")
+
+async def mark_for_compaction(user_id: str):
+    try:
+        await database.redis_client.sadd(PENDING_COMPACTION_KEY, user_id)
+    except RedisError as e:
+        logger.warning(f"Could not queue the profile of user '{user_id}' for compaction: {e}")
+
+def _estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token)."""
+    return len(text) // 4 + 1
 
 # --- Create ---
 async def add_profile_entry(entry_data: dict) -> str:
     if "user_id" not in entry_data or "text" not in entry_data:
         raise ValueError("'user_id' and 'text' are required.")
     
-    result = await user_profiles_collection.insert_one(entry_data)
+    result = await database.user_profiles_collection.insert_one(entry_data)
+    await bump_profile_version(entry_data["user_id"])
+    await mark_for_compaction(entry_data["user_id"])
     print(f"Profile entry created with ID: {result.inserted_id}")
     return str(result.inserted_id)
 
 # --- Read ---
 async def get_all_profile_entries_for_user(user_id: str) -> List[dict]:
-    cursor = user_profiles_collection.find({"user_id": user_id})
+    cursor = database.user_profiles_collection.find({"user_id": user_id}, {"embedding": 0})
     return await cursor.to_list(length=None) 
 
 async def get_user_profile_as_text(user_id: str) -> str:
     """
-    Get all profile entries for a user and consolidate them into a text block.
-    This is for preparing context for LLM.
+    The user's profile as a text block for the LLM context. The rendered block is cached in
+    Redis under the user's profile version, so it is only rebuilt after a profile write:
+
+        user:{user_id}:profile:version     -> integer, bumped by add/update/delete
+        user:{user_id}:profile:text:v{n}   -> the rendered block
+    """
+    try:
+        version = await database.redis_client.get(_version_key(user_id)) or "0"
+        text_key = f"user:{user_id}:profile:text:v{version}"
+        cached = await database.redis_client.get(text_key)
+    except RedisError as e:
+        logger.warning(f"Profile cache unavailable, rendering from Mongo: {e}")
+        return await render_user_profile(user_id)
+    if cached is not None:
+        return cached
+
+    profile_text = await render_user_profile(user_id)
+    try:
+        # Written under the version read before rendering: if a write raced the render,
+        # the version has moved on and this entry is simply never read
+        await database.redis_client.set(text_key, profile_text, ex=PROFILE_TEXT_TTL_SECONDS)
+    except RedisError as e:
+        logger.warning(f"Could not cache the profile of user '{user_id}': {e}")
+    return profile_text
+
+async def render_user_profile(user_id: str, top_n: int = PROFILE_TOP_N_PER_SCOPE, token_cap: int = PROFILE_TOKEN_CAP) -> str:
+    """
+    Renders at most top_n entries per scope, highest confidence first, within token_cap.
+    Each scope is read with its own indexed, limited query, and entries are admitted rank
+    by rank across scopes, so a large scope cannot crowd the others out of the cap.
     """
-    entries = await get_all_profile_entries_for_user(user_id)
+    scopes = await database.user_profiles_collection.distinct("scope", {"user_id": user_id})
+    queries = [
+        database.user_profiles_collection.find({"user_id": user_id, "scope": scope}, _RENDER_PROJECTION)
+        .sort("confidence", -1).limit(top_n).to_list(length=top_n)
+        for scope in scopes + [None] # None also matches entries without a scope
+    ]
+    per_scope = await asyncio.gather(*queries)
+
+    selected, tokens = [], 0
+    for rank in range(top_n):
+        for entries in per_scope:
+            if rank >= len(entries):
+                continue
+            entry = entries[rank]
+            line = f"- {entry['text']} (source: {entry.get('scope') or 'unknown'})"
+            cost = _estimate_tokens(line)
+            if tokens + cost > token_cap:
+                continue
+            selected.append((entry, line))
+            tokens += cost
     # sort by scope and confidence, higher confidence first
-    entries.sort(key=lambda x: (x.get("scope", ""), x.get("confidence", 0)), reverse=True)
-    
-    profile_text = "\n".join([f"- {entry['text']} (source: {entry.get('scope', 'unknown')})" for entry in entries])
-    return profile_text
+    selected.sort(key=lambda item: (item[0].get("scope") or "", item[0].get("confidence") or 0), reverse=True)
+    return "\n".join(line for _, line in selected)
 
 # --- Update ---
 async def update_profile_entry(entry_id: str, update_data: Dict[str, Any]) -> int:
@@ -37,11 +127,21 @@ async def update_profile_entry(entry_id: str, update_data: Dict[str, Any]) -> in
         
         if not update_data: return 0
 
-        result = await user_profiles_collection.update_one(
+        update = {"$set": update_data}
+        if "text" in update_data:
+            update["$unset"] = {"embedding": ""} # New text: compact the entry again
+        # Returns the matched entry, whose user_id tells which profile version to bump
+        entry = await database.user_profiles_collection.find_one_and_update(
             {"_id": obj_id},
-            {"$set": update_data}
+            update,
+            projection={"user_id": 1}
         )
-        return result.modified_count
+        if entry is None:
+            return 0
+        await bump_profile_version(entry["user_id"])
+        if "text" in update_data:
+            await mark_for_compaction(entry["user_id"])
+        return 1
     except Exception:
         return 0
 
@@ -49,7 +149,10 @@ async def update_profile_entry(entry_id: str, update_data: Dict[str, Any]) -> in
 async def delete_profile_entry(entry_id: str) -> int:
     try:
         obj_id = ObjectId(entry_id)
-        result = await user_profiles_collection.delete_one({"_id": obj_id})
-        return result.deleted_count
+        entry = await database.user_profiles_collection.find_one_and_delete({"_id": obj_id}, projection={"user_id": 1})
+        if entry is None:
+            return 0
+        await bump_profile_version(entry["user_id"])
+        return 1
     except Exception:
         return 0
\ No newline at end of file
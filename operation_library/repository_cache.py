@@ -0,0 +1,135 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List
+
+from bson import json_util
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+
+class CacheMetrics:
+    """Process-wide hit/miss counters per cache namespace (e.g. 'tasks', 'goals')."""
+
+    def __init__(self):
+        self._counts: Dict[str, Dict[str, int]] = {}
+
+    def record(self, namespace: str, event: str):
+        counts = self._counts.setdefault(namespace, {"hit": 0, "miss": 0, "load": 0, "bypass": 0, "error": 0})
+        counts[event] += 1
+
+    def hit_rate(self, namespace: str) -> float:
+        counts = self._counts.get(namespace, {})
+        lookups = counts.get("hit", 0) + counts.get("miss", 0)
+        return counts.get("hit", 0) / lookups if lookups else 0.0
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {namespace: {**counts, "hit_rate": self.hit_rate(namespace)} for namespace, counts in self._counts.items()}
+
+CACHE_METRICS = CacheMetrics()
+
+# Loads in flight in this process, keyed by snapshot key (in-process stampede protection)
+_INFLIGHT: Dict[str, asyncio.Future] = {}
+
+
+class RepositoryCache:
+    """
+    Read-through cache of one user's documents in one collection. The whole set is kept
+    as a single compact snapshot in Redis under a versioned key:
+
+        user:{user_id}:{namespace}:version          -> integer, bumped by every write
+        user:{user_id}:{namespace}:snapshot:v{n}    -> all of the user's documents
+
+    Bumping the version with INCR is atomic, so a write invalidates the snapshot in one
+    step and a slow reader can never re-publish stale data under the new version.
+    Old snapshots simply expire.
+    """
+    SNAPSHOT_TTL_SECONDS = 600
+    MAX_SNAPSHOT_ITEMS = 500 # Larger sets are not cached; reads go straight to Mongo
+    LOCK_TTL_MS = 5000
+    LOCK_WAIT_SECONDS = 0.5
+    LOCK_POLL_SECONDS = 0.025
+    _OVERSIZED = "__oversized__"
+
+    def __init__(self, redis, namespace: str, user_id: str):
+        self._redis = redis
+        self.namespace = namespace
+        self._prefix = f"user:{user_id}:{namespace}"
+        self._version_key = f"{self._prefix}:version"
+
+    async def get_items(self, loader: Callable[[int], Awaitable[List[dict]]]) -> List[dict] | None:
+        """
+        Returns the user's cached documents, loading them with loader(max_items) on a miss.
+        Returns None when the caller should query Mongo directly (set too large, Redis down,
+        or another worker is still loading the snapshot).
+        """
+        try:
+            version = await self._redis.get(self._version_key) or "0"
+            snapshot_key = f"{self._prefix}:snapshot:v{version}"
+            raw = await self._redis.get(snapshot_key)
+            if raw is not None:
+                if raw == self._OVERSIZED:
+                    CACHE_METRICS.record(self.namespace, "bypass")
+                    return None
+                CACHE_METRICS.record(self.namespace, "hit")
+                return json_util.loads(raw)
+
+            CACHE_METRICS.record(self.namespace, "miss")
+            inflight = _INFLIGHT.get(snapshot_key)
+            if inflight is not None:
+                return await asyncio.shield(inflight)
+
+            future = asyncio.get_running_loop().create_future()
+            _INFLIGHT[snapshot_key] = future
+            items = None
+            try:
+                items = await self._load(snapshot_key, loader)
+            finally:
+                _INFLIGHT.pop(snapshot_key, None)
+                future.set_result(items)
+            return items
+        except RedisError as e:
+            CACHE_METRICS.record(self.namespace, "error")
+            logger.warning(f"Cache unavailable for '{self._prefix}', reading from Mongo: {e}")
+            return None
+
+    async def _load(self, snapshot_key: str, loader: Callable[[int], Awaitable[List[dict]]]) -> List[dict] | None:
+        # Cross-process stampede protection: only the lock holder loads from Mongo
+        lock_key = f"{snapshot_key}:lock"
+        if not await self._redis.set(lock_key, "1", nx=True, px=self.LOCK_TTL_MS):
+            for _ in range(int(self.LOCK_WAIT_SECONDS / self.LOCK_POLL_SECONDS)):
+                await asyncio.sleep(self.LOCK_POLL_SECONDS)
+                raw = await self._redis.get(snapshot_key)
+                if raw is not None:
+                    return None if raw == self._OVERSIZED else json_util.loads(raw)
+            return None
+
+        try:
+            CACHE_METRICS.record(self.namespace, "load")
+            items = await loader(self.MAX_SNAPSHOT_ITEMS + 1)
+            if len(items) > self.MAX_SNAPSHOT_ITEMS:
+                await self._redis.set(snapshot_key, self._OVERSIZED, ex=self.SNAPSHOT_TTL_SECONDS)
+                return None
+            await self._redis.set(snapshot_key, json_util.dumps(items, separators=(",", ":")), ex=self.SNAPSHOT_TTL_SECONDS)
+            return items
+        finally:
+            await self._redis.delete(lock_key)
+
+    async def version(self) -> int | None:
+        """The current data version (bumped by every write), or None if Redis is unavailable."""
+        try:
+            return int(await self._redis.get(self._version_key) or 0)
+        except RedisError as e:
+            CACHE_METRICS.record(self.namespace, "error")
+            logger.warning(f"Cache version unavailable for '{self._prefix}': {e}")
+            return None
+
+    async def invalidate(self) -> int | None:
+        """Atomically retires the current snapshot. Call after every write. Returns the new version."""
+        try:
+            return await self._redis.incr(self._version_key)
+        except RedisError as e:
+            # Without a version bump readers could see stale data until the TTL expires
+            CACHE_METRICS.record(self.namespace, "error")
+            logger.error(f"Failed to invalidate cache '{self._prefix}': {e}")
+            return None
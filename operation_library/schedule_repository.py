@@ -0,0 +1,202 @@
+from operation_library.task_repository import TaskRepository
+from operation_library.user_operations import get_user_timezone
+import database
+from models.serialization import to_json
+from scheduler import DAY_END, DEFAULT_DURATION_MINUTES, Candidate, candidate_from_task, from_output, is_due, pack, to_output
+from datetime import date, datetime, time, timedelta, timezone
+from typing import List, Dict, Any
+from zoneinfo import ZoneInfo
+from redis.exceptions import RedisError
+import json
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+_DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+class ScheduleRepository:
+    """
+    Provides the 'schedule' tool. Days are planned locally by scheduler.pack, not by the LLM,
+    and each plan is cached in Redis per user and day:
+
+        user:{user_id}:schedule:{YYYY-MM-DD}  -> plan + a signature of every task it placed
+
+    When tasks change, only their blocks are removed and re-placed (together with tasks that
+    did not fit before); the rest of the day stays where it was.
+    """
+    CACHE_TTL_SECONDS = 36 * 3600
+    MAX_RANGE_DAYS = 14
+
+    def __init__(self, user_id: str):
+        self._user_id = user_id
+        self._tasks = TaskRepository(user_id)
+        self._redis = database.redis_client
+
+    @staticmethod
+    def get_tool_definitions():
+        """Returns a list of tool definitions this repository provides."""
+        return [
+            {
+                "type": "function",
+                "function": {
+                    "name": "schedule",
+                    "description": "Generate the user's schedule: active tasks placed by priority into free time around fixed-time tasks, respecting each task's duration, frequency and energy hints. Returns time blocks and the tasks that did not fit.",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "mode": {
+                                "type": "string",
+                                "enum": ["today", "range", "auto"],
+                                "description": "'today': the rest of today; 'range': every day in time_range; 'auto': today, or tomorrow if today is nearly over."
+                            },
+                            "time_range": {
+                                "type": "string",
+                                "description": "Required for 'range' mode: 'YYYY-MM-DD/YYYY-MM-DD' (inclusive, at most 14 days) or a single 'YYYY-MM-DD'."
+                            }
+                        },
+                        "required": ["mode"]
+                    }
+                },
+                "internal_method_name": "schedule"
+            }
+        ]
+
+    async def schedule(self, mode: str = "today", time_range: str = None) -> Dict[str, Any]:
+        logger.info(f"Scheduling for user '{self._user_id}' with mode '{mode}' and range '{time_range}'")
+        try:
+            tz = ZoneInfo(await get_user_timezone(self._user_id))
+            now = datetime.now(tz)
+            days, error_message = self._resolve_days(mode, time_range, now)
+            if error_message:
+                return {
+                    "status": "failure",
+                    "message": error_message,
+                    "data": None
+                }
+
+            tasks = await self._tasks.list_schedulable_tasks()
+            table = await self._tasks.priority_table()
+            # Highest priority first; the sort is stable, so ties keep a deterministic order
+            tasks.sort(key=lambda task: -table.score_of(str(task["_id"])))
+            last_done = await self._last_done_times(tz)
+
+            plans = []
+            for day in days:
+                due = [task for task in tasks if is_due(task, day, last_done.get(str(task["_id"])), tz)]
+                plan = await self._plan_day(day, tz, due, now if day == now.date() else None)
+                # Later days of a range treat what is planned today as done
+                for item in plan["schedule"]:
+                    last_done[item["task_id"]] = datetime.combine(day, time(), tz)
+                plans.append(plan)
+
+            planned = sum(len(plan["schedule"]) for plan in plans)
+            return {
+                "status": "success",
+                "message": f"Planned {planned} blocks over {len(plans)} day(s).",
+                "data": plans[0] if len(plans) == 1 else plans
+            }
+        except Exception as e:
+            error_message = "Scheduling failed due to an unexpected internal error."
+            logger.error(f"{error_message} Exception: {e}", exc_info=True)
+            return {
+                "status": "failure",
+                "message": error_message,
+                "data": None,
+                "error_details": {
+                    "type": "InternalServerError",
+                    "summary": "An unexpected error occurred on the server side while scheduling.",
+                    "error_info": f"{type(e).__name__}: {str(e)}",
+                    "original_input": {"mode": mode, "time_range": time_range}
+                }
+            }
+
+    def _resolve_days(self, mode: str, time_range: str | None, now: datetime) -> tuple[List[date], str | None]:
+        if mode == "today":
+            return [now.date()], None
+        if mode == "auto":
+            day_end = datetime.combine(now.date(), DAY_END, now.tzinfo)
+            nearly_over = now + timedelta(minutes=DEFAULT_DURATION_MINUTES) > day_end
+            return [now.date() + timedelta(days=1) if nearly_over else now.date()], None
+        if mode != "range":
+            return [], f"Unknown mode '{mode}'. Use 'today', 'range' or 'auto'."
+
+        try:
+            dates = [date.fromisoformat(text) for text in _DATE_PATTERN.findall(time_range or "")]
+        except ValueError:
+            dates = []
+        if not dates or len(dates) > 2:
+            return [], "For 'range' mode, time_range must be 'YYYY-MM-DD/YYYY-MM-DD' or a single 'YYYY-MM-DD'."
+        first, last = dates[0], dates[-1]
+        if last < first:
+            return [], "The time_range ends before it starts."
+        if (last - first).days >= self.MAX_RANGE_DAYS:
+            return [], f"The time_range can span at most {self.MAX_RANGE_DAYS} days."
+        return [first + timedelta(days=offset) for offset in range((last - first).days + 1)], None
+
+    async def _last_done_times(self, tz: ZoneInfo) -> Dict[str, datetime]:
+        """When each task was last finished (from the task stats), in the user's timezone."""
+        last_done = {}
+        async for stats in database.task_stats_collection.find(
+            {"user_id": self._user_id, "last_done_at": {"$ne": None}}, {"task_id": 1, "last_done_at": 1}
+        ):
+            done_at = stats["last_done_at"]
+            if done_at.tzinfo is None:
+                done_at = done_at.replace(tzinfo=timezone.utc) # Mongo returns naive UTC datetimes
+            last_done[stats["task_id"]] = done_at.astimezone(tz)
+        return last_done
+
+    # --- Per-day plans with incremental repair ---
+    async def _plan_day(self, day: date, tz: ZoneInfo, due: List[dict], not_before: datetime | None) -> Dict[str, Any]:
+        candidates = [candidate_from_task(task, day, tz) for task in due]
+        signatures = {candidate.task_id: self._signature(task, candidate) for task, candidate in zip(due, candidates)}
+        fixed_ids = {candidate.task_id for candidate in candidates if candidate.fixed_start is not None}
+        cache_key = f"user:{self._user_id}:schedule:{day.isoformat()}"
+        cached = await self._load(cache_key)
+
+        if cached is not None:
+            old_signatures = cached["signatures"]
+            changed = {task_id for task_id, signature in signatures.items() if old_signatures.get(task_id) != signature}
+            removed = set(old_signatures) - set(signatures)
+            if not changed and not removed:
+                return cached["plan"]
+            # Moving a fixed event can displace other blocks, so that needs a full re-plan
+            if not (changed | removed) & (fixed_ids | set(cached["fixed_ids"])):
+                touched = changed | removed
+                retry = touched | {item["task_id"] for item in cached["plan"]["unscheduled"]}
+                kept = [block for block in from_output(cached["plan"]) if block.task_id not in touched]
+                blocks, unscheduled = pack(
+                    day, tz, [candidate for candidate in candidates if candidate.task_id in retry], not_before, kept
+                )
+                logger.info(f"Repaired the schedule of {day} for {len(touched)} changed tasks")
+                return await self._store(cache_key, day, blocks, unscheduled, signatures, fixed_ids)
+
+        blocks, unscheduled = pack(day, tz, candidates, not_before)
+        return await self._store(cache_key, day, blocks, unscheduled, signatures, fixed_ids)
+
+    @staticmethod
+    def _signature(task: dict, candidate: Candidate) -> str:
+        """Everything about a task that affects where it is placed on this day."""
+        fixed_start = candidate.fixed_start.isoformat() if candidate.fixed_start else None
+        return to_json([task.get("name"), task.get("scheduling"), fixed_start])
+
+    async def _load(self, cache_key: str) -> Dict[str, Any] | None:
+        try:
+            raw = await self._redis.get(cache_key)
+            return json.loads(raw) if raw else None
+        except RedisError as e:
+            logger.warning(f"Schedule cache unavailable, planning from scratch: {e}")
+            return None
+
+    async def _store(self, cache_key: str, day: date, blocks, unscheduled, signatures: Dict[str, str], fixed_ids: set) -> Dict[str, Any]:
+        plan = to_output(day, blocks, unscheduled)
+        try:
+            await self._redis.set(
+                cache_key,
+                to_json({"plan": plan, "signatures": signatures, "fixed_ids": sorted(fixed_ids)}),
+                ex=self.CACHE_TTL_SECONDS
+            )
+        except RedisError as e:
+            logger.warning(f"Could not cache the schedule '{cache_key}': {e}")
+        return plan
@@ -0,0 +1,238 @@
+from operation_library.base_repository import BaseRepository
+import database
+from datetime import datetime, timezone
+from typing import List, Dict, Any
+from bson import ObjectId
+from pymongo import UpdateOne
+from priority_engine import PRIORITY_ENGINE
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Actions of the task history (see Data/Task_Recorder)
+TASK_ACTIONS = ("created", "deleted", "recovered", "finished", "unfinished", "delay")
+SUCCESS_ACTIONS = ("finished",)
+# A failure ends the current streak
+FAILURE_ACTIONS = ("unfinished", "delay")
+
+
+def _stats_update(user_id: str, task_id: str, action: str, time: datetime) -> List[Dict[str, Any]]:
+    """
+    Pipeline update that folds one event into a task's stats document. A pipeline lets the
+    new streak and best streak be computed from the stored values in a single atomic write.
+    """
+    current = {"$ifNull": ["$current_streak", 0]}
+    if action in SUCCESS_ACTIONS:
+        streak = {"$add": [current, 1]}
+    elif action in FAILURE_ACTIONS:
+        streak = 0
+    else:
+        streak = current
+    increment = lambda field, by: {"$add": [{"$ifNull": [f"${field}", 0]}, by]}
+    return [{"$set": {
+        "user_id": user_id,
+        "task_id": task_id,
+        f"counts.{action}": increment(f"counts.{action}", 1),
+        "success_count": increment("success_count", int(action in SUCCESS_ACTIONS)),
+        "failure_count": increment("failure_count", int(action in FAILURE_ACTIONS)),
+        "current_streak": streak,
+        "best_streak": {"$max": [{"$ifNull": ["$best_streak", 0]}, streak]},
+        # $min/$max ignore nulls, so the first event simply sets these
+        "first_event_at": {"$min": ["$first_event_at", time]},
+        "last_event_at": {"$max": ["$last_event_at", time]},
+        "last_done_at": {"$max": ["$last_done_at", time]} if action in SUCCESS_ACTIONS else "$last_done_at",
+    }}]
+
+
+def success_rate(stats: Dict[str, Any]) -> float | None:
+    """Share of finished attempts (0-1), or None before the first success or failure."""
+    attempts = stats.get("success_count", 0) + stats.get("failure_count", 0)
+    return stats.get("success_count", 0) / attempts if attempts else None
+
+
+class TaskEventRepository(BaseRepository):
+    """
+    Append-only history of task events in a time-series collection, plus one 'task_stats'
+    document per task that every recorded event updates incrementally. Stats queries read
+    that document instead of aggregating the history.
+    """
+    # The time-series collection is created by operation_library.index_manager
+    TIMESERIES_OPTIONS = {"timeseries": {"timeField": "time", "metaField": "user_id", "granularity": "hours"}}
+    INDEXES: List[Dict[str, Any]] = [
+        {"keys": [("user_id", 1), ("task_id", 1), ("time", -1)]},
+    ]
+    QUERY_SHAPES: List[Dict[str, Any]] = [
+        {"filter": {"task_id": "000000000000000000000000"}, "sort": [("time", -1)]},
+    ]
+    STATS_INDEXES: List[Dict[str, Any]] = [
+        {"keys": [("user_id", 1), ("task_id", 1)], "options": {"unique": True}},
+    ]
+    STATS_QUERY_SHAPES: List[Dict[str, Any]] = [
+        {"filter": {"task_id": "000000000000000000000000"}},
+    ]
+    STATS_PROJECTION = {"_id": 0, "user_id": 0}
+
+    def __init__(self, user_id: str):
+        # Events are never updated, so there is nothing to cache
+        super().__init__(collection=database.task_events_collection, user_id=user_id)
+        self._stats_collection = database.task_stats_collection
+
+    @staticmethod
+    def get_tool_definitions():
+        """Returns a list of tool definitions this repository provides."""
+        return [
+            {
+                "type": "function",
+                "function": {
+                    "name": "record_task_event",
+                    "description": "Record what happened with a task, e.g. the user finished it today, only did part of it, or postponed it. Keeps the task's completion stats and streak up to date.",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "task_id": {"type": "string", "description": "The unique identifier of the task."},
+                            "action": {"type": "string", "enum": ["finished", "unfinished", "delay", "recovered"], "description": "'finished': done; 'unfinished': only partly done; 'delay': postponed; 'recovered': a deleted task was brought back."},
+                            "note": {"type": "string", "description": "Optional. Details, e.g. 'Finished Unit 2.' or why it was postponed."},
+                            "time": {"type": "string", "description": "Optional. ISO 8601 time of the event, if not now."}
+                        },
+                        "required": ["task_id", "action"]
+                    }
+                },
+                "internal_method_name": "record_task_event"
+            },
+            {
+                "type": "function",
+                "function": {
+                    "name": "get_task_stats",
+                    "description": "Get how the user is doing with a task: finished and failed counts, success rate, current and best streak, and when it was last done. Without task_id, returns the stats of every task.",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "task_id": {"type": "string", "description": "Optional. The unique identifier of the task."}
+                        },
+                        "required": []
+                    }
+                },
+                "internal_method_name": "get_task_stats"
+            }
+        ]
+
+    async def record_events(self, events: List[Dict[str, Any]]) -> int:
+        """
+        Appends events ({"task_id", "action", optional "note" and "time"}) with one insert_many
+        and folds them into the stats with one ordered bulk_write. Returns the number recorded.
+        """
+        if not events:
+            return 0
+        # The time field of a time-series collection must be a BSON date, not a string
+        now = datetime.now(timezone.utc)
+        docs = [
+            {
+                "user_id": self._user_id,
+                "task_id": str(event["task_id"]),
+                "action": event["action"],
+                "time": event.get("time") or now,
+                **({"note": event["note"]} if event.get("note") else {})
+            }
+            for event in events
+        ]
+        docs.sort(key=lambda doc: doc["time"])
+        await self._collection.insert_many(docs, ordered=False)
+        # Ordered, so several events of one task are applied in time order
+        await self._stats_collection.bulk_write([
+            UpdateOne(
+                {"user_id": self._user_id, "task_id": doc["task_id"]},
+                _stats_update(self._user_id, doc["task_id"], doc["action"], doc["time"]),
+                upsert=True
+            )
+            for doc in docs
+        ], ordered=True)
+        await self._sync_priorities({doc["task_id"] for doc in docs if doc["action"] in SUCCESS_ACTIONS + FAILURE_ACTIONS})
+        return len(docs)
+
+    async def _sync_priorities(self, task_ids: set):
+        """Feeds new success rates into this process's cached priority table, if it has one."""
+        if not task_ids or not PRIORITY_ENGINE.is_cached(self._user_id):
+            return
+        rates = {}
+        async for stats in self._stats_collection.find({"user_id": self._user_id, "task_id": {"$in": list(task_ids)}}):
+            rate = success_rate(stats)
+            if rate is not None:
+                rates[stats["task_id"]] = rate
+        PRIORITY_ENGINE.apply_success_rates(self._user_id, rates)
+
+    async def record_task_event(self, task_id: str, action: str, note: str = None, time: str = None) -> Dict[str, Any]:
+        logger.info(f"Recording '{action}' for task {task_id} of user '{self._user_id}'")
+        original_input = {"task_id": task_id, "action": action, "note": note, "time": time}
+        if action not in TASK_ACTIONS:
+            return {
+                "status": "failure",
+                "message": f"Unknown action '{action}'. Use one of {list(TASK_ACTIONS)}.",
+                "data": None
+            }
+        try:
+            event_time = datetime.fromisoformat(time) if time else None
+            if event_time and event_time.tzinfo is None:
+                event_time = event_time.replace(tzinfo=timezone.utc)
+        except ValueError:
+            return {
+                "status": "failure",
+                "message": f"Invalid time '{time}'. Use ISO 8601, e.g. '2025-08-11T12:00:00'.",
+                "data": None
+            }
+        try:
+            task = await database.tasks_collection.find_one({"_id": ObjectId(task_id), "user_id": self._user_id}, {"_id": 1}) if ObjectId.is_valid(task_id) else None
+            if task is None:
+                return {
+                    "status": "failure",
+                    "message": f"No task found with ID: {task_id}",
+                    "data": None
+                }
+            await self.record_events([{"task_id": task_id, "action": action, "note": note, "time": event_time}])
+            stats = await self._stats_collection.find_one({"user_id": self._user_id, "task_id": task_id}, self.STATS_PROJECTION)
+            return {
+                "status": "success",
+                "message": f"Recorded '{action}' for task {task_id}.",
+                "data": self._with_rates(stats)
+            }
+        except Exception as e:
+            error_message = "Recording the task event failed due to an unexpected internal error."
+            logger.error(f"{error_message} Exception: {e}", exc_info=True)
+            return {
+                "status": "failure",
+                "message": error_message,
+                "data": None,
+                "error_details": {
+                    "type": "InternalServerError",
+                    "summary": "An unexpected error occurred on the server side. This is likely not a problem with the input data.",
+                    "error_info": f"{type(e).__name__}: {str(e)}",
+                    "original_input": original_input
+                }
+            }
+
+    async def get_task_stats(self, task_id: str = None) -> Dict[str, Any]:
+        if task_id:
+            stats = await self._stats_collection.find_one({"user_id": self._user_id, "task_id": task_id}, self.STATS_PROJECTION)
+            if stats is None:
+                return {
+                    "status": "success",
+                    "message": f"No events recorded yet for task {task_id}.",
+                    "data": None
+                }
+            return {
+                "status": "success",
+                "message": f"Successfully retrieved stats for task {task_id}",
+                "data": self._with_rates(stats)
+            }
+        all_stats = await self._stats_collection.find({"user_id": self._user_id}, self.STATS_PROJECTION).to_list(length=None)
+        return {
+            "status": "success",
+            "message": f"Retrieved stats for {len(all_stats)} tasks.",
+            "data": [self._with_rates(stats) for stats in all_stats]
+        }
+
+    @staticmethod
+    def _with_rates(stats: Dict[str, Any] | None) -> Dict[str, Any] | None:
+        if stats is None:
+            return None
+        rate = success_rate(stats)
+        return {**stats, "success_rate": round(rate, 3) if rate is not None else None}
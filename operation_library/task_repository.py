@@ -1,20 +1,84 @@
 from operation_library.base_repository import BaseRepository
-from database import tasks_collection
-from datetime import datetime
+import database
+from operation_library.repository_cache import RepositoryCache
+from operation_library.due_queue import DueQueue
+from operation_library.task_event_repository import TaskEventRepository, success_rate
+from operation_library.user_operations import get_user_timezone
+from priority_engine import PRIORITY_ENGINE, FACTORS, PriorityTable
+from bson import ObjectId
+import asyncio
+from datetime import date, datetime, time, timedelta, timezone
+from itertools import islice
 from typing import List, Dict, Any
+from zoneinfo import ZoneInfo
 from models import main_models
-from models.main_models import TaskModel
+from models.main_models import TaskModel, partial_model, trusted_dump
 from pydantic import ValidationError
+from redis.exceptions import RedisError
+from schedule_parser import iter_occurrences, next_occurrence, parse_schedule
 from system_tools import get_current_time
 import logging
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Tool argument schemas shared by create_task and create_tasks
+TARGET_GOALS_SCHEMA = {"type": "array", "items": {"type": "string"}, "description": "Optional. IDs of the goals this task serves."}
+VALUE_FACTORS_SCHEMA = {
+    "type": "object",
+    "description": "Optional. Estimates (0-100) that drive the task's dynamic priority. Omit the ones you cannot judge.",
+    "properties": {name: {"type": "integer", "minimum": 0, "maximum": 100} for name in FACTORS}
+}
+SCHEDULING_SCHEMA = {
+    "type": "object",
+    "description": "Optional. Hints for the day scheduler.",
+    "properties": {
+        "duration_minutes": {"type": "integer", "minimum": 5, "maximum": 720, "description": "How long one session takes (default 30)."},
+        "frequency": {"type": "string", "enum": ["daily", "weekly", "monthly"], "description": "How often the task repeats."},
+        "times": {"type": "integer", "minimum": 1, "maximum": 10, "description": "Sessions per frequency period, e.g. 3 with 'weekly'."},
+        "energy": {"type": "string", "enum": ["high", "medium", "low"], "description": "Energy the task needs: high goes in the morning, low in the evening."},
+        "fixed_time": {"type": "string", "description": "'HH:MM' if the task happens at a fixed time of day."}
+    }
+}
+
+DUE_PERIODS = ("today", "tomorrow", "this_week", "next_7_days")
+MAX_OCCURRENCES_PER_TASK = 31 # Caps how often one recurring task is listed in a due range
+
+
+def _as_utc(moment: datetime) -> datetime:
+    """Mongo returns naive UTC datetimes."""
+    return moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment
+
+
 class TaskRepository(BaseRepository):
+    INDEXES = BaseRepository.INDEXES + [
+        # "What's due" is one range scan over the parsed next occurrence
+        {"keys": [("user_id", 1), ("status", 1), ("next_occurrence", 1)]},
+    ]
+    QUERY_SHAPES = BaseRepository.QUERY_SHAPES + [
+        {"filter": {"status": "active", "next_occurrence": {"$lt": datetime(2000, 1, 1)}}, "sort": [("next_occurrence", 1)]},
+    ]
+    # Fields returned by list_tasks; full documents are available through get_task_by_id
+    LIST_PROJECTION = {"name": 1, "description": 1, "schedule": 1, "next_occurrence": 1, "status": 1, "created_at": 1}
+    # Fields the priority engine scores
+    PRIORITY_PROJECTION = {"name": 1, "status": 1, "target_goal_ids": 1, "value_factors": 1}
+    # Fields the day scheduler places
+    SCHEDULING_PROJECTION = {"name": 1, "status": 1, "scheduling": 1, "next_occurrence": 1, "recurrence": 1}
+    # Fields returned by get_due_tasks
+    DUE_PROJECTION = {"name": 1, "schedule": 1, "next_occurrence": 1, "recurrence": 1, "location": 1}
+
     def __init__(self, user_id: str):
         # Tell the base class which collection to use and who the user is
-        super().__init__(collection=tasks_collection, user_id=user_id)
+        super().__init__(
+            collection=database.tasks_collection,
+            user_id=user_id,
+            cache=RepositoryCache(database.redis_client, "tasks", user_id)
+        )
+        # Only its version is used: goal changes refresh the priority table's goal weights
+        self._goal_cache = RepositoryCache(database.redis_client, "goals", user_id)
+        # Every create and delete is also appended to the task's event history
+        self._events = TaskEventRepository(user_id)
+        # Scheduled tasks by due time, for reminders and overdue lookups
+        self._due = DueQueue(database.redis_client, user_id)
 
     @staticmethod
     def get_tool_definitions():
@@ -30,7 +94,10 @@ class TaskRepository(BaseRepository):
                         "properties": {
                             "name": {"type": "string", "description": "A concise name for the task, inferred from the user's request."},
                             "description": {"type": "string", "description": "All other details provided by the user, including the full description, frequency, and any information guiding how to schedule, in a single block of text."},
-                            "schedule": {"type": "string", "description": "Optional. Any scheduling information provided by the user, including time, place, frequency, and deadline, such as 'tomorrow at 5pm in the school' or 'every Friday in my home'."}
+                            "schedule": {"type": "string", "description": "Optional. Any scheduling information provided by the user, including time, place, frequency, and deadline, such as 'tomorrow at 5pm in the school' or 'every Friday in my home'."},
+                            "target_goal_ids": TARGET_GOALS_SCHEMA,
+                            "value_factors": VALUE_FACTORS_SCHEMA,
+                            "scheduling": SCHEDULING_SCHEMA
                         },
                         "required": ["name", "description"]
                     }
@@ -117,7 +184,7 @@ class TaskRepository(BaseRepository):
                 "type": "function",
                 "function": {
                     "name": "list_tasks",
-                    "description": "List all tasks, with optional filtering and sorting.",
+                    "description": "List tasks one page at a time, with optional filtering and sorting. If the result has a 'next_cursor', pass it back as 'cursor' to get more.",
                     "parameters": {
                         "type": "object",
                         "properties": {
@@ -128,29 +195,146 @@ class TaskRepository(BaseRepository):
                             "sort_by": {
                                 "type": "string",
                                 "description": "Optional. The field name to sort the tasks by, e.g., 'created_at'."
+                            },
+                            "limit": {
+                                "type": "integer",
+                                "description": "Optional. Maximum number of tasks to return in this page (default 50, max 200)."
+                            },
+                            "cursor": {
+                                "type": "string",
+                                "description": "Optional. The 'next_cursor' value from a previous call, to fetch the next page."
                             }
                         },
                         "required": []
                     }
                 },
                 "internal_method_name": "list_tasks"
+            },
+            {
+                "type": "function",
+                "function": {
+                    "name": "create_tasks",
+                    "description": "Create several tasks in one call, e.g. when breaking a goal into many tasks. Prefer this over calling create_task repeatedly.",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "tasks": {
+                                "type": "array",
+                                "description": "The tasks to create.",
+                                "items": {
+                                    "type": "object",
+                                    "properties": {
+                                        "name": {"type": "string", "description": "A concise name for the task."},
+                                        "description": {"type": "string", "description": "All other details of the task in a single block of text."},
+                                        "schedule": {"type": "string", "description": "Optional. Scheduling information, such as 'every Monday at 7pm'."},
+                                        "target_goal_ids": TARGET_GOALS_SCHEMA,
+                                        "value_factors": VALUE_FACTORS_SCHEMA,
+                                        "scheduling": SCHEDULING_SCHEMA
+                                    },
+                                    "required": ["name", "description"]
+                                }
+                            }
+                        },
+                        "required": ["tasks"]
+                    }
+                },
+                "internal_method_name": "create_tasks"
+            },
+            {
+                "type": "function",
+                "function": {
+                    "name": "update_tasks",
+                    "description": "Update several existing tasks in one call, each by its unique identifier (ID).",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "updates": {
+                                "type": "array",
+                                "description": "One entry per task to update.",
+                                "items": {
+                                    "type": "object",
+                                    "properties": {
+                                        "item_id": {"type": "string", "description": "The unique identifier of the task to update."},
+                                        "update_data": {"type": "object", "description": "The fields to update and their new values."}
+                                    },
+                                    "required": ["item_id", "update_data"]
+                                }
+                            }
+                        },
+                        "required": ["updates"]
+                    }
+                },
+                "internal_method_name": "update_tasks"
+            },
+            {
+                "type": "function",
+                "function": {
+                    "name": "get_top_tasks",
+                    "description": "Get the user's k most important active tasks, ranked by dynamic priority (urgency, importance, due date, user preference, context, past performance, and the weight of the goals each task serves). Use this to decide what the user should do next.",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "k": {"type": "integer", "minimum": 1, "maximum": 50, "description": "Optional. How many tasks to return (default 5)."}
+                        },
+                        "required": []
+                    }
+                },
+                "internal_method_name": "get_top_tasks"
+            },
+            {
+                "type": "function",
+                "function": {
+                    "name": "get_due_tasks",
+                    "description": "List the active tasks whose schedule falls in a period, e.g. what is due today or this week, each with its due time in the user's timezone. Recurring tasks are listed once per occurrence; one-off tasks whose time has passed are included and marked overdue.",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "period": {"type": "string", "enum": list(DUE_PERIODS), "description": "Optional. The period to list (default 'today'). 'this_week' runs until the end of Sunday."},
+                            "start": {"type": "string", "description": "Optional. 'YYYY-MM-DD' first day of a custom range; overrides period."},
+                            "end": {"type": "string", "description": "Optional. 'YYYY-MM-DD' last day (inclusive) of a custom range."}
+                        },
+                        "required": []
+                    }
+                },
+                "internal_method_name": "get_due_tasks"
+            },
+            {
+                "type": "function",
+                "function": {
+                    "name": "get_overdue_tasks",
+                    "description": "Get the active tasks whose scheduled time has passed (overdue) and those coming up within the next hours (due soon). Use this to remind the user of what they missed or what is next.",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "due_soon_hours": {"type": "integer", "minimum": 0, "maximum": 168, "description": "Optional. How many hours ahead count as due soon (default 24, 0 for overdue only)."}
+                        },
+                        "required": []
+                    }
+                },
+                "internal_method_name": "get_overdue_tasks"
             }
             # ... define all other task-related tools here ...
         ]
 
     # This is the specialized "create" method for Tasks
-    async def create_task(self, name: str, description: str, schedule: str = None) -> Dict[str, Any]:
+    async def create_task(self, name: str, description: str, schedule: str = None, target_goal_ids: List[str] = None,
+                          value_factors: Dict[str, int] = None, scheduling: Dict[str, Any] = None) -> Dict[str, Any]:
         """
         Creates a TaskModel object, validates the data, and persists it to the database.
         Returns the complete TaskModel object.
         """
         logger.info(f"Attempting to create a task for user '{self._user_id}' with data: {name}, {description}, {schedule}")
         try:
+            now = await self._user_now()
             task = TaskModel(
                 user_id=self._user_id,
                 name=name,
                 description=description,
                 schedule=schedule,
+                **parse_schedule(schedule, now)._asdict(),
+                target_goal_ids=target_goal_ids or [],
+                value_factors=value_factors,
+                scheduling=scheduling,
                 created_at=get_current_time(),
                 status="active" # Default status is active
             )
@@ -158,6 +342,9 @@ class TaskRepository(BaseRepository):
             task_dict = task.model_dump(by_alias=True)
             # 3. Insert into the database using the base class's create method
             inserted_id = await super()._create(task_dict)
+            await self._record_events([{"task_id": inserted_id, "action": "created"}])
+            await self._sync_priorities(upserts=[task_dict])
+            await self._due.sync([task_dict])
             logger.info(f"Task '{task.name}' created successfully with ID: {inserted_id}.")
             return {
                 "status": "success",
@@ -176,7 +363,7 @@ class TaskRepository(BaseRepository):
                     "type": "DataValidationError",
                     "summary": "The provided data did not pass validation checks.",
                     "validation_errors": e.errors(), 
-                    "original_input": {"name": name, "description": description, "schedule": schedule}
+                    "original_input": {"name": name, "description": description, "schedule": schedule, "scheduling": scheduling}
                 }
             }
         
@@ -192,7 +379,7 @@ class TaskRepository(BaseRepository):
                     "type": "InternalServerError",
                     "summary": "An unexpected error occurred on the server side. This is likely not a problem with the input data.",
                     "error_info": f"{type(e).__name__}: {str(e)}",
-                    "original_input": {"name": name, "description": description, "schedule": schedule}
+                    "original_input": {"name": name, "description": description, "schedule": schedule, "scheduling": scheduling}
                 }
             }
 
@@ -201,14 +388,13 @@ class TaskRepository(BaseRepository):
         # 1. Call the base class's internal method to get the raw dictionary
         task_dict = await super()._get_by_id(item_id)
 
-        # 2. If data is found, convert it to a TaskModel object before returning
+        # 2. If data is found, project it onto the TaskModel fields before returning
         if task_dict:
             logger.info(f"Task found with ID: {item_id}")
-            task_model = TaskModel(**task_dict)  # This will also validate the data
             return {
                 "status": "success",
                 "message": f"Successfully retrieved task with ID: {item_id}",
-                "data": task_model.model_dump(by_alias=True) # Return as dict with alias (i.e., _id
+                "data": trusted_dump(TaskModel, task_dict) # Trusted read: no re-validation of our own documents
                 }
         
         # 3. If no data, return None
@@ -224,11 +410,10 @@ class TaskRepository(BaseRepository):
         item = await super()._get_by_name(name)
         if item:
             logger.info(f"Task found with name: {name}")
-            task_model = TaskModel(**item)  # Validate and convert to TaskModel
             return {
                 "status": "success",
                 "message": f"Successfully retrieved task with name: {name}",
-                "data": task_model.model_dump(by_alias=True) # Return as dict with alias (i.e., _id)
+                "data": trusted_dump(TaskModel, item) # Trusted read: no re-validation of our own documents
             }
         else:
             logger.info(f"Query successful, but no task found with name: {name}")
@@ -241,9 +426,14 @@ class TaskRepository(BaseRepository):
     async def update_task(self, item_id: str, update_data: dict) -> Dict[str, Any]:
         logger.info(f"Attempting to update task with ID: {item_id} using data: {update_data}")
         try:
-            task = TaskModel(**update_data)  # Validate the update data
-            task_dict = task.model_dump(by_alias=True)
+            # Validate only the fields that were sent
+            task_dict = partial_model(TaskModel).model_validate(update_data).model_dump(by_alias=True, exclude_unset=True)
+            if "schedule" in task_dict:
+                task_dict.update(parse_schedule(task_dict["schedule"], await self._user_now())._asdict())
             updated_number = await super()._update(item_id, task_dict)
+            await self._sync_priorities(changed_ids=[item_id])
+            if {"next_occurrence", "status"} & task_dict.keys():
+                await self._sync_due([item_id])
             if updated_number == 0:
                 logger.info(f"No task found with ID: {item_id} to update.")
                 return {
@@ -281,6 +471,9 @@ class TaskRepository(BaseRepository):
 
         # 2. Return a structured response based on the deletion result
         if deleted_count > 0:
+            await self._record_events([{"task_id": item_id, "action": "deleted"}])
+            await self._sync_priorities(removed=[item_id])
+            await self._due.sync([], removed=[item_id])
             logger.info(f"Task with ID: {item_id} deleted successfully.")
             return {
                 "status": "success",
@@ -295,16 +488,99 @@ class TaskRepository(BaseRepository):
                 "deleted_count": 0
             }
 
+    # --- Bulk tools: validate the whole batch first, then write it in one round trip ---
+    async def create_tasks(self, tasks: List[Dict[str, Any]]) -> Dict[str, Any]:
+        logger.info(f"Attempting to create {len(tasks)} tasks for user '{self._user_id}'")
+        results: List[Dict[str, Any] | None] = [None] * len(tasks)
+        valid_docs, valid_positions = [], []
+        created_at = get_current_time()
+        now = await self._user_now()
+        for index, item in enumerate(tasks):
+            try:
+                task = TaskModel(
+                    user_id=self._user_id,
+                    name=item.get("name"),
+                    description=item.get("description"),
+                    schedule=item.get("schedule"),
+                    **parse_schedule(item.get("schedule"), now)._asdict(),
+                    target_goal_ids=item.get("target_goal_ids") or [],
+                    value_factors=item.get("value_factors"),
+                    scheduling=item.get("scheduling"),
+                    created_at=created_at,
+                    status="active"
+                )
+                valid_docs.append(task.model_dump(by_alias=True))
+                valid_positions.append(index)
+            except ValidationError as e:
+                results[index] = {"index": index, "name": item.get("name"), "status": "failure",
+                                  "validation_errors": e.errors(include_url=False)}
+
+        try:
+            for position, write_result in zip(valid_positions, await super().bulk_create(valid_docs)):
+                results[position] = {**write_result, "index": position, "name": tasks[position].get("name")}
+            created_ids = {result["id"] for result in results if result and result["status"] == "success" and "id" in result}
+            await self._record_events([{"task_id": task_id, "action": "created"} for task_id in created_ids])
+            created_docs = [doc for doc in valid_docs if str(doc["_id"]) in created_ids]
+            await self._sync_priorities(upserts=created_docs)
+            await self._due.sync(created_docs)
+        except Exception as e:
+            error_message = "Task creation failed due to an unexpected internal error."
+            logger.error(f"{error_message} Exception: {e}", exc_info=True)
+            return {
+                "status": "failure",
+                "message": error_message,
+                "data": None,
+                "error_details": {
+                    "type": "InternalServerError",
+                    "summary": "An unexpected error occurred on the server side. This is likely not a problem with the input data.",
+                    "error_info": f"{type(e).__name__}: {str(e)}"
+                }
+            }
+        return self._bulk_response(results, "Created", "tasks")
+
+    async def update_tasks(self, updates: List[Dict[str, Any]]) -> Dict[str, Any]:
+        logger.info(f"Attempting to update {len(updates)} tasks for user '{self._user_id}'")
+        partial_task = partial_model(TaskModel)
+        results: List[Dict[str, Any] | None] = [None] * len(updates)
+        valid_updates, valid_positions = [], []
+        now = None
+        for index, item in enumerate(updates):
+            try:
+                update_data = partial_task.model_validate(item.get("update_data") or {}).model_dump(by_alias=True, exclude_unset=True)
+                if "schedule" in update_data:
+                    now = now or await self._user_now()
+                    update_data.update(parse_schedule(update_data["schedule"], now)._asdict())
+                valid_updates.append((item.get("item_id"), update_data))
+                valid_positions.append(index)
+            except ValidationError as e:
+                results[index] = {"index": index, "id": item.get("item_id"), "status": "failure",
+                                  "validation_errors": e.errors(include_url=False)}
+
+        for position, write_result in zip(valid_positions, await super().bulk_update(valid_updates)):
+            results[position] = {**write_result, "index": position}
+        await self._sync_priorities(changed_ids=[item_id for item_id, _ in valid_updates])
+        await self._sync_due([item_id for item_id, update_data in valid_updates if {"next_occurrence", "status"} & update_data.keys()])
+        return self._bulk_response(results, "Updated", "tasks")
+
     # --- This is a SPECIALIZED function that only makes sense for tasks ---
-    async def list_tasks(filter_by: dict = None, sort_by: str = None) -> Dict[str, Any]:
-        """List all tasks, optionally filtered and sorted."""
+    async def list_tasks(self, filter_by: dict = None, sort_by: str = None, limit: int = None, cursor: str = None) -> Dict[str, Any]:
+        """List one page of tasks, optionally filtered and sorted."""
         try:
-            tasks = await super()._get_all(filter_query=filter_by, sort_by=sort_by)
+            tasks, next_cursor = await super()._get_page(
+                filter_query=filter_by, sort_by=sort_by, projection=self.LIST_PROJECTION, limit=limit, cursor=cursor
+            )
             logger.info(f"Retrieved {len(tasks)} tasks with filter: {filter_by} and sort: {sort_by}")
             return {
                 "status": "success",
-                "message": f"Retrieved {len(tasks)} tasks.",
-                "data": tasks
+                "message": f"Retrieved {len(tasks)} tasks." + (" More tasks are available with 'next_cursor'." if next_cursor else ""),
+                "data": tasks,
+                "next_cursor": next_cursor
+            }
+        except ValueError as e:
+            return {
+                "status": "failure",
+                "message": str(e),
+                "data": None
             }
         except Exception as e:
             error_message = "Failed to retrieve tasks due to an unexpected internal error."
@@ -319,15 +595,268 @@ class TaskRepository(BaseRepository):
                     "error_info": f"{type(e).__name__}: {str(e)}"
                 }
             }
-    
-    # async def get_overdue_tasks(self) -> List[dict]:
-    #     """Retrieves all active tasks for the user whose deadline has passed."""
-    #     overdue_filter = {
-    #         "status": "active",
-    #         "deadline": {"$lt": datetime.now()} # Deadline is less than now
-    #     }
-    #     # We can now use the get_all method we inherited from the base class!
-    #     return await self.get_all(filter_query=overdue_filter)
+
+    # --- Parsed schedules ---
+    async def _user_tz(self) -> ZoneInfo:
+        return ZoneInfo(await get_user_timezone(self._user_id))
+
+    async def _user_now(self) -> datetime:
+        """
+        The current time in the user's timezone; schedule text is read relative to it. Carries the
+        ZoneInfo, not a fixed UTC offset, so occurrences across a DST change keep their local time.
+        """
+        return datetime.now(await self._user_tz())
+
+    async def get_due_tasks(self, period: str = "today", start: str = None, end: str = None) -> Dict[str, Any]:
+        try:
+            tz = await self._user_tz()
+            now = datetime.now(tz)
+            window, error_message = self._due_window(period, start, end, now)
+            if error_message:
+                return {
+                    "status": "failure",
+                    "message": error_message,
+                    "data": None
+                }
+            window_start, window_end = window
+
+            # One index range scan: everything whose next occurrence is before the window ends.
+            # Earlier ones are overdue one-off tasks or recurring tasks that are expanded below.
+            docs = await self._collection.find(
+                {"user_id": self._user_id, "status": "active", "next_occurrence": {"$lt": window_end}}, self.DUE_PROJECTION
+            ).sort("next_occurrence", 1).to_list(length=None)
+
+            due, rolled = [], []
+            for doc in docs:
+                occurrence = _as_utc(doc["next_occurrence"]).astimezone(tz)
+                if not doc.get("recurrence"):
+                    if occurrence >= window_start or occurrence < now:
+                        due.append(self._due_item(doc, occurrence, occurrence < now))
+                    continue
+                for moment in islice(iter_occurrences(doc["recurrence"], occurrence, window_start, tz), MAX_OCCURRENCES_PER_TASK):
+                    if moment >= window_end:
+                        break
+                    due.append(self._due_item(doc, moment, False))
+                if occurrence < now:
+                    upcoming = next_occurrence(doc["recurrence"], occurrence, now, tz)
+                    if upcoming is not None:
+                        rolled.append((str(doc["_id"]), {"next_occurrence": upcoming}))
+
+            if rolled:
+                # Keep the index pointing at the next occurrence of recurring tasks
+                await super().bulk_update(rolled)
+                await self._sync_priorities()
+                await self._due.reschedule({task_id: update["next_occurrence"] for task_id, update in rolled})
+            due.sort(key=lambda item: item["due_at"])
+            logger.info(f"Found {len(due)} due occurrences between {window_start} and {window_end} for user '{self._user_id}'")
+            return {
+                "status": "success",
+                "message": f"{len(due)} task occurrences due between {window_start.isoformat()} and {window_end.isoformat()}.",
+                "data": due
+            }
+        except Exception as e:
+            error_message = "Failed to retrieve due tasks due to an unexpected internal error."
+            logger.error(f"{error_message} Exception: {e}", exc_info=True)
+            return {
+                "status": "failure",
+                "message": error_message,
+                "data": None,
+                "error_details": {
+                    "type": "InternalServerError",
+                    "summary": "An unexpected error occurred on the server side while retrieving due tasks.",
+                    "error_info": f"{type(e).__name__}: {str(e)}",
+                    "original_input": {"period": period, "start": start, "end": end}
+                }
+            }
+
+    async def get_overdue_tasks(self, due_soon_hours: int = 24) -> Dict[str, Any]:
+        try:
+            tz = await self._user_tz()
+            now = datetime.now(tz)
+            until = now + timedelta(hours=max(0, due_soon_hours))
+            try:
+                entries = await self._due_entries(until)
+                docs = await self._collection.find(
+                    {"_id": {"$in": [ObjectId(task_id) for task_id, _ in entries]}, "user_id": self._user_id, "status": "active"},
+                    self.DUE_PROJECTION
+                ).to_list(length=None) if entries else []
+            except RedisError as e:
+                logger.warning(f"Due queue unavailable, falling back to a range query: {e}")
+                docs = await self._collection.find(
+                    {"user_id": self._user_id, "status": "active", "next_occurrence": {"$lt": until}}, self.DUE_PROJECTION
+                ).to_list(length=None)
+                entries = [(str(doc["_id"]), _as_utc(doc["next_occurrence"])) for doc in docs]
+
+            by_id = {str(doc["_id"]): doc for doc in docs}
+            overdue, due_soon, moved, stale = [], [], {}, []
+            for task_id, due_at in entries:
+                doc = by_id.get(task_id)
+                if doc is None:
+                    stale.append(task_id) # Deleted or no longer active
+                    continue
+                due_at = due_at.astimezone(tz)
+                if doc.get("recurrence") and due_at < now:
+                    # A passed occurrence of a recurring task is not overdue; the next one counts
+                    due_at = next_occurrence(doc["recurrence"], due_at, now, tz)
+                    if due_at is None:
+                        continue
+                    moved[task_id] = due_at
+                    if due_at >= until:
+                        continue
+                item = self._due_item(doc, due_at, due_at < now)
+                (overdue if item["overdue"] else due_soon).append(item)
+            if moved:
+                await self._due.reschedule(moved)
+            if stale:
+                await self._due.sync([], removed=stale)
+            due_soon.sort(key=lambda item: item["due_at"])
+
+            logger.info(f"Found {len(overdue)} overdue and {len(due_soon)} due-soon tasks for user '{self._user_id}'")
+            return {
+                "status": "success",
+                "message": f"{len(overdue)} overdue tasks and {len(due_soon)} due in the next {due_soon_hours} hours.",
+                "data": {"overdue": overdue, "due_soon": due_soon}
+            }
+        except Exception as e:
+            error_message = "Failed to retrieve overdue tasks due to an unexpected internal error."
+            logger.error(f"{error_message} Exception: {e}", exc_info=True)
+            return {
+                "status": "failure",
+                "message": error_message,
+                "data": None,
+                "error_details": {
+                    "type": "InternalServerError",
+                    "summary": "An unexpected error occurred on the server side while retrieving overdue tasks.",
+                    "error_info": f"{type(e).__name__}: {str(e)}",
+                    "original_input": {"due_soon_hours": due_soon_hours}
+                }
+            }
+
+    async def _due_entries(self, until: datetime) -> List[tuple]:
+        """(task_id, due time) from the user's due queue, rebuilding it from Mongo if it was never built."""
+        if not await self._due.is_built():
+            await self._due.rebuild(await self._collection.find(
+                {"user_id": self._user_id, "status": "active", "next_occurrence": {"$ne": None}}, {"next_occurrence": 1}
+            ).to_list(length=None))
+        return await self._due.due_before(until)
+
+    async def _sync_due(self, item_ids: List[str]):
+        """Re-reads the due time and status of changed tasks into the due queue."""
+        obj_ids = [ObjectId(item_id) for item_id in item_ids if ObjectId.is_valid(item_id)]
+        if not obj_ids:
+            return
+        docs = await self._collection.find(
+            {"_id": {"$in": obj_ids}, "user_id": self._user_id}, {"status": 1, "next_occurrence": 1}
+        ).to_list(length=None)
+        found = {str(doc["_id"]) for doc in docs}
+        await self._due.sync(docs, removed=[item_id for item_id in item_ids if item_id not in found])
+
+    @staticmethod
+    def _due_item(doc: dict, due_at: datetime, overdue: bool) -> Dict[str, Any]:
+        return {
+            "id": str(doc["_id"]),
+            "name": doc.get("name"),
+            "schedule": doc.get("schedule"),
+            "location": doc.get("location"),
+            "recurring": bool(doc.get("recurrence")),
+            "due_at": due_at.isoformat(),
+            "overdue": overdue,
+        }
+
+    @staticmethod
+    def _due_window(period: str, start: str | None, end: str | None, now: datetime) -> tuple[tuple[datetime, datetime] | None, str | None]:
+        """[start, end) of the requested period in the user's timezone."""
+        if start:
+            try:
+                first = date.fromisoformat(start)
+                last = date.fromisoformat(end) if end else first
+            except ValueError:
+                return None, "start and end must be dates in 'YYYY-MM-DD' format."
+            if last < first:
+                return None, "The range ends before it starts."
+        elif period == "today":
+            first = last = now.date()
+        elif period == "tomorrow":
+            first = last = now.date() + timedelta(days=1)
+        elif period == "this_week":
+            first, last = now.date(), now.date() + timedelta(days=6 - now.weekday())
+        elif period == "next_7_days":
+            first, last = now.date(), now.date() + timedelta(days=6)
+        else:
+            return None, f"Unknown period '{period}'. Use one of {list(DUE_PERIODS)}."
+        return (datetime.combine(first, time(), now.tzinfo), datetime.combine(last + timedelta(days=1), time(), now.tzinfo)), None
+
+    async def _record_events(self, events: List[Dict[str, Any]]):
+        """The history is best effort: a failed event write never fails the task operation itself."""
+        try:
+            await self._events.record_events(events)
+        except Exception as e:
+            logger.warning(f"Failed to record task events {events}: {e}")
+
+    # --- Dynamic priority ---
+    async def get_top_tasks(self, k: int = 5) -> Dict[str, Any]:
+        try:
+            table = await self.priority_table()
+            top_tasks = table.top(k)
+            logger.info(f"Ranked {table.size} active tasks for user '{self._user_id}'")
+            return {
+                "status": "success",
+                "message": f"The top {len(top_tasks)} of {table.size} active tasks by priority (0-100).",
+                "data": top_tasks
+            }
+        except Exception as e:
+            error_message = "Failed to rank tasks due to an unexpected internal error."
+            logger.error(f"{error_message} Exception: {e}", exc_info=True)
+            return {
+                "status": "failure",
+                "message": error_message,
+                "data": None,
+                "error_details": {
+                    "type": "InternalServerError",
+                    "summary": "An unexpected error occurred on the server side while ranking tasks.",
+                    "error_info": f"{type(e).__name__}: {str(e)}"
+                }
+            }
+
+    async def priority_table(self) -> PriorityTable:
+        """This user's up-to-date priority table (see priority_engine)."""
+        stamp = tuple(await asyncio.gather(self._cache.version(), self._goal_cache.version()))
+        return await PRIORITY_ENGINE.table(
+            self._user_id, stamp, self._load_priority_tasks, self._load_goal_weights, self._load_success_rates
+        )
+
+    async def list_schedulable_tasks(self) -> List[dict]:
+        """Active tasks with the fields the day scheduler needs."""
+        return await super()._get_all({"status": "active"}, projection=self.SCHEDULING_PROJECTION)
+
+    async def _load_priority_tasks(self) -> List[dict]:
+        return await super()._get_all({"status": "active"}, projection=self.PRIORITY_PROJECTION)
+
+    async def _load_goal_weights(self) -> Dict[str, float]:
+        return {
+            str(goal["_id"]): goal.get("effective_weight", 1.0)
+            async for goal in database.goals_collection.find({"user_id": self._user_id}, {"effective_weight": 1})
+        }
+
+    async def _load_success_rates(self) -> Dict[str, float]:
+        rates = {}
+        async for stats in database.task_stats_collection.find({"user_id": self._user_id}, {"task_id": 1, "success_count": 1, "failure_count": 1}):
+            rate = success_rate(stats)
+            if rate is not None:
+                rates[stats["task_id"]] = rate
+        return rates
+
+    async def _sync_priorities(self, upserts: List[dict] = (), removed: List[str] = (), changed_ids: List[str] = ()):
+        """Applies this instance's last write to the cached priority table, row by row."""
+        if not PRIORITY_ENGINE.is_cached(self._user_id):
+            return
+        upserts = list(upserts)
+        obj_ids = [ObjectId(item_id) for item_id in changed_ids if ObjectId.is_valid(item_id)]
+        if obj_ids:
+            upserts += await self._collection.find(
+                {"_id": {"$in": obj_ids}, "user_id": self._user_id}, self.PRIORITY_PROJECTION
+            ).to_list(length=None)
+        PRIORITY_ENGINE.apply_task_changes(self._user_id, self._cache_version, upserts, removed)
     
     # async def get_active_tasks(self)-> list[dict]:
     #     """Find all active tasks"""
@@ -0,0 +1,26 @@
+import os
+import logging
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from bson import ObjectId
+import database
+
+logger = logging.getLogger(__name__)
+
+# Used for users without a (valid) timezone in their profile
+DEFAULT_TIMEZONE = os.getenv("DEFAULT_TIMEZONE", "UTC")
+
+# --- Read ---
+async def get_user_timezone(user_id: str) -> str:
+    """The user's IANA timezone name, falling back to DEFAULT_TIMEZONE."""
+    try:
+        user = await database.users_collection.find_one({"_id": ObjectId(user_id)}, {"timezone": 1})
+    except Exception as e:
+        logger.warning(f"Could not read the timezone of user '{user_id}': {e}")
+        user = None
+    timezone = (user or {}).get("timezone") or DEFAULT_TIMEZONE
+    try:
+        ZoneInfo(timezone)
+    except (ZoneInfoNotFoundError, ValueError):
+        logger.warning(f"Unknown timezone '{timezone}' for user '{user_id}', using UTC")
+        return "UTC"
+    return timezone
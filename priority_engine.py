@@ -0,0 +1,234 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Mapping, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# --- Scoring configuration (see dynamic_priority in Data/Task.cs) ---
+FACTORS = ("urgency", "importance", "due_soon", "user_defined", "contextual_relevance", "historical_performance")
+DEFAULT_FACTOR_WEIGHTS = {
+    "urgency": 0.25,
+    "importance": 0.25,
+    "due_soon": 0.20,
+    "user_defined": 0.10,
+    "contextual_relevance": 0.10,
+    "historical_performance": 0.10,
+}
+NEUTRAL_FACTOR = 50.0 # Used for factors nobody has set yet
+# A task serving a goal with effective_weight 1.0 scores up to (1 + GOAL_BOOST) times higher
+GOAL_BOOST = 1.0
+MAX_TABLE_AGE_SECONDS = 300 # Bounds staleness of changes made by other workers (e.g. task stats)
+MAX_USERS = 1000
+
+_HISTORICAL = FACTORS.index("historical_performance")
+
+
+class PriorityTable:
+    """
+    One user's active tasks as columns: a (rows x factors) float32 matrix, the goal weight
+    of each task and its score. Rows are added and removed in place (swap-remove), so an
+    update only rescores the rows it touched.
+    """
+
+    def __init__(self, weights: np.ndarray, stamp: Tuple[Any, Any],
+                 goal_weights: Mapping[str, float], success_rates: Mapping[str, float]):
+        self._weights = weights
+        self.stamp = stamp # (tasks version, goals version) the table reflects
+        self.goal_weights = dict(goal_weights) # Goal ID -> effective_weight
+        self.success_rates = dict(success_rates) # Task ID -> measured success rate (0-1)
+        self.built_at = time.monotonic()
+        self.size = 0
+        self.ids: List[str] = []
+        self.names: List[str] = []
+        self.goal_ids: List[List[str]] = []
+        self.rows: Dict[str, int] = {}
+        self.factors = np.empty((0, len(FACTORS)), dtype=np.float32)
+        self.goal_weight = np.empty(0, dtype=np.float32)
+        self.scores = np.empty(0, dtype=np.float32)
+
+    # --- Row maintenance ---
+    def _reserve(self, extra: int):
+        needed = self.size + extra
+        capacity = len(self.scores)
+        if needed <= capacity:
+            return
+        capacity = max(needed, 2 * capacity, 16)
+        factors = np.empty((capacity, len(FACTORS)), dtype=np.float32)
+        factors[:self.size] = self.factors[:self.size]
+        goal_weight = np.empty(capacity, dtype=np.float32)
+        goal_weight[:self.size] = self.goal_weight[:self.size]
+        scores = np.empty(capacity, dtype=np.float32)
+        scores[:self.size] = self.scores[:self.size]
+        self.factors, self.goal_weight, self.scores = factors, goal_weight, scores
+
+    def upsert(self, tasks: List[dict]):
+        """Adds or replaces the rows of these task documents and rescores only them."""
+        self._reserve(sum(1 for task in tasks if str(task["_id"]) not in self.rows))
+        touched = []
+        for task in tasks:
+            task_id = str(task["_id"])
+            row = self.rows.get(task_id)
+            if row is None:
+                row = self.size
+                self.size += 1
+                self.rows[task_id] = row
+                self.ids.append(task_id)
+                self.names.append(task.get("name"))
+                self.goal_ids.append([])
+            self.names[row] = task.get("name")
+            self.goal_ids[row] = list(task.get("target_goal_ids") or [])
+            factors = task.get("value_factors") or {}
+            self.factors[row] = [NEUTRAL_FACTOR if factors.get(name) is None else factors[name] for name in FACTORS]
+            if task_id in self.success_rates:
+                # Measured performance wins over an estimated factor
+                self.factors[row, _HISTORICAL] = 100.0 * self.success_rates[task_id]
+            self.goal_weight[row] = self._goal_weight(self.goal_ids[row])
+            touched.append(row)
+        self._rescore(np.asarray(touched, dtype=np.intp))
+
+    def remove(self, task_ids: Iterable[str]):
+        """Removes rows by moving the last row into each freed slot."""
+        for task_id in task_ids:
+            row = self.rows.pop(task_id, None)
+            if row is None:
+                continue
+            last = self.size - 1
+            if row != last:
+                moved_id = self.ids[last]
+                self.rows[moved_id] = row
+                self.ids[row], self.names[row], self.goal_ids[row] = self.ids[last], self.names[last], self.goal_ids[last]
+                self.factors[row] = self.factors[last]
+                self.goal_weight[row] = self.goal_weight[last]
+                self.scores[row] = self.scores[last]
+            self.ids.pop()
+            self.names.pop()
+            self.goal_ids.pop()
+            self.size = last
+
+    def _goal_weight(self, goal_ids: List[str]) -> float:
+        """A task inherits the highest effective_weight among the goals it serves."""
+        return max((self.goal_weights.get(goal_id, 0.0) for goal_id in goal_ids), default=0.0)
+
+    def set_goal_weights(self, goal_weights: Mapping[str, float]):
+        """Recomputes the goal-weight column (after goals moved or were re-weighted) and rescores every row."""
+        self.goal_weights = dict(goal_weights)
+        self.goal_weight[:self.size] = [self._goal_weight(goal_ids) for goal_ids in self.goal_ids]
+        self._rescore(slice(0, self.size))
+
+    def set_success_rates(self, success_rates: Mapping[str, float]):
+        self.success_rates.update(success_rates)
+        rows = [self.rows[task_id] for task_id in success_rates if task_id in self.rows]
+        if not rows:
+            return
+        rows = np.asarray(rows, dtype=np.intp)
+        self.factors[rows, _HISTORICAL] = [100.0 * success_rates[self.ids[row]] for row in rows]
+        self._rescore(rows)
+
+    # --- Scoring ---
+    def _rescore(self, rows):
+        """Weighted factor sum times the goal boost, normalized to 0-100, for the given rows in one pass."""
+        self.scores[rows] = (self.factors[rows] @ self._weights) * (1.0 + GOAL_BOOST * self.goal_weight[rows]) / (1.0 + GOAL_BOOST)
+
+    def score_of(self, task_id: str) -> float:
+        row = self.rows.get(task_id)
+        return float(self.scores[row]) if row is not None else 0.0
+
+    def top(self, k: int) -> List[Dict[str, Any]]:
+        """The k highest-scoring tasks, best first."""
+        k = max(0, min(k, self.size))
+        if k == 0:
+            return []
+        scores = self.scores[:self.size]
+        candidates = np.argpartition(-scores, k - 1)[:k] if k < self.size else np.arange(self.size)
+        best = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [
+            {
+                "id": self.ids[row],
+                "name": self.names[row],
+                "priority": round(float(scores[row]), 1),
+                "goal_weight": round(float(self.goal_weight[row]), 4),
+                "factors": {name: round(float(value), 1) for name, value in zip(FACTORS, self.factors[row])}
+            }
+            for row in best
+        ]
+
+
+class PriorityEngine:
+    """
+    Process-wide cache of PriorityTables, one per user. A table is stamped with the versions
+    of the user's task and goal caches (see RepositoryCache): task writes made in this process
+    are applied row by row, goal changes only refresh the goal-weight column, and anything
+    else (another worker wrote, Redis unavailable, table too old) triggers a rebuild.
+    """
+
+    def __init__(self, weights: Mapping[str, float] | None = None, max_users: int = MAX_USERS):
+        weights = {**DEFAULT_FACTOR_WEIGHTS, **(weights or {})}
+        unknown = set(weights) - set(FACTORS)
+        if unknown:
+            raise ValueError(f"Unknown priority factors: {sorted(unknown)}")
+        self._weights = np.array([weights[name] for name in FACTORS], dtype=np.float32)
+        self._max_users = max_users
+        self._tables: "OrderedDict[str, PriorityTable]" = OrderedDict()
+
+    async def table(
+        self,
+        user_id: str,
+        stamp: Tuple[Any, Any],
+        load_tasks: Callable[[], Awaitable[List[dict]]],
+        load_goal_weights: Callable[[], Awaitable[Dict[str, float]]],
+        load_success_rates: Callable[[], Awaitable[Dict[str, float]]],
+    ) -> PriorityTable:
+        """Returns the user's up-to-date table, loading only what changed since it was built."""
+        tasks_version, goals_version = stamp
+        table = self._tables.get(user_id)
+        fresh = (
+            table is not None and tasks_version is not None and goals_version is not None
+            and table.stamp[0] == tasks_version and time.monotonic() - table.built_at < MAX_TABLE_AGE_SECONDS
+        )
+        if fresh:
+            self._tables.move_to_end(user_id)
+            if table.stamp[1] != goals_version:
+                table.set_goal_weights(await load_goal_weights())
+                table.stamp = stamp
+            return table
+
+        table = PriorityTable(self._weights, stamp, await load_goal_weights(), await load_success_rates())
+        table.upsert(await load_tasks())
+        if tasks_version is not None and goals_version is not None:
+            self._tables[user_id] = table
+            self._tables.move_to_end(user_id)
+            while len(self._tables) > self._max_users:
+                self._tables.popitem(last=False)
+        logger.info(f"Built the priority table of user '{user_id}' with {table.size} tasks")
+        return table
+
+    def is_cached(self, user_id: str) -> bool:
+        return user_id in self._tables
+
+    def apply_task_changes(self, user_id: str, new_tasks_version: int | None, upserts: List[dict] = (), removed: Iterable[str] = ()):
+        """
+        Applies this process's own task write to the cached table. Only valid if the write was the
+        single version bump since the table was built; otherwise the table is dropped and rebuilt later.
+        """
+        table = self._tables.get(user_id)
+        if table is None:
+            return
+        if new_tasks_version is None or new_tasks_version - 1 != table.stamp[0]:
+            del self._tables[user_id]
+            return
+        active = [task for task in upserts if task.get("status", "active") == "active"]
+        table.remove([str(task["_id"]) for task in upserts if task.get("status", "active") != "active"])
+        table.remove(removed)
+        table.upsert(active)
+        table.stamp = (new_tasks_version, table.stamp[1])
+
+    def apply_success_rates(self, user_id: str, success_rates: Mapping[str, float]):
+        table = self._tables.get(user_id)
+        if table is not None:
+            table.set_success_rates(success_rates)
+
+
+PRIORITY_ENGINE = PriorityEngine()
@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Iterable, List
+
+import database
+
+logger = logging.getLogger(__name__)
+
+# --- Buffer settings ---
+MAX_BATCH_SIZE = 256 # Points per upsert; a collection reaching it is flushed right away
+FLUSH_INTERVAL_SECONDS = 1.0 # Oldest a buffered point gets before its collection is flushed
+MAX_PENDING_POINTS = 10_000 # Writers wait for room above this
+MAX_CONCURRENT_FLUSHES = 8
+MAX_FLUSH_ATTEMPTS = 3
+
+
+class QdrantWriteBuffer:
+    """
+    Batches point upserts per collection (one memory collection per user).
+
+    Writers add points and return; a collection is flushed as one upsert when it holds
+    MAX_BATCH_SIZE points or its oldest point is FLUSH_INTERVAL_SECONDS old. Upserts use
+    wait=False, so a flush costs one round trip for Qdrant to accept the batch, not for it
+    to be indexed. Writes to a collection stay in order: at most one flush per collection
+    is in flight, a point re-added before its flush replaces the buffered copy at the new
+    position, and a failed batch is put back ahead of newer points (newer versions of the
+    same ids win) and retried by the timer. Points are only dropped by stop(), after
+    MAX_FLUSH_ATTEMPTS failed upserts each; flush() reports any batch it could not store.
+    When MAX_PENDING_POINTS are buffered, add() waits until flushes make room and the wait
+    is counted (see stats()).
+    """
+
+    def __init__(self, qdrant, max_batch_size: int = MAX_BATCH_SIZE, flush_interval: float = FLUSH_INTERVAL_SECONDS, max_pending: int = MAX_PENDING_POINTS):
+        self._qdrant = qdrant
+        self._max_batch_size = max_batch_size
+        self._flush_interval = flush_interval
+        self._max_pending = max_pending
+        self._pending: Dict[str, Dict[str, object]] = {} # collection -> {point id: point}, in write order
+        self._oldest: Dict[str, float] = {} # collection -> monotonic time of its oldest buffered point
+        self._attempts: Dict[str, Dict[str, int]] = {} # collection -> {point id: failed upserts}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._flushes: set = set()
+        self._semaphore = asyncio.Semaphore(MAX_CONCURRENT_FLUSHES)
+        self._room = asyncio.Condition()
+        self._stopping = asyncio.Event()
+        self._runner: asyncio.Task | None = None
+        self._stats = {"points_written": 0, "upserts": 0, "failed_upserts": 0, "dropped_points": 0, "backpressure_waits": 0}
+
+    @property
+    def pending(self) -> int:
+        return sum(len(points) for points in self._pending.values())
+
+    def stats(self) -> Dict[str, int]:
+        return {**self._stats, "pending_points": self.pending}
+
+    # --- Lifecycle ---
+    def start(self):
+        if self._runner is None:
+            self._stopping.clear()
+            self._runner = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Stops the timer and flushes every buffered point; points failing MAX_FLUSH_ATTEMPTS upserts are dropped."""
+        if self._runner is not None:
+            self._stopping.set()
+            await self._runner
+            self._runner = None
+        while self._pending:
+            names = list(self._pending)
+            await asyncio.gather(*(self._flush_collection(name, drop_exhausted=True) for name in names))
+
+    async def run(self):
+        while not self._stopping.is_set():
+            now = time.monotonic()
+            for collection_name, oldest in list(self._oldest.items()):
+                if now - oldest >= self._flush_interval:
+                    self._schedule_flush(collection_name)
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self._flush_interval / 2)
+            except asyncio.TimeoutError:
+                pass
+
+    # --- Writes ---
+    async def add(self, collection_name: str, points: Iterable):
+        """Buffers points (PointStruct) for the collection. Waits while the buffer is full."""
+        self.start()
+        points = list(points)
+        if self.pending + len(points) > self._max_pending:
+            self._stats["backpressure_waits"] += 1
+            logger.warning(f"Qdrant write buffer is full ({self.pending} points); waiting for flushes")
+            for name in list(self._pending):
+                self._schedule_flush(name)
+            async with self._room:
+                await self._room.wait_for(lambda: self.pending + len(points) <= self._max_pending or not self._pending)
+        buffered = self._pending.setdefault(collection_name, {})
+        self._oldest.setdefault(collection_name, time.monotonic())
+        attempts = self._attempts.get(collection_name, {})
+        for point in points:
+            buffered.pop(str(point.id), None) # Moves a re-added point to its new position
+            buffered[str(point.id)] = point
+            attempts.pop(str(point.id), None) # A new version starts its own attempts
+        if len(buffered) >= self._max_batch_size:
+            self._schedule_flush(collection_name)
+
+    def _schedule_flush(self, collection_name: str):
+        lock = self._locks.setdefault(collection_name, asyncio.Lock())
+        if lock.locked():
+            return # The running flush picks up what was added meanwhile
+        flush = asyncio.create_task(self._flush_collection(collection_name))
+        self._flushes.add(flush)
+        flush.add_done_callback(self._flushes.discard)
+
+    async def flush(self, collection_names: Iterable[str] | None = None) -> bool:
+        """
+        Flushes the given collections (default: all) and returns once Qdrant accepted them.
+        False if a batch failed; it stays buffered for a retry.
+        """
+        if collection_names is None:
+            # Includes collections whose batch is in flight
+            collection_names = set(self._pending) | {name for name, lock in self._locks.items() if lock.locked()}
+        names = list(collection_names)
+        return all(await asyncio.gather(*(self._flush_collection(name) for name in names)))
+
+    async def _flush_collection(self, collection_name: str, drop_exhausted: bool = False) -> bool:
+        lock = self._locks.setdefault(collection_name, asyncio.Lock())
+        async with lock, self._semaphore:
+            while self._pending.get(collection_name):
+                buffered = self._pending.pop(collection_name)
+                self._oldest.pop(collection_name, None)
+                batch = dict(list(buffered.items())[:self._max_batch_size])
+                if not await self._upsert(collection_name, list(batch.values())):
+                    self._requeue(collection_name, self._count_failure(collection_name, buffered, batch, drop_exhausted))
+                    await self._notify_room()
+                    return False
+                attempts = self._attempts.get(collection_name, {})
+                for point_id in batch:
+                    attempts.pop(point_id, None)
+                if len(buffered) > len(batch):
+                    self._requeue(collection_name, dict(list(buffered.items())[len(batch):]))
+                await self._notify_room()
+        return True
+
+    async def _upsert(self, collection_name: str, batch: List) -> bool:
+        try:
+            await self._qdrant.upsert(collection_name=collection_name, points=batch, wait=False)
+        except Exception as e:
+            self._stats["failed_upserts"] += 1
+            logger.warning(f"Upsert of {len(batch)} points into '{collection_name}' failed: {e}")
+            return False
+        self._stats["points_written"] += len(batch)
+        self._stats["upserts"] += 1
+        return True
+
+    def _count_failure(self, collection_name: str, buffered: Dict[str, object], batch: Dict[str, object], drop_exhausted: bool) -> Dict[str, object]:
+        """Counts a failed upsert for each point of the batch. Returns the points to put back."""
+        attempts = self._attempts.setdefault(collection_name, {})
+        exhausted = set()
+        for point_id in batch:
+            attempts[point_id] = attempts.get(point_id, 0) + 1
+            if drop_exhausted and attempts[point_id] >= MAX_FLUSH_ATTEMPTS:
+                exhausted.add(point_id)
+        if exhausted:
+            logger.error(f"Dropping {len(exhausted)} points for '{collection_name}' after {MAX_FLUSH_ATTEMPTS} failed upserts")
+            self._stats["dropped_points"] += len(exhausted)
+            for point_id in exhausted:
+                attempts.pop(point_id, None)
+        return {point_id: point for point_id, point in buffered.items() if point_id not in exhausted}
+
+    def _requeue(self, collection_name: str, points: Dict[str, object]):
+        """Puts points back ahead of those added since; a newer version of the same id wins."""
+        newer = self._pending.pop(collection_name, {})
+        merged = {point_id: point for point_id, point in points.items() if point_id not in newer}
+        merged.update(newer)
+        if merged:
+            self._pending[collection_name] = merged
+            self._oldest.setdefault(collection_name, time.monotonic())
+
+    async def _notify_room(self):
+        async with self._room:
+            self._room.notify_all()
+
+
+# --- Process-wide buffer ---
+_shared: QdrantWriteBuffer | None = None
+
+
+def shared_write_buffer() -> QdrantWriteBuffer:
+    """The buffer every memory writer of this process shares, on database.qdrant_client."""
+    global _shared
+    if _shared is None:
+        _shared = QdrantWriteBuffer(database.qdrant_client)
+    return _shared
+
+
+async def close_shared_write_buffer():
+    """Drains the shared buffer. Call before the Qdrant client is closed."""
+    global _shared
+    if _shared is not None:
+        await _shared.stop()
+        _shared = None
@@ -0,0 +1,214 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Tuple
+from zoneinfo import ZoneInfo
+
+from bson import ObjectId
+from redis.exceptions import RedisError
+
+from models.serialization import to_json
+from operation_library.due_queue import GLOBAL_DUE_KEY, DueQueue, claim_due
+from operation_library.user_operations import get_user_timezone
+from schedule_parser import next_occurrence
+
+logger = logging.getLogger(__name__)
+
+# --- Dispatcher settings ---
+TICK_SECONDS = 1
+WHEEL_SLOTS = 64 # One slot per tick; must cover LOOKAHEAD_SECONDS
+LOOKAHEAD_SECONDS = 30 # How far ahead entries are claimed from Redis into the wheel
+POLL_SECONDS = 10
+BATCH_SIZE = 500
+MAX_BATCHES_PER_POLL = 20
+REMINDER_CHANNEL = "reminders"
+MAX_PENDING_REMINDERS = 100 # Kept per user in user:{user_id}:reminders
+BACKFILL_KEY = f"{GLOBAL_DUE_KEY}:backfilled" # Set once the global queue was filled from Mongo
+
+Entry = Tuple[str, str, float] # (user_id, task_id, due epoch)
+
+
+async def publish_reminders(redis, reminders: List[Dict]):
+    """
+    Default delivery: appends each reminder to the user's pending list (read by the next
+    conversation turn) and publishes it for live listeners.
+    """
+    pipeline = redis.pipeline(transaction=False)
+    for reminder in reminders:
+        key = f"user:{reminder['user_id']}:reminders"
+        payload = to_json(reminder)
+        pipeline.rpush(key, payload)
+        pipeline.ltrim(key, -MAX_PENDING_REMINDERS, -1)
+        pipeline.publish(REMINDER_CHANNEL, payload)
+    await pipeline.execute()
+
+
+class ReminderDispatcher:
+    """
+    Fires reminders for due tasks from the global due queue (see DueQueue).
+
+    Every POLL_SECONDS the dispatcher claims, in batches, the entries falling due within the
+    next LOOKAHEAD_SECONDS and files them into a timer wheel of one-second slots; every tick
+    fires the slots that came due. Redis is read once per poll instead of once per task or
+    per second, and claims are atomic per entry, so several workers never fire the same
+    reminder. Recurring tasks are re-queued at their next occurrence before their reminder
+    goes out. Claimed entries whose firing failed, or that have not fired when the
+    dispatcher stops, are put back. Task writes keep the queue filled; when it was never
+    filled (first start after deployment, Redis flushed) a poll backfills it from Mongo.
+    """
+
+    def __init__(self, redis, tasks_collection, deliver: Callable[[List[Dict]], Awaitable[None]] | None = None):
+        self._redis = redis
+        self._tasks = tasks_collection
+        self._deliver = deliver or (lambda reminders: publish_reminders(redis, reminders))
+        self._slots: List[List[Entry]] = [[] for _ in range(WHEEL_SLOTS)]
+        self._stopping = asyncio.Event()
+        self._runner: asyncio.Task | None = None
+
+    # --- Lifecycle ---
+    def start(self):
+        if self._runner is None:
+            self._stopping.clear()
+            self._runner = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._runner is None:
+            return
+        self._stopping.set()
+        await self._runner
+        self._runner = None
+        await self._requeue([entry for slot in self._slots for entry in slot])
+        self._slots = [[] for _ in range(WHEEL_SLOTS)]
+
+    async def run(self):
+        last_tick = int(time.time() // TICK_SECONDS)
+        next_poll = 0.0
+        while not self._stopping.is_set():
+            now = time.time()
+            try:
+                if now >= next_poll:
+                    await self.poll(now)
+                    next_poll = now + POLL_SECONDS
+                current_tick = int(now // TICK_SECONDS)
+                # Catch up on every slot passed since the last tick (the loop may have been delayed)
+                for tick in range(last_tick, current_tick + 1):
+                    await self._fire_slot(tick % WHEEL_SLOTS, current_tick)
+                last_tick = current_tick
+            except Exception as e:
+                logger.error(f"Reminder dispatch failed: {e}", exc_info=True)
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=TICK_SECONDS - time.time() % TICK_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    # --- Timer wheel ---
+    async def poll(self, now: float):
+        """Claims entries due within the lookahead and files them into the wheel."""
+        try:
+            await self._backfill(now)
+        except Exception as e:
+            logger.warning(f"Could not backfill the due queue: {e}")
+        try:
+            for _ in range(MAX_BATCHES_PER_POLL):
+                entries = await claim_due(self._redis, now + LOOKAHEAD_SECONDS, BATCH_SIZE)
+                current_tick = int(now // TICK_SECONDS)
+                for entry in entries:
+                    # Entries already due go into the current slot and fire on this tick
+                    tick = max(int(entry[2] // TICK_SECONDS), current_tick)
+                    self._slots[tick % WHEEL_SLOTS].append(entry)
+                if len(entries) < BATCH_SIZE:
+                    break
+        except RedisError as e:
+            logger.warning(f"Could not read the due queue: {e}")
+
+    async def _fire_slot(self, slot: int, current_tick: int):
+        due = [entry for entry in self._slots[slot] if int(entry[2] // TICK_SECONDS) <= current_tick]
+        if not due:
+            return
+        self._slots[slot] = [entry for entry in self._slots[slot] if int(entry[2] // TICK_SECONDS) > current_tick]
+        try:
+            await self.fire(due)
+        except Exception:
+            await self._requeue(due) # Claimed again on the next poll
+            raise
+
+    async def fire(self, entries: List[Entry]):
+        """Re-queues recurring tasks at their next occurrence, then delivers reminders for these entries (one task lookup)."""
+        ids = [ObjectId(task_id) for _, task_id, _ in entries if ObjectId.is_valid(task_id)]
+        tasks = {
+            str(task["_id"]): task
+            async for task in self._tasks.find(
+                {"_id": {"$in": ids}, "status": "active"}, {"user_id": 1, "name": 1, "schedule": 1, "location": 1, "recurrence": 1}
+            )
+        }
+        reminders, recurring = [], []
+        for user_id, task_id, due_epoch in entries:
+            task = tasks.get(task_id)
+            if task is None or task.get("user_id") != user_id:
+                continue # Deleted or finished since it was queued
+            due_at = datetime.fromtimestamp(due_epoch, timezone.utc)
+            reminders.append({
+                "user_id": user_id,
+                "task_id": task_id,
+                "name": task.get("name"),
+                "schedule": task.get("schedule"),
+                "location": task.get("location"),
+                "due_at": due_at.isoformat(),
+            })
+            if task.get("recurrence"):
+                recurring.append((user_id, task_id, task["recurrence"], due_at))
+        # Before delivering: a failed delivery re-queues the entry at this occurrence, and
+        # a delivered one must not leave the task out of the queue
+        zones = {}
+        for user_id, task_id, recurrence, due_at in recurring:
+            if user_id not in zones:
+                zones[user_id] = ZoneInfo(await get_user_timezone(user_id))
+            tz = zones[user_id]
+            upcoming = next_occurrence(recurrence, due_at, datetime.fromtimestamp(due_at.timestamp() + 1, timezone.utc), tz)
+            if upcoming is not None:
+                await DueQueue(self._redis, user_id).reschedule({task_id: upcoming})
+        if reminders:
+            await self._deliver(reminders)
+            logger.info(f"Sent {len(reminders)} task reminders")
+
+    async def _backfill(self, now: float):
+        """
+        Fills the global queue from Mongo unless its marker is set: every active task due from
+        now on, recurring tasks at their next occurrence (overdue one-off tasks are left to the
+        overdue lookups). One worker wins the marker; entries already queued keep their time.
+        """
+        if not await self._redis.set(BACKFILL_KEY, 1, nx=True):
+            return
+        try:
+            moment = datetime.fromtimestamp(now, timezone.utc)
+            queued = 0
+            # Per user, so each lookup is a range on the (user_id, status, next_occurrence) index
+            for user_id in await self._tasks.distinct("user_id", {"status": "active"}):
+                entries, tz = {}, None
+                async for task in self._tasks.find(
+                    {"user_id": user_id, "status": "active", "next_occurrence": {"$ne": None}}, {"next_occurrence": 1, "recurrence": 1}
+                ):
+                    due_at = task["next_occurrence"]
+                    if due_at.tzinfo is None:
+                        due_at = due_at.replace(tzinfo=timezone.utc) # Mongo returns naive UTC datetimes
+                    if due_at < moment and task.get("recurrence"):
+                        tz = tz or ZoneInfo(await get_user_timezone(user_id))
+                        due_at = next_occurrence(task["recurrence"], due_at, moment, tz)
+                    if due_at is not None and due_at >= moment:
+                        entries[f"{user_id}:{task['_id']}"] = due_at.timestamp()
+                if entries:
+                    await self._redis.zadd(GLOBAL_DUE_KEY, entries, nx=True)
+                    queued += len(entries)
+            logger.info(f"Backfilled the due queue with {queued} scheduled tasks")
+        except Exception:
+            await self._redis.delete(BACKFILL_KEY) # Retried on the next poll
+            raise
+
+    async def _requeue(self, entries: List[Entry]):
+        if not entries:
+            return
+        try:
+            await self._redis.zadd(GLOBAL_DUE_KEY, {f"{user_id}:{task_id}": due_epoch for user_id, task_id, due_epoch in entries})
+        except RedisError as e:
+            logger.warning(f"Could not put {len(entries)} unfired reminders back: {e}")
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, HTTPException
 from models.task import Task
 from models.chat import ChatMessage
-from database import db
+import database
 from main import main
 
 router = APIRouter()
@@ -9,12 +9,12 @@ router = APIRouter()
 @router.post("/tasks")
 async def create_task(task: Task):
     task_dict = task.dict()
-    await db["tasks"].insert_one(task_dict)
+    await database.db["tasks"].insert_one(task_dict)
     return {"msg": "Task created"}
 
 @router.get("/tasks/{task_id}")
 async def get_task(task_id: str):
-    task = await db["tasks"].find_one({"task_id": task_id})
+    task = await database.db["tasks"].find_one({"task_id": task_id})
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     task["_id"]=str(task["_id"])  # Convert ObjectId to string
@@ -0,0 +1,200 @@
+"""
+Normalizes the free-text TaskModel.schedule ("tomorrow at 5pm in the school",
+"every Friday in my home") once, at write time, into:
+
+    next_occurrence  aware datetime of the next time the task is due (None if no date or time was found)
+    recurrence       RRULE subset, e.g. "FREQ=WEEKLY;INTERVAL=1;BYDAY=FR;BYHOUR=17;BYMINUTE=0"
+    location         e.g. "school"
+
+Schedules without a time of day ("every Friday", "next week") are due at 00:00 local time.
+Supported RRULE parts: FREQ (DAILY, WEEKLY, MONTHLY), INTERVAL, BYDAY, BYMONTHDAY, BYHOUR, BYMINUTE.
+Occurrences are computed in the user's timezone, so "every day at 6pm" stays at 6pm across DST.
+"""
+import re
+from datetime import date, datetime, time, timedelta, tzinfo
+from typing import Dict, Iterator, List, NamedTuple
+
+WEEKDAYS = ("MO", "TU", "WE", "TH", "FR", "SA", "SU")
+_WEEKDAY_NAMES = {
+    "monday": 0, "mon": 0, "tuesday": 1, "tue": 1, "tues": 1, "wednesday": 2, "wed": 2,
+    "thursday": 3, "thu": 3, "thur": 3, "thurs": 3, "friday": 4, "fri": 4,
+    "saturday": 5, "sat": 5, "sunday": 6, "sun": 6,
+}
+_DAY_PARTS = {"morning": time(8, 0), "noon": time(12, 0), "afternoon": time(14, 0), "evening": time(18, 0), "night": time(21, 0), "tonight": time(20, 0)}
+_UNITS = {"minute": "minutes", "min": "minutes", "hour": "hours", "day": "days", "week": "weeks"}
+MAX_SCAN_DAYS = 366 * 5
+
+_WEEKDAY = r"\b(monday|tuesday|wednesday|thursday|friday|saturday|sunday|mon|tues?|wed|thur?s?|fri|sat|sun)s?\b" # Not "month", "fridge"
+_TIME_12H = re.compile(r"\b(\d{1,2})(?::(\d{2}))?\s*(am|pm)\b")
+_TIME_24H = re.compile(r"\b([01]?\d|2[0-3]):([0-5]\d)\b")
+_DAY_PART = re.compile(r"\b(morning|noon|afternoon|evening|tonight|night)\b")
+_ISO_DATE = re.compile(r"\b(\d{4}-\d{2}-\d{2})\b")
+_IN_DELTA = re.compile(r"\bin (\d+|an?) (minute|min|hour|day|week)s?\b")
+_EVERY_N = re.compile(r"\bevery (\d+) (day|week|month)s?\b")
+_EVERY_WEEKDAYS = re.compile(r"\b(?:every|each|on)\s+((?:" + _WEEKDAY + r"(?:\s*(?:,|and|&)\s*)*)+)")
+_PLURAL_WEEKDAY = re.compile(r"\b(monday|tuesday|wednesday|thursday|friday|saturday|sunday)s\b")
+_NEXT_WEEKDAY = re.compile(r"\b(?:next|on|by|this)?\s*" + _WEEKDAY + r"\b")
+# "in the school", "at my home", "at the gym" (a bare "at" is usually a time)
+_LOCATION = re.compile(r"\b(?:in|at)\s+(?:the|my|a)\s+([a-z][\w' -]*?)(?=\s*(?:$|,|\.|\bat\b|\bon\b|\bevery\b|\bin\b|\bby\b|\bfrom\b))")
+
+
+class ParsedSchedule(NamedTuple):
+    next_occurrence: datetime | None
+    recurrence: str | None
+    location: str | None
+
+
+# --- RRULE subset ---
+def parse_rrule(recurrence: str) -> Dict[str, str]:
+    return dict(part.split("=", 1) for part in recurrence.split(";") if "=" in part)
+
+def _build_rrule(freq: str, interval: int = 1, byday: List[int] = None, bymonthday: int = None, at: time | None = None) -> str:
+    parts = [f"FREQ={freq}", f"INTERVAL={interval}"]
+    if byday:
+        parts.append("BYDAY=" + ",".join(WEEKDAYS[day] for day in sorted(set(byday))))
+    if bymonthday:
+        parts.append(f"BYMONTHDAY={bymonthday}")
+    if at is not None:
+        parts += [f"BYHOUR={at.hour}", f"BYMINUTE={at.minute}"]
+    return ";".join(parts)
+
+def _matches(rule: Dict[str, str], anchor: date, day: date) -> bool:
+    interval = int(rule.get("INTERVAL", 1))
+    freq = rule.get("FREQ", "DAILY")
+    if freq == "DAILY":
+        return (day - anchor).days % interval == 0
+    if freq == "WEEKLY":
+        byday = rule.get("BYDAY", WEEKDAYS[anchor.weekday()]).split(",")
+        weeks = ((day - timedelta(days=day.weekday())) - (anchor - timedelta(days=anchor.weekday()))).days // 7
+        return WEEKDAYS[day.weekday()] in byday and weeks % interval == 0
+    if freq == "MONTHLY":
+        months = (day.year - anchor.year) * 12 + day.month - anchor.month
+        return day.day == int(rule.get("BYMONTHDAY", anchor.day)) and months % interval == 0
+    return False
+
+def iter_occurrences(recurrence: str, anchor: datetime, after: datetime, tz: tzinfo) -> Iterator[datetime]:
+    """
+    Occurrences at or after 'after', in order. 'anchor' is a known occurrence (the stored
+    next_occurrence); INTERVAL counts from it.
+    """
+    rule = parse_rrule(recurrence)
+    anchor = anchor.astimezone(tz)
+    at = time(int(rule.get("BYHOUR", anchor.hour)), int(rule.get("BYMINUTE", anchor.minute)))
+    day = max(anchor.date(), after.astimezone(tz).date())
+    for _ in range(MAX_SCAN_DAYS):
+        if _matches(rule, anchor.date(), day):
+            moment = datetime.combine(day, at, tz)
+            if moment >= after and moment >= anchor:
+                yield moment
+        day += timedelta(days=1)
+
+def next_occurrence(recurrence: str, anchor: datetime, after: datetime, tz: tzinfo) -> datetime | None:
+    return next(iter_occurrences(recurrence, anchor, after, tz), None)
+
+
+# --- Free-text parsing ---
+def _parse_time(text: str) -> time | None:
+    match = _TIME_12H.search(text)
+    if match:
+        hour = int(match.group(1)) % 12 + (12 if match.group(3) == "pm" else 0)
+        return time(hour, int(match.group(2) or 0)) if hour < 24 else None
+    match = _TIME_24H.search(text)
+    if match:
+        return time(int(match.group(1)), int(match.group(2)))
+    match = _DAY_PART.search(text)
+    return _DAY_PARTS[match.group(1)] if match else None
+
+def _parse_location(text: str) -> str | None:
+    match = _LOCATION.search(text)
+    return match.group(1).strip() if match else None
+
+def _weekdays_in(text: str) -> List[int]:
+    return [_WEEKDAY_NAMES[name] for name in re.findall(_WEEKDAY, text)]
+
+def _parse_recurrence(text: str, at: time | None, now: datetime) -> str | None:
+    match = _EVERY_N.search(text)
+    if match:
+        freq = {"day": "DAILY", "week": "WEEKLY", "month": "MONTHLY"}[match.group(2)]
+        byday = _weekdays_in(text[match.end():]) if freq == "WEEKLY" else None
+        return _build_rrule(freq, int(match.group(1)), byday=byday, bymonthday=now.day if freq == "MONTHLY" else None, at=at)
+    if re.search(r"\b(every|each) ?(week ?days?|weekday)\b|\bweekdays\b", text):
+        return _build_rrule("WEEKLY", byday=[0, 1, 2, 3, 4], at=at)
+    if re.search(r"\b(every|each) ?weekends?\b|\bweekends\b", text):
+        return _build_rrule("WEEKLY", byday=[5, 6], at=at)
+    # Explicit periods before weekday names ("every week on monday")
+    if re.search(r"\b(monthly|every month|each month|once a month)\b", text):
+        return _build_rrule("MONTHLY", bymonthday=now.day, at=at)
+    if re.search(r"\b(weekly|every week|each week|once a week)\b", text):
+        return _build_rrule("WEEKLY", byday=_weekdays_in(text) or [now.weekday()], at=at)
+    match = _EVERY_WEEKDAYS.search(text)
+    if match and re.match(r"(every|each)", match.group(0)):
+        return _build_rrule("WEEKLY", byday=_weekdays_in(match.group(1)), at=at)
+    plural = _PLURAL_WEEKDAY.findall(text)
+    if plural:
+        return _build_rrule("WEEKLY", byday=[_WEEKDAY_NAMES[name] for name in plural], at=at)
+    if re.search(r"\b(daily|every ?day|each day|every (morning|afternoon|evening|night))\b", text):
+        return _build_rrule("DAILY", at=at)
+    return None
+
+def _parse_date(text: str, at: time | None, now: datetime) -> datetime | None:
+    """The one-off date (and time) the text refers to, or None."""
+    tz = now.tzinfo
+    match = _IN_DELTA.search(text)
+    if match:
+        amount = 1 if match.group(1) in ("a", "an") else int(match.group(1))
+        return (now + timedelta(**{_UNITS[match.group(2)]: amount})).replace(second=0, microsecond=0)
+
+    # How far a date without an explicit day moves once its time has passed today
+    roll = timedelta(days=1)
+    day = None
+    match = _ISO_DATE.search(text)
+    if match:
+        roll = None
+        try:
+            day = date.fromisoformat(match.group(1))
+        except ValueError:
+            day = None
+    elif re.search(r"\bday after tomorrow\b", text):
+        day, roll = now.date() + timedelta(days=2), None
+    elif re.search(r"\btomorrow\b", text):
+        day, roll = now.date() + timedelta(days=1), None
+    elif re.search(r"\b(today|tonight)\b", text):
+        day, roll = now.date(), None
+    elif re.search(r"\bnext week\b", text):
+        day, roll = now.date() + timedelta(days=7 - now.weekday()), None
+    else:
+        match = _NEXT_WEEKDAY.search(text)
+        if match and match.group(1):
+            ahead = (_WEEKDAY_NAMES[match.group(1)] - now.weekday()) % 7
+            if match.group(0).strip().startswith("next") and ahead == 0:
+                ahead = 7
+            day, roll = now.date() + timedelta(days=ahead), timedelta(days=7)
+
+    if day is None:
+        if at is None:
+            return None
+        # Only a time: the next time it comes round
+        day = now.date()
+    moment = datetime.combine(day, at or time(0, 0), tz)
+    if at is not None and roll is not None and moment < now:
+        moment += roll
+    return moment
+
+def parse_schedule(text: str | None, now: datetime) -> ParsedSchedule:
+    """
+    Parses schedule text relative to 'now', an aware datetime in the user's timezone.
+    Anything it cannot understand is left as None; the original text is always kept.
+    """
+    if not text:
+        return ParsedSchedule(None, None, None)
+    lowered = " ".join(text.lower().split())
+    at = _parse_time(lowered)
+    location = _parse_location(lowered)
+    recurrence = _parse_recurrence(lowered, at, now)
+    if recurrence:
+        # The series starts at the next matching moment; INTERVAL then counts from there
+        anchor = datetime.combine(now.date(), at or time(0, 0), now.tzinfo)
+        every = re.sub(r"INTERVAL=\d+", "INTERVAL=1", recurrence)
+        first = next_occurrence(every, anchor, now if at else anchor, now.tzinfo)
+        return ParsedSchedule(first, recurrence, location)
+    return ParsedSchedule(_parse_date(lowered, at, now), None, location)
@@ -0,0 +1,236 @@
+from bisect import insort
+from datetime import date, datetime, time, timedelta, timezone, tzinfo
+from typing import Any, Dict, Iterable, List, NamedTuple, Tuple
+
+from schedule_parser import next_occurrence
+
+# --- Scheduling defaults ---
+DAY_START = time(8, 0)
+DAY_END = time(22, 0)
+DEFAULT_DURATION_MINUTES = 30
+SLOT_MINUTES = 5 # Block starts are aligned to this grid
+# Parts of the day each energy hint prefers; tasks fall back to any free window
+ENERGY_WINDOWS = {
+    "high": (time(8, 0), time(12, 0)),
+    "medium": (time(12, 0), time(18, 0)),
+    "low": (time(18, 0), time(22, 0)),
+}
+PERIOD_DAYS = {"daily": 1, "weekly": 7, "monthly": 30}
+
+
+class Block(NamedTuple):
+    start: datetime
+    end: datetime
+    task_id: str
+    task_name: str
+    status: str # "fixed" or "planned"
+
+
+class Candidate(NamedTuple):
+    """A task to place, already ordered by priority by the caller."""
+    task_id: str
+    task_name: str
+    duration: timedelta
+    occurrences: int
+    energy: str | None
+    fixed_start: time | None
+
+
+def occurrence_on(task: Dict[str, Any], day: date, tz: tzinfo) -> datetime | None:
+    """When the task's parsed schedule (next_occurrence / recurrence) falls on this day, if it does."""
+    anchor = task.get("next_occurrence")
+    if anchor is None:
+        return None
+    if anchor.tzinfo is None:
+        anchor = anchor.replace(tzinfo=timezone.utc) # Mongo returns naive UTC datetimes
+    anchor = anchor.astimezone(tz)
+    if task.get("recurrence"):
+        anchor = next_occurrence(task["recurrence"], anchor, datetime.combine(day, time(), tz), tz)
+    return anchor if anchor is not None and anchor.date() == day else None
+
+
+def candidate_from_task(task: Dict[str, Any], day: date | None = None, tz: tzinfo | None = None) -> Candidate:
+    hints = task.get("scheduling") or {}
+    fixed_time = hints.get("fixed_time")
+    occurrence = occurrence_on(task, day, tz) if day is not None else None
+    # A schedule with a time of day ("tomorrow at 5pm") is a fixed event on its day
+    fixed_start = time.fromisoformat(fixed_time) if fixed_time else None
+    if fixed_start is None and occurrence is not None and occurrence.time() != time():
+        fixed_start = occurrence.time()
+    return Candidate(
+        task_id=str(task["_id"]),
+        task_name=task.get("name"),
+        duration=timedelta(minutes=hints.get("duration_minutes") or DEFAULT_DURATION_MINUTES),
+        occurrences=(hints.get("times") or 1) if (hints.get("frequency") or "daily") == "daily" else 1,
+        energy=hints.get("energy"),
+        fixed_start=fixed_start,
+    )
+
+
+def is_due(task: Dict[str, Any], day: date, last_done: datetime | None, tz: tzinfo = timezone.utc) -> bool:
+    """
+    Whether a task belongs on this day. A parsed schedule decides first: recurring tasks are
+    due on their occurrences, one-off tasks on their day and afterwards until done (or planned).
+    Otherwise tasks without a frequency and daily tasks always are, weekly/monthly tasks once
+    (period / times) days have passed since they were last done.
+    """
+    if task.get("next_occurrence") is not None:
+        if task.get("recurrence"):
+            return occurrence_on(task, day, tz) is not None
+        moment = task["next_occurrence"]
+        moment = moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment
+        due_day = moment.astimezone(tz).date()
+        return due_day == day or (due_day < day and (last_done is None or last_done.date() < due_day))
+    hints = task.get("scheduling") or {}
+    frequency = hints.get("frequency")
+    if frequency in (None, "daily") or last_done is None:
+        return True
+    interval = timedelta(days=PERIOD_DAYS[frequency] / (hints.get("times") or 1))
+    return day - last_done.date() >= interval
+
+
+def _align(moment: datetime) -> datetime:
+    """Rounds up to the next SLOT_MINUTES boundary."""
+    aligned = moment.replace(second=0, microsecond=0)
+    if aligned < moment:
+        aligned += timedelta(minutes=1)
+    return aligned + timedelta(minutes=-aligned.minute % SLOT_MINUTES)
+
+
+def free_windows(day_start: datetime, day_end: datetime, busy: Iterable[Tuple[datetime, datetime]]) -> List[Tuple[datetime, datetime]]:
+    """Gaps between the busy intervals inside [day_start, day_end): one sort and one sweep, O(n log n)."""
+    windows = []
+    cursor = day_start
+    for start, end in sorted(busy):
+        if start > cursor:
+            windows.append((cursor, min(start, day_end)))
+        cursor = max(cursor, end)
+        if cursor >= day_end:
+            break
+    if cursor < day_end:
+        windows.append((cursor, day_end))
+    return [(start, end) for start, end in windows if end > start]
+
+
+def _take(windows: List[Tuple[datetime, datetime]], duration: timedelta, band: Tuple[datetime, datetime] | None) -> Tuple[datetime, datetime] | None:
+    """
+    First-fit: the earliest slot of the given duration, inside the preferred band when possible.
+    The slot is carved out of its window, which is split in two if needed. A scan of the
+    windows, O(w) per slot: a day holds few enough windows that a sorted structure does not pay.
+    """
+    for restrict in ((band,) if band else ()) + (None,):
+        for index, (window_start, window_end) in enumerate(windows):
+            start = _align(max(window_start, restrict[0]) if restrict else window_start)
+            limit = min(window_end, restrict[1]) if restrict else window_end
+            if start + duration > limit:
+                continue
+            end = start + duration
+            del windows[index]
+            if end < window_end:
+                windows.insert(index, (end, window_end))
+            if window_start < start:
+                windows.insert(index, (window_start, start))
+            return start, end
+    return None
+
+
+def _band(day: date, tz: tzinfo, energy: str | None) -> Tuple[datetime, datetime] | None:
+    if energy not in ENERGY_WINDOWS:
+        return None
+    start, end = ENERGY_WINDOWS[energy]
+    return datetime.combine(day, start, tz), datetime.combine(day, end, tz)
+
+
+def pack(
+    day: date,
+    tz: tzinfo,
+    candidates: List[Candidate],
+    not_before: datetime | None = None,
+    blocks: List[Block] = (),
+) -> Tuple[List[Block], List[Dict[str, Any]]]:
+    """
+    Places candidates into the day around fixed events and existing blocks. Fixed-time tasks
+    are placed first, even when they overlap (see fixed_conflicts), the rest in the given
+    (priority) order into the earliest fitting window: O(n log n + k·w) for n blocks, k slots
+    to place and w free windows. Returns (blocks sorted by start, unscheduled candidates with a reason).
+    """
+    day_start = datetime.combine(day, DAY_START, tz)
+    day_end = datetime.combine(day, DAY_END, tz)
+    blocks = sorted(blocks)
+    unscheduled = []
+
+    for candidate in candidates:
+        if candidate.fixed_start is None:
+            continue
+        start = datetime.combine(day, candidate.fixed_start, tz)
+        insort(blocks, Block(start, start + candidate.duration, candidate.task_id, candidate.task_name, "fixed"))
+
+    open_from = max(day_start, _align(not_before)) if not_before else day_start
+    windows = free_windows(open_from, day_end, [(block.start, block.end) for block in blocks])
+    for candidate in candidates:
+        if candidate.fixed_start is not None:
+            continue
+        for occurrence in range(candidate.occurrences):
+            slot = _take(windows, candidate.duration, _band(day, tz, candidate.energy))
+            if slot is None:
+                unscheduled.append({
+                    "task_id": candidate.task_id,
+                    "task_name": candidate.task_name,
+                    "reason": f"No free window of {int(candidate.duration.total_seconds() // 60)} minutes left."
+                })
+                break
+            insort(blocks, Block(slot[0], slot[1], candidate.task_id, candidate.task_name, "planned"))
+    return blocks, unscheduled
+
+
+def fixed_conflicts(blocks: List[Block]) -> List[Dict[str, Any]]:
+    """
+    Pairs of overlapping blocks, in one sweep over the blocks sorted by start. Planned blocks
+    only go into free windows, so every overlap involves a fixed event.
+    """
+    conflicts = []
+    latest = None # The block reaching furthest so far
+    for block in sorted(blocks):
+        if latest is not None and block.start < latest.end:
+            conflicts.append({
+                "task_ids": [latest.task_id, block.task_id],
+                "task_names": [latest.task_name, block.task_name],
+                "start_time": block.start.isoformat(),
+                "end_time": min(latest.end, block.end).isoformat(),
+            })
+        if latest is None or block.end > latest.end:
+            latest = block
+    return conflicts
+
+
+def to_output(day: date, blocks: List[Block], unscheduled: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """The schedule in the shape of Data/Schedule, with the overlapping fixed events it had to keep."""
+    return {
+        "time": day.isoformat(),
+        "version": "1.0",
+        "schedule": [
+            {
+                "task_id": block.task_id,
+                "task_name": block.task_name,
+                "start_time": block.start.isoformat(),
+                "end_time": block.end.isoformat(),
+                "status": block.status,
+            }
+            for block in blocks
+        ],
+        "unscheduled": unscheduled,
+        "conflicts": fixed_conflicts(blocks),
+    }
+
+
+def from_output(schedule: Dict[str, Any]) -> List[Block]:
+    return [
+        Block(
+            datetime.fromisoformat(item["start_time"]),
+            datetime.fromisoformat(item["end_time"]),
+            item["task_id"],
+            item["task_name"],
+            item["status"],
+        )
+        for item in schedule["schedule"]
+    ]
@@ -14,8 +14,3 @@ def get_current_time(timezone: str = "UTC") -> str:
     """
     now = datetime.now(ZoneInfo(timezone))
     return now.isoformat()
-
-# Example usage:
-print(get_current_time("America/Edmonton"))  # Calgary time
-print(get_current_time("Asia/Shanghai"))     # Beijing time
-print(get_current_time())                    # UTC time
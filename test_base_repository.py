@@ -0,0 +1,73 @@
+"""
+Keyset pagination of BaseRepository: the Mongo path and the cached path (RepositoryCache)
+must return the same pages. Runs on in-memory Mongo and Redis.
+
+    python -m pytest -q test_base_repository.py
+"""
+import asyncio
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+fakeredis = pytest.importorskip("fakeredis")
+
+from operation_library.base_repository import BaseRepository
+from operation_library.repository_cache import RepositoryCache
+
+USER_ID = "user-1"
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+@pytest.fixture
+def collection():
+    collection = mongomock_motor.AsyncMongoMockClient()["test"]["tasks"]
+    # Odd n have a deadline, even n have none (missing or null)
+    run(collection.insert_many([
+        {"user_id": USER_ID, "n": n, **({"deadline": n} if n % 2 else ({"deadline": None} if n % 4 else {}))}
+        for n in range(9)
+    ]))
+    return collection
+
+
+def repositories(collection):
+    """(Mongo path, cached path) over the same documents."""
+    cache = RepositoryCache(fakeredis.FakeAsyncRedis(decode_responses=True), "tasks", USER_ID)
+    return BaseRepository(collection, USER_ID), BaseRepository(collection, USER_ID, cache=cache)
+
+
+def all_pages(repository, **query):
+    seen, cursor = [], None
+    while True:
+        page, cursor = run(repository._get_page(limit=2, cursor=cursor, **query))
+        seen += [item["n"] for item in page]
+        if cursor is None:
+            return seen
+
+
+@pytest.mark.parametrize("ascending, expected", [
+    (True, [0, 2, 4, 6, 8, 1, 3, 5, 7]),
+    (False, [7, 5, 3, 1, 8, 6, 4, 2, 0]),
+])
+def test_pages_cross_null_sort_values(collection, ascending, expected):
+    for repository in repositories(collection):
+        assert all_pages(repository, sort_by="deadline", ascending=ascending) == expected
+
+
+@pytest.mark.parametrize("filter_query, expected", [
+    ({"target_goal_ids": "goal-a"}, [1, 2]),
+    ({"target_goal_ids": "goal-b"}, [2]),
+    ({"target_goal_ids": "goal-c"}, []),
+    ({"status": "active", "target_goal_ids": "goal-a"}, [1]),
+])
+def test_cached_filter_matches_array_elements_like_mongo(filter_query, expected):
+    collection = mongomock_motor.AsyncMongoMockClient()["test"]["tasks"]
+    run(collection.insert_many([
+        {"user_id": USER_ID, "n": 0, "status": "active", "target_goal_ids": []},
+        {"user_id": USER_ID, "n": 1, "status": "active", "target_goal_ids": ["goal-a"]},
+        {"user_id": USER_ID, "n": 2, "status": "done", "target_goal_ids": ["goal-a", "goal-b"]},
+    ]))
+    mongo, cached = repositories(collection)
+    assert all_pages(mongo, filter_query=filter_query) == all_pages(cached, filter_query=filter_query) == expected
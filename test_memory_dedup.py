@@ -0,0 +1,60 @@
+"""
+Near-duplicate detection of long-term memories (memory_dedup): which paraphrases collapse
+into one memory and which stay apart.
+
+    python -m pytest -q test_memory_dedup.py
+"""
+import asyncio
+
+import pytest
+
+from memory_dedup import MIN_JACCARD, MemoryDeduplicator, dedupe_texts, fingerprint, jaccard
+
+SAME = [
+    ("Owner is learning English", "The owner is learning English now"),
+    ("I have English class at 6pm", "I have an English class at 6pm every week"),
+    ("Owner has English class at 6pm on Mondays", "Owner has English class on Mondays at 6 pm"),
+    ("The owner likes green tea in the morning.", "Owner likes green tea in the morning"),
+    ("Owner's birthday is on May 3", "The owner's birthday is May 3"),
+]
+DIFFERENT = [
+    ("Owner likes green tea", "Owner dislikes green tea"),
+    ("Owner has a dog named Rex", "Owner has a cat named Rex"),
+    ("Owner has English class at 6pm on Mondays", "Owner has English class at 6pm on Tuesdays"),
+    ("Owner has English class at 6pm", "Owner has English class at 7pm"),
+    ("Owner lives in Berlin", "Owner lives in Munich"),
+    ("Owner's sister is called Anna", "Owner's sister Anna lives in Berlin"),
+]
+
+
+@pytest.mark.parametrize("a, b", SAME)
+def test_paraphrases_collapse(a, b):
+    assert jaccard(fingerprint(a), fingerprint(b)) >= MIN_JACCARD
+    assert dedupe_texts([a, b]) == [a]
+
+
+@pytest.mark.parametrize("a, b", DIFFERENT)
+def test_different_memories_stay_apart(a, b):
+    assert jaccard(fingerprint(a), fingerprint(b)) < MIN_JACCARD
+    assert dedupe_texts([a, b]) == [a, b]
+
+
+@pytest.mark.parametrize("stored, text, repeated", [(a, b, True) for a, b in SAME] + [(a, b, False) for a, b in DIFFERENT])
+def test_index_finds_stored_paraphrases(stored, text, repeated):
+    fakeredis = pytest.importorskip("fakeredis")
+    dedup = MemoryDeduplicator(fakeredis.FakeAsyncRedis(decode_responses=True))
+
+    async def split():
+        _, _, fingerprints = await dedup.split("user-1", [stored])
+        await dedup.register("user-1", [("point-1", fingerprints[0])])
+        return await dedup.split("user-1", [text])
+
+    fresh, duplicates, _ = asyncio.run(split())
+    assert (fresh, duplicates) == (([], {0: "point-1"}) if repeated else ([0], {}))
+
+
+def test_batch_keeps_the_first_of_its_paraphrases():
+    fakeredis = pytest.importorskip("fakeredis")
+    dedup = MemoryDeduplicator(fakeredis.FakeAsyncRedis(decode_responses=True))
+    fresh, duplicates, _ = asyncio.run(dedup.split("user-1", [SAME[0][0], DIFFERENT[0][0], SAME[0][1]]))
+    assert (fresh, duplicates) == ([0, 1], {})
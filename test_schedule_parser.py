@@ -0,0 +1,122 @@
+"""
+Free-text schedules and RRULE occurrences (schedule_parser).
+
+    python -m pytest -q test_schedule_parser.py
+"""
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from schedule_parser import next_occurrence, parse_schedule
+
+TZ = ZoneInfo("Europe/Berlin")
+NOW = datetime(2026, 1, 7, 10, 0, tzinfo=TZ) # A Wednesday
+
+
+def at(month, day, hour=0, minute=0, year=2026):
+    return datetime(year, month, day, hour, minute, tzinfo=TZ)
+
+
+@pytest.mark.parametrize("text, next_at, recurrence, location", [
+    ("tomorrow at 5pm in the school", at(1, 8, 17), None, "school"),
+    ("in 2 hours", at(1, 7, 12), None, None),
+    ("next monday", at(1, 12), None, None),
+    ("2026-02-01 14:00", at(2, 1, 14), None, None),
+    ("lemonade tonight", at(1, 7, 20), None, None),
+    ("every Friday in my home", at(1, 9), "FREQ=WEEKLY;INTERVAL=1;BYDAY=FR", "home"),
+    ("every mon, wed and fri", at(1, 7), "FREQ=WEEKLY;INTERVAL=1;BYDAY=MO,WE,FR", None),
+    ("mondays and fridays at 7:30", at(1, 9, 7, 30), "FREQ=WEEKLY;INTERVAL=1;BYDAY=MO,FR;BYHOUR=7;BYMINUTE=30", None),
+    ("every 2 weeks on tue", at(1, 13), "FREQ=WEEKLY;INTERVAL=2;BYDAY=TU", None),
+    ("every week on monday at 9am", at(1, 12, 9), "FREQ=WEEKLY;INTERVAL=1;BYDAY=MO;BYHOUR=9;BYMINUTE=0", None),
+    ("clean the fridge every week", at(1, 7), "FREQ=WEEKLY;INTERVAL=1;BYDAY=WE", None),
+    ("weekdays at 8am", at(1, 8, 8), "FREQ=WEEKLY;INTERVAL=1;BYDAY=MO,TU,WE,TH,FR;BYHOUR=8;BYMINUTE=0", None),
+    ("every day at 6pm", at(1, 7, 18), "FREQ=DAILY;INTERVAL=1;BYHOUR=18;BYMINUTE=0", None),
+    ("every month", at(1, 7), "FREQ=MONTHLY;INTERVAL=1;BYMONTHDAY=7", None),
+    ("pay rent every month", at(1, 7), "FREQ=MONTHLY;INTERVAL=1;BYMONTHDAY=7", None),
+    ("", None, None, None),
+])
+def test_parse_schedule(text, next_at, recurrence, location):
+    assert tuple(parse_schedule(text, NOW)) == (next_at, recurrence, location)
+
+
+@pytest.mark.parametrize("recurrence, anchor, after, expected", [
+    ("FREQ=DAILY;INTERVAL=1;BYHOUR=18;BYMINUTE=0", at(1, 7, 18), at(1, 7, 18, 1), at(1, 8, 18)),
+    ("FREQ=WEEKLY;INTERVAL=2;BYDAY=TU", at(1, 13), at(1, 14), at(1, 27)),
+    ("FREQ=WEEKLY;INTERVAL=1;BYDAY=MO,FR", at(1, 9), at(1, 10), at(1, 12)),
+    ("FREQ=MONTHLY;INTERVAL=1;BYMONTHDAY=31", at(1, 31), at(2, 1), at(3, 31)),
+    # Stays at the local time across the DST change (March 29)
+    ("FREQ=DAILY;INTERVAL=1;BYHOUR=18;BYMINUTE=0", at(3, 28, 18), at(3, 28, 19), at(3, 29, 18)),
+])
+def test_next_occurrence(recurrence, anchor, after, expected):
+    assert next_occurrence(recurrence, anchor, after, TZ) == expected
+
+
+# --- Through TaskRepository (user timezone, stored occurrences) ---
+EDMONTON = ZoneInfo("America/Edmonton") # DST starts on 2026-03-08
+
+
+class FrozenDatetime(datetime):
+    moment = None
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls.moment.astimezone(tz)
+
+
+@pytest.fixture
+def tasks(monkeypatch):
+    """A TaskRepository for a user in America/Edmonton, on in-memory Mongo and Redis, with a settable clock."""
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    fakeredis = pytest.importorskip("fakeredis")
+    import asyncio
+
+    import database
+    from bson import ObjectId
+    from operation_library import task_repository
+
+    db = mongomock_motor.AsyncMongoMockClient()["test"]
+    for attribute, collection_name in database.COLLECTION_NAMES.items():
+        monkeypatch.setattr(database, attribute, db[collection_name], raising=False)
+    monkeypatch.setattr(database, "redis_client", fakeredis.FakeAsyncRedis(decode_responses=True), raising=False)
+    monkeypatch.setattr(task_repository, "datetime", FrozenDatetime)
+    user_id = str(ObjectId())
+    asyncio.run(db["users"].insert_one({"_id": ObjectId(user_id), "timezone": "America/Edmonton"}))
+
+    def at_time(moment):
+        FrozenDatetime.moment = moment
+        return task_repository.TaskRepository(user_id)
+    return at_time
+
+
+def run(coroutine):
+    import asyncio
+    return asyncio.run(coroutine)
+
+
+def test_repository_schedules_keep_local_time_across_dst(tasks):
+    repository = tasks(datetime(2026, 3, 6, 12, 0, tzinfo=EDMONTON))
+    weekly = run(repository.create_task("English class", "", "every Monday at 6pm"))["data"]
+    assert weekly["next_occurrence"] == datetime(2026, 3, 9, 18, 0, tzinfo=EDMONTON)
+    due = run(repository.get_due_tasks(start="2026-03-09"))["data"]
+    assert [item["due_at"] for item in due] == ["2026-03-09T18:00:00-06:00"]
+
+    repository = tasks(datetime(2026, 3, 7, 12, 0, tzinfo=EDMONTON))
+    one_off = run(repository.create_task("Call mom", "", "tomorrow at 5pm"))["data"]
+    assert one_off["next_occurrence"] == datetime(2026, 3, 8, 17, 0, tzinfo=EDMONTON)
+
+
+def test_repository_rolls_overdue_recurring_tasks_across_dst(tasks):
+    import database
+    from operation_library.due_queue import GLOBAL_DUE_KEY
+
+    repository = tasks(datetime(2026, 3, 6, 19, 0, tzinfo=EDMONTON))
+    task = run(repository.create_task("Stretch", "", "every day at 6pm"))["data"]
+    assert task["next_occurrence"] == datetime(2026, 3, 7, 18, 0, tzinfo=EDMONTON)
+
+    repository = tasks(datetime(2026, 3, 9, 12, 0, tzinfo=EDMONTON))
+    result = run(repository.get_overdue_tasks(due_soon_hours=24))["data"]
+    assert result["overdue"] == []
+    assert [item["due_at"] for item in result["due_soon"]] == ["2026-03-09T18:00:00-06:00"]
+    scores = run(database.redis_client.zrange(GLOBAL_DUE_KEY, 0, -1, withscores=True))
+    assert [score for _, score in scores] == [datetime(2026, 3, 9, 18, 0, tzinfo=EDMONTON).timestamp()]
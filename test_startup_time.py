@@ -0,0 +1,61 @@
+"""
+Startup-time budget for the API worker: `import main` must stay cheap (autoscaling and
+--reload pay for it on every start) and free of side effects. Measured in a fresh
+interpreter with `python -X importtime`.
+
+    python -m pytest -q test_startup_time.py
+"""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+ROOT = Path(__file__).resolve().parent
+# Cumulative import time of `main`, in seconds. Override for slow CI machines.
+IMPORT_BUDGET_SECONDS = float(os.getenv("STARTUP_IMPORT_BUDGET_SECONDS", "1.5"))
+# Imported on first use (client construction), never at startup
+LAZY_MODULES = ("openai", "qdrant_client", "motor", "dotenv")
+
+
+def _import_main():
+    """Imports main in a fresh interpreter; returns (stdout, {module: cumulative microseconds})."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=ROOT, capture_output=True, text=True, timeout=60,
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative_us, module = (part.strip() for part in line[len("import time:"):].split("|"))
+        if cumulative_us.isdigit():
+            cumulative[module] = int(cumulative_us)
+    return result.stdout, cumulative
+
+
+@pytest.fixture(scope="module")
+def main_import():
+    return _import_main()
+
+
+def test_import_main_within_budget(main_import):
+    _, cumulative = main_import
+    seconds = cumulative["main"] / 1_000_000
+    slowest = sorted(cumulative.items(), key=lambda item: item[1], reverse=True)[:10]
+    assert seconds <= IMPORT_BUDGET_SECONDS, f"import main took {seconds:.2f}s; slowest: {slowest}"
+
+
+def test_heavy_sdks_are_imported_lazily(main_import):
+    _, cumulative = main_import
+    eager = [module for module in LAZY_MODULES if module in cumulative]
+    assert not eager, f"imported at startup: {eager}"
+
+
+def test_import_main_has_no_output(main_import):
+    stdout, _ = main_import
+    assert stdout == ""
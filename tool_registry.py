@@ -1,51 +1,99 @@
-from typing import Callable, Dict, Any, List
+from types import MappingProxyType
+from typing import Callable, Dict, Any, List, Mapping, NamedTuple, Tuple
+import json
+import logging
+from tool_validation import Validator, ValidationStats, compile_schema
+
+logger = logging.getLogger(__name__)
+
+
+class ToolEntry(NamedTuple):
+    """Everything needed to execute one tool, resolved when the registry is built."""
+    source_repo: str
+    method: Callable # Unbound repository method, called with the per-request repository
+    master_definition: Dict[str, Any]
+    validate: Validator # Compiled from the tool's 'parameters' schema
 
 
 class ToolRegistry:
-    def __init__(self):
-        # The key is the tool name for the LLM.
-        # The value now stores WHERE to find the function.
-        self.tools: Dict[str, Dict[str, Any]] = {}
-        
-    def register_from_repository(self, repo_name: str, repo_instance: object):
-        """Reads all master tool definitions from a repository and stores them."""
-        tool_definitions = repo_instance.get_tool_definitions()
-        for definition in tool_definitions:
-            tool_name = definition["function"]["name"]
-            self.tools[tool_name] = {
-                "source_repo": repo_name,
-                "master_definition": definition
-            }
+    """
+    Immutable, process-wide registry of every tool the repositories provide.
+    It is built once from a declarative {repo_name: RepositoryClass} mapping;
+    requests only bind their own repository instances to it.
+    """
+
+    def __init__(self, repository_classes: Mapping[str, type]):
+        self.repository_classes: Mapping[str, type] = MappingProxyType(dict(repository_classes))
+
+        dispatch_table: Dict[str, ToolEntry] = {}
+        llm_tools: List[Dict[str, Any]] = []
+        for repo_name, repo_class in self.repository_classes.items():
+            for definition in repo_class.get_tool_definitions():
+                tool_name = definition["function"]["name"]
+                if tool_name in dispatch_table:
+                    raise ValueError(f"Tool '{tool_name}' is defined by more than one repository.")
+                # Resolve the method once here instead of getattr() on every call
+                method = getattr(repo_class, definition["internal_method_name"])
+                validate = compile_schema(definition["function"].get("parameters", {"type": "object"}))
+                dispatch_table[tool_name] = ToolEntry(repo_name, method, definition, validate)
+                # The LLM view only contains 'type' and 'function', never our internal keys
+                llm_tools.append({"type": definition["type"], "function": definition["function"]})
+
+        self.tools: Mapping[str, ToolEntry] = MappingProxyType(dispatch_table)
+        self._llm_tools: List[Dict[str, Any]] = llm_tools
+        # Stable serialization of the LLM view, used by the static prompt prefix
+        self.schema_blob: bytes = json.dumps(llm_tools, sort_keys=True, separators=(",", ":")).encode("utf-8")
+        self.validation_stats = ValidationStats()
 
     def get_definitions_for_llm(self) -> List[Dict[str, Any]]:
         """
-        VIEW #1: Generates the list in the exact format OpenAI needs.
-        This method now correctly STRIPS OUT our internal keys.
-        """
-        llm_tools = []
-        for name, data in self.tools.items():
-            # Get the full master definition
-            master_def = data["master_definition"]
-            
-            # Create a clean copy for the LLM. It only contains 'type' and 'function'.
-            clean_def = {
-                "type": master_def["type"],
-                "function": master_def["function"]
-            }
-            llm_tools.append(clean_def)
-            
-        return llm_tools
+        VIEW #1: The cached list in the exact format OpenAI needs. Do not mutate it.
+        """
+        return self._llm_tools
 
-    def get_tool_for_execution(self, name: str) -> Dict[str, Any] | None:
+    def get_tool_for_execution(self, name: str) -> ToolEntry | None:
         """
-        VIEW #2: Provides the internal information the AIBrain needs to execute the tool.
+        VIEW #2: Provides the internal information the Brain needs to execute the tool.
         """
-        tool_data = self.tools.get(name)
-        if not tool_data:
-            return None
-        
+        return self.tools.get(name)
+
+    def bind_repositories(self, user_id: str, repositories: Mapping[str, object] | None = None) -> Dict[str, object]:
+        """
+        Returns one repository instance per declared repository for this request.
+        Instances passed in (e.g. from FastAPI dependencies) are used as they are.
+        """
+        repositories = repositories or {}
         return {
-            "source_repo": tool_data["source_repo"],
-            # Extract the internal method name from the master definition
-            "internal_method_name": tool_data["master_definition"]["internal_method_name"]
-        }
\ No newline at end of file
+            repo_name: repositories.get(repo_name) or repo_class(user_id=user_id)
+            for repo_name, repo_class in self.repository_classes.items()
+        }
+
+    def validate_arguments(self, name: str, arguments: Any) -> Tuple[Any, List[str]]:
+        """Checks and coerces arguments against the tool's compiled schema, recording the outcome."""
+        arguments, errors = self.tools[name].validate(arguments)
+        self.validation_stats.record(name, failed=bool(errors))
+        if errors:
+            logger.warning(f"Tool '{name}' called with invalid arguments: {errors} "
+                           f"(failure rate {self.validation_stats.failure_rate(name):.0%})")
+        return arguments, errors
+
+    async def dispatch(self, name: str, repositories: Mapping[str, object], arguments: Any) -> Any:
+        """
+        Validates the arguments and executes a tool against the request's repositories.
+        Invalid arguments are answered with a compact error the model can fix in the next step.
+        Raises KeyError for unknown tools.
+        """
+        entry = self.tools[name]
+        coerced_arguments, errors = self.validate_arguments(name, arguments)
+        if errors:
+            return {
+                "status": "failure",
+                "message": f"Invalid arguments for '{name}': " + "; ".join(errors),
+                "data": None,
+                "error_details": {
+                    "type": "ArgumentValidationError",
+                    "validation_errors": errors,
+                    "original_input": arguments
+                }
+            }
+        return await entry.method(repositories[entry.source_repo], **coerced_arguments)
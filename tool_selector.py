@@ -0,0 +1,100 @@
+import asyncio
+import json
+import logging
+import math
+from typing import Dict, Any, Iterable, List, NamedTuple, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Tools that are always offered, whatever the request is about
+CORE_TOOLS = ("list_tasks", "list_goals")
+DEFAULT_TOP_K = 4
+
+
+class ToolSelection(NamedTuple):
+    names: List[str]
+    tools: List[Dict[str, Any]]
+    selected_tokens: int
+    full_tokens: int
+
+
+def _estimate_tokens(definition: Dict[str, Any]) -> int:
+    """Rough token estimate (~4 characters per token) of a tool definition in the prompt."""
+    return len(json.dumps(definition, separators=(",", ":"))) // 4 + 1
+
+def _normalize(vector: Sequence[float]) -> List[float]:
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+class ToolSelector:
+    """
+    Picks the tools worth sending on each step. Tool descriptions are embedded once
+    per process; each request embeds its plan + message once and keeps the top-k
+    tools by cosine similarity plus the pinned core set.
+    """
+
+    def __init__(self, tool_registry, top_k: int = DEFAULT_TOP_K, core_tools: Iterable[str] = CORE_TOOLS):
+        self.top_k = top_k
+        self.core_tools = tuple(name for name in core_tools if name in tool_registry.tools)
+        self._definitions = {tool["function"]["name"]: tool for tool in tool_registry.get_definitions_for_llm()}
+        self._token_costs = {name: _estimate_tokens(tool) for name, tool in self._definitions.items()}
+        self._full_tokens = sum(self._token_costs.values())
+        self._tool_vectors: Dict[str, List[float]] | None = None
+        self._embed_lock = asyncio.Lock()
+
+    def _describe(self, name: str) -> str:
+        function = self._definitions[name]["function"]
+        return f"{name}: {function.get('description', '')}"
+
+    async def _ensure_embedded(self, llm_provider):
+        if self._tool_vectors is not None:
+            return
+        async with self._embed_lock:
+            if self._tool_vectors is None:
+                names = list(self._definitions)
+                vectors = await llm_provider.embed([self._describe(name) for name in names])
+                self._tool_vectors = {name: _normalize(vector) for name, vector in zip(names, vectors)}
+
+    def _selection(self, names: List[str]) -> ToolSelection:
+        return ToolSelection(
+            names=names,
+            tools=[self._definitions[name] for name in names],
+            selected_tokens=sum(self._token_costs[name] for name in names),
+            full_tokens=self._full_tokens,
+        )
+
+    def all_tools(self) -> ToolSelection:
+        return self._selection(list(self._definitions))
+
+    async def select(self, llm_provider, query_text: str) -> ToolSelection:
+        """Returns the core tools plus the top-k most relevant ones. Falls back to every tool on error."""
+        if len(self._definitions) <= self.top_k + len(self.core_tools):
+            return self.all_tools()
+        try:
+            await self._ensure_embedded(llm_provider)
+            query_vector = _normalize((await llm_provider.embed([query_text]))[0])
+        except Exception as e:
+            logger.warning(f"Tool selection failed, sending every tool: {e}")
+            return self.all_tools()
+
+        scores = {
+            name: sum(q * t for q, t in zip(query_vector, vector))
+            for name, vector in self._tool_vectors.items()
+            if name not in self.core_tools
+        }
+        ranked = sorted(scores, key=scores.get, reverse=True)[:self.top_k]
+        return self._selection(list(self.core_tools) + ranked)
+
+    @staticmethod
+    def log_outcome(selection: ToolSelection, called_tools: Iterable[str], steps: int):
+        """Logs how many selected tools were used (precision) and the prompt tokens saved."""
+        called = set(called_tools)
+        used = called & set(selection.names)
+        precision = len(used) / len(selection.names) if selection.names else 0.0
+        saved_tokens = (selection.full_tokens - selection.selected_tokens) * steps
+        logger.info(
+            f"Tool selection: sent {len(selection.names)} tools, used {sorted(used)}, "
+            f"missed {sorted(called - used)}, precision {precision:.0%}, "
+            f"~{saved_tokens} tool-schema tokens saved over {steps} steps"
+        )
@@ -0,0 +1,174 @@
+import difflib
+from typing import Any, Callable, Dict, List, Tuple
+
+# A compiled validator takes the raw arguments and returns (coerced_arguments, errors).
+Validator = Callable[[Any], Tuple[Any, List[str]]]
+
+_MISSING = object()
+
+
+# --- Scalar checks with light coercion (LLMs often send "5" for 5 or "true" for True) ---
+def _check_string(value: Any, path: str) -> Tuple[Any, List[str]]:
+    if isinstance(value, str):
+        return value, []
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value), []
+    return value, [f"{path} must be a string"]
+
+def _check_integer(value: Any, path: str) -> Tuple[Any, List[str]]:
+    if isinstance(value, bool):
+        return value, [f"{path} must be an integer"]
+    if isinstance(value, int):
+        return value, []
+    if isinstance(value, float) and value.is_integer():
+        return int(value), []
+    if isinstance(value, str):
+        try:
+            return int(value.strip()), []
+        except ValueError:
+            pass
+    return value, [f"{path} must be an integer"]
+
+def _check_number(value: Any, path: str) -> Tuple[Any, List[str]]:
+    if isinstance(value, bool):
+        return value, [f"{path} must be a number"]
+    if isinstance(value, (int, float)):
+        return value, []
+    if isinstance(value, str):
+        try:
+            return float(value.strip()), []
+        except ValueError:
+            pass
+    return value, [f"{path} must be a number"]
+
+def _check_boolean(value: Any, path: str) -> Tuple[Any, List[str]]:
+    if isinstance(value, bool):
+        return value, []
+    if isinstance(value, str) and value.strip().lower() in ("true", "false"):
+        return value.strip().lower() == "true", []
+    return value, [f"{path} must be a boolean"]
+
+_SCALAR_CHECKS = {
+    "string": _check_string,
+    "integer": _check_integer,
+    "number": _check_number,
+    "boolean": _check_boolean,
+}
+
+
+# --- Compiler ---
+def compile_schema(schema: Dict[str, Any], path: str = "arguments") -> Validator:
+    """
+    Compiles a JSON-schema subset (the one our tool definitions use) into a closure.
+    All schema walking happens here, once, so validating a call is just function calls.
+    """
+    schema_type = schema.get("type")
+
+    if schema_type == "object":
+        validator = _compile_object(schema, path)
+    elif schema_type == "array":
+        validator = _compile_array(schema, path)
+    elif schema_type in _SCALAR_CHECKS:
+        check = _SCALAR_CHECKS[schema_type]
+        validator = lambda value: check(value, path)
+    else:
+        validator = lambda value: (value, [])
+
+    if "enum" in schema:
+        allowed = tuple(schema["enum"])
+        base = validator
+        def validator(value):
+            value, errors = base(value)
+            if not errors and value not in allowed:
+                errors = [f"{path} must be one of {list(allowed)}"]
+            return value, errors
+
+    if "minimum" in schema or "maximum" in schema:
+        minimum, maximum = schema.get("minimum"), schema.get("maximum")
+        base_range = validator
+        def validator(value):
+            value, errors = base_range(value)
+            if not errors and minimum is not None and value < minimum:
+                errors = [f"{path} must be >= {minimum}"]
+            if not errors and maximum is not None and value > maximum:
+                errors = [f"{path} must be <= {maximum}"]
+            return value, errors
+
+    return validator
+
+def _compile_object(schema: Dict[str, Any], path: str) -> Validator:
+    properties = {
+        name: compile_schema(prop_schema, name if path == "arguments" else f"{path}.{name}")
+        for name, prop_schema in schema.get("properties", {}).items()
+    }
+    required = tuple(schema.get("required", []))
+    known_names = list(properties)
+    # Free-form objects (no declared properties) accept any keys, e.g. update_data
+    allow_extra = schema.get("additionalProperties", not properties)
+
+    def validate_object(value: Any) -> Tuple[Any, List[str]]:
+        if not isinstance(value, dict):
+            return value, [f"{path} must be an object"]
+        errors: List[str] = []
+        coerced: Dict[str, Any] = {}
+        for name, item in value.items():
+            check = properties.get(name)
+            if check is None:
+                if allow_extra:
+                    coerced[name] = item
+                    continue
+                suggestion = difflib.get_close_matches(name, known_names, n=1)
+                hint = f" (did you mean '{suggestion[0]}'?)" if suggestion else ""
+                errors.append(f"unknown argument '{name}'{hint}")
+                continue
+            if item is None and name not in required:
+                # Optional arguments explicitly sent as null fall back to the default
+                continue
+            coerced[name], item_errors = check(item)
+            errors.extend(item_errors)
+        for name in required:
+            if value.get(name, _MISSING) is _MISSING:
+                errors.append(f"missing required argument '{name}'")
+        return coerced, errors
+
+    return validate_object
+
+def _compile_array(schema: Dict[str, Any], path: str) -> Validator:
+    item_check = compile_schema(schema.get("items", {}), f"{path}[]")
+
+    def validate_array(value: Any) -> Tuple[Any, List[str]]:
+        if not isinstance(value, list):
+            return value, [f"{path} must be an array"]
+        errors: List[str] = []
+        coerced = []
+        for item in value:
+            item, item_errors = item_check(item)
+            coerced.append(item)
+            errors.extend(item_errors)
+        return coerced, errors
+
+    return validate_array
+
+
+# --- Per-tool failure statistics ---
+class ValidationStats:
+    """Counts validated calls and failures per tool, so bad schemas or prompts show up."""
+
+    def __init__(self):
+        self._counts: Dict[str, List[int]] = {}
+
+    def record(self, tool_name: str, failed: bool):
+        counts = self._counts.setdefault(tool_name, [0, 0])
+        counts[0] += 1
+        if failed:
+            counts[1] += 1
+
+    def failure_rate(self, tool_name: str) -> float:
+        calls, failures = self._counts.get(tool_name, (0, 0))
+        return failures / calls if calls else 0.0
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            name: {"calls": calls, "failures": failures, "failure_rate": failures / calls if calls else 0.0}
+            for name, (calls, failures) in self._counts.items()
+        }